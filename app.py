@@ -1,103 +1,431 @@
 import sys
-import os
-from isd.pipeline.training_pipeline import TrainPipeline
-from isd.exception import isdException
-from isd.utils.main_utils import decodeImage, encodeImageIntoBase64
-from flask import Flask, request, jsonify, render_template, Response
+import json
+import atexit
+import time
+import functools
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from isd.utils.main_utils import decodeImageIntoArray, decodeBytesIntoArray
+from isd.constant.application import (BATCH_PREDICT_CHUNK_SIZE, MODEL_MANAGER_ADMIN_TOKEN,
+                                      INFERENCE_SCHEDULER_DEADLINE_HEADER)
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, g
 from flask_cors import CORS, cross_origin
-from ultralytics import YOLO  # Import YOLO from the Ultralytics library
-import shutil
-from isd.configuration.s3_operations import S3Operation
-from isd.entity.config_entity import ModelPusherConfig
-from isd.entity.artifacts_entity import ModelTrainerArtifact
+from isd.entity.config_entity import (ModelPusherConfig, ModelManagerConfig, InferenceSchedulerConfig,
+                                      InferenceWorkerPoolConfig, VideoInferenceConfig, ResultCacheConfig,
+                                      SceneChangeConfig, CameraRegistryConfig, AdaptiveResolutionConfig,
+                                      ComplianceConfig, TrackingConfig, EventSinkConfig, StreamManagerConfig,
+                                      CpuProfileConfig)
+from isd.serving.scheduler import InferenceScheduler, QueueFullError, DeadlineExceededError
+from isd.serving.result_cache import ResultCache
+from isd.serving.detections import (parse_inference_params, parse_response_options, build_prediction_payload,
+                                    results_from_boxes, render_jpeg)
+from isd.serving.metrics import METRICS
+from isd.serving.video import VideoInference, MJPEG_BOUNDARY
+from isd.serving.change_detector import SceneChangeDetector
+from isd.serving.slicing import SlicedInference, parse_slicing_options
+from isd.serving.roi import CameraRegistry, RegionOfInterestInference
+from isd.serving.adaptive import AdaptiveResolutionController
+from isd.serving.compliance import ComplianceEngine
+from isd.serving.tracking import StreamTracker
+from isd.serving.event_sink import create_event_sink, violation_records
+from isd.serving.streams import StreamManager, load_streams
+from isd.serving.tuning import CpuProfile
+from isd.serving.model_manager import ModelManager, ModelNotReadyError
 
 app = Flask(__name__)
 CORS(app)
 
+# One ClientApp per process, shared by every request thread of that process
+clApp = None
+_client_app_lock = threading.Lock()
+_training_process = None
+
 
 class ClientApp:
     def __init__(self, model_pusher_config: ModelPusherConfig):
         self.model_pusher_config = model_pusher_config
-        self.s3 = S3Operation()  # Create S3Operation instance
-
-        self.filename = "data/inputImage.jpg"
-        self.model_path = 'model/best.pt'
-        self.bucket_name = self.model_pusher_config.MODEL_BUCKET_NAME
-
-        # Ensure the 'model/' directory exists
-        if not os.path.exists('model'):
-            os.makedirs('model')
-
-        # Check if model exists locally, if not, download it from S3 or start training
-        if not os.path.exists(self.model_path):
-            if self.s3.is_model_present(self.bucket_name, 'best.pt'):
-                self.s3.download_object(key=self.model_pusher_config.S3_MODEL_KEY_PATH, 
-                                        bucket_name=self.bucket_name, filename=self.model_path)
-            else:
-                print("Model not found in S3, starting training process...")
-                # Use Flask's app context to call the train route directly
-                with app.app_context():
-                    trainRoute()  # Call the training route function directly
-                # Check again if the model is now available after training
-                if not os.path.exists(self.model_path):
-                    raise Exception("Training completed, but model was not saved successfully.")
-        
-        self.model = YOLO(self.model_path)  # Load YOLO model
+
+        # Threads, workers, batch and image size tuned for this CPU, for every setting the environment leaves unset
+        self.cpu_profile = CpuProfile.load(CpuProfileConfig())
+        worker_pool_config = self.cpu_profile.worker_pool_config(InferenceWorkerPoolConfig())
+        self.cpu_profile.apply_torch_threads(worker_pool_config)
+
+        # The model is fetched, loaded and warmed in the background, the server binds its port right away
+        model_manager_config = ModelManagerConfig(warmup_image_size=self.cpu_profile.image_size)
+        self.model_manager = ModelManager(self.model_pusher_config, model_manager_config, worker_pool_config).start()
+
+        # All inference goes through the scheduler, which batches concurrent requests
+        scheduler_config = self.cpu_profile.scheduler_config(
+            InferenceSchedulerConfig(concurrency=max(1, worker_pool_config.num_workers)))
+        self.scheduler = InferenceScheduler(self.predict, scheduler_config).start()
+        self.video_inference = VideoInference(self.scheduler.predict_many, VideoInferenceConfig())
+
+        # Under load the image size steps down a ladder, and back up when the load drops
+        self.adaptive_resolution = AdaptiveResolutionController(
+            self.scheduler.queue_depth, self.cpu_profile.adaptive_resolution_config(AdaptiveResolutionConfig()))
+        self.scheduler.add_listener(self.adaptive_resolution.observe)
+        self.sliced_inference = SlicedInference(self.scheduler.predict_many)
+
+        # Cameras with polygon regions of interest are inferred on crops of their frames only
+        camera_registry_config = CameraRegistryConfig()
+        self.camera_registry = CameraRegistry(camera_registry_config)
+        self.roi_inference = RegionOfInterestInference(self.scheduler.predict_many, lambda: self.names,
+                                                       camera_registry_config)
+
+        # Links PPE detections to the persons wearing (or missing) them, on request
+        self.compliance_engine = ComplianceEngine(ComplianceConfig())
+
+        # Violations are written to the event sink by a background thread, requests never wait for it
+        self.event_sink = create_event_sink(EventSinkConfig())
+        if self.event_sink is not None:
+            atexit.register(self.event_sink.close)
+
+        # Camera streams listed in the stream config are read and inferred in the background, batched across cameras
+        stream_manager_config = StreamManagerConfig()
+        streams = load_streams(stream_manager_config)
+        self.stream_manager = None
+        if streams:
+            # Stream frames are background work, HTTP admission control does not count them
+            self.stream_manager = StreamManager(
+                functools.partial(self.scheduler.predict_many, background=True), streams, stream_manager_config,
+                ready=lambda: self.ready,
+                params=lambda: {'imgsz': self.adaptive_resolution.select()},
+                tracker_factory=lambda stream: StreamTracker(self.compliance_engine, TrackingConfig(),
+                                                             self.event_sink, stream.stream_id),
+            ).start()
+            # Readers hold native capture handles, they are released before the interpreter exits
+            atexit.register(self.stream_manager.stop)
+
+        # Identical frames and client retries are answered without running the model again
+        self.result_cache = ResultCache(ResultCacheConfig(), lambda: self.model_manager.model_version)
+
+        # Scheduler, cache and frame-skipping counters are read on every /metrics scrape
+        METRICS.registry.add_collector(self.collectMetrics)
+
+    @property
+    def ready(self):
+        return self.model_manager.ready
+
+    @property
+    def names(self):
+        return self.model_manager.names
+
+    def predict(self, images, **params):
+        # One batched forward pass over a list of in-memory images
+        params.setdefault('imgsz', self.cpu_profile.image_size)
+        predictions = self.model_manager.predict(images, **params)
+        METRICS.observe_predictions(predictions)
+        return predictions
+
+    def collectMetrics(self):
+        scheduler_stats = self.scheduler.stats()
+        cache_stats = self.result_cache.stats()
+        skip_stats = self.video_inference.skip_stats()
+        return [
+            "# HELP isd_scheduler_queue_depth Requests waiting for a batch.",
+            "# TYPE isd_scheduler_queue_depth gauge",
+            f"isd_scheduler_queue_depth {scheduler_stats['queue_depth']}",
+            "# HELP isd_result_cache_lookups_total Result cache lookups by outcome.",
+            "# TYPE isd_result_cache_lookups_total counter",
+            f'isd_result_cache_lookups_total{{result="hit"}} {cache_stats["hits"]}',
+            f'isd_result_cache_lookups_total{{result="miss"}} {cache_stats["misses"]}',
+            "# HELP isd_result_cache_bytes Memory held by cached results.",
+            "# TYPE isd_result_cache_bytes gauge",
+            f"isd_result_cache_bytes {cache_stats['bytes']}",
+            "# HELP isd_video_frames_total Video frames of streams with frame skipping, by outcome.",
+            "# TYPE isd_video_frames_total counter",
+            f'isd_video_frames_total{{result="inferred"}} {skip_stats["frames"] - skip_stats["skipped"]}',
+            f'isd_video_frames_total{{result="skipped"}} {skip_stats["skipped"]}',
+            "# HELP isd_model_ready Whether the model is loaded and warm.",
+            "# TYPE isd_model_ready gauge",
+            f"isd_model_ready {int(self.ready)}",
+            "# HELP isd_event_sink_pending Violation events waiting for the event sink writer.",
+            "# TYPE isd_event_sink_pending gauge",
+            f"isd_event_sink_pending {self.event_sink.pending() if self.event_sink is not None else 0}",
+        ]
+
+    def submit(self, image, deadline=None, **params):
+        # Scheduler future for one image, already resolved when the result is cached
+        if not self.result_cache.enabled:
+            return self.scheduler.submit(image, deadline=deadline, **params)
+
+        model_version = self.model_manager.model_version
+        key = self.result_cache.make_key(image, model_version, params)
+        boxes = self.result_cache.get(key, model_version)
+        if boxes is not None:
+            return resolvedFuture(results_from_boxes(image, boxes, self.names))
+
+        def store(done):
+            if done.exception() is None:
+                self.result_cache.put(key, model_version, done.result().boxes.data.cpu().numpy())
+
+        future = self.scheduler.submit(image, deadline=deadline, **params)
+        future.add_done_callback(store)
+        return future
+
+
+def resolvedFuture(result):
+    # Future that is already done, for results that never go through the scheduler
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def metricsRoute(rule):
+    # Route label of the current request, the URL rule keeps the label set bounded
+    return rule.rule if rule is not None else "unmatched"
+
+
+@app.before_request
+def startRequestMetrics():
+    g.metrics_route = metricsRoute(request.url_rule)
+    g.metrics_started_at = time.perf_counter()
+    METRICS.in_flight.inc(route=g.metrics_route)
+
+
+@app.after_request
+def recordRequestMetrics(response):
+    route, started_at = g.metrics_route, g.metrics_started_at
+    METRICS.requests.inc(route=route, method=request.method, status=response.status_code)
+    if response.status_code >= 400:
+        METRICS.errors.inc(route=route, status=response.status_code)
+
+    def finish():
+        METRICS.in_flight.dec(route=route)
+        METRICS.request_duration.observe(time.perf_counter() - started_at, route=route)
+
+    # Called once the body is fully sent, so streaming routes are timed end to end
+    response.call_on_close(finish)
+    return response
+
+
+@app.after_request
+def addInferenceHeaders(response):
+    # Image size the adaptive controller picked for this request's inference
+    if 'inference_image_size' in g:
+        response.headers['X-Inference-Image-Size'] = str(g.inference_image_size)
+    return response
+
+
+def modelRequired(route):
+    # Answer 503 until the model is loaded and warm, so load balancers retry elsewhere
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        if not clApp.ready:
+            response = jsonify(clApp.model_manager.status())
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        return route(*args, **kwargs)
+    return wrapper
+
+
+def admissionControlled(route):
+    # Shed new work with a fast 503 while the inference queue is full, instead of letting it time out
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        try:
+            clApp.scheduler.admit()
+        except QueueFullError as e:
+            response = Response(str(e), status=503)
+            response.headers['Retry-After'] = str(clApp.scheduler.scheduler_config.retry_after_seconds)
+            return response
+        return route(*args, **kwargs)
+    return wrapper
+
+
+def requestDeadline():
+    # perf_counter() deadline from the client's remaining time budget, None without the header
+    budget = request.headers.get(INFERENCE_SCHEDULER_DEADLINE_HEADER)
+    if budget is None:
+        return None
+    try:
+        return g.metrics_started_at + float(budget) / 1000.0
+    except ValueError:
+        raise ValueError(f"{INFERENCE_SCHEDULER_DEADLINE_HEADER} must be a number of milliseconds, got {budget!r}")
+
+
+def deadlineExceeded():
+    METRICS.expired.inc(stage="wait")
+    return Response("Request deadline exceeded.", status=504)
+
+
+def create_app():
+    """
+    Application factory for WSGI servers, e.g. gunicorn "app:create_app()".
+    Every worker process builds its own ClientApp after fork, threads inside a
+    worker share it and all their inference goes through its scheduler.
+    """
+    global clApp
+    with _client_app_lock:
+        if clApp is None:
+            clApp = ClientApp(model_pusher_config=ModelPusherConfig())
+    return app
+
 
 @app.route("/train")
 def trainRoute():
+    # Training runs in its own process, never inside the serving process
+    global _training_process
+    with _client_app_lock:
+        if _training_process is not None and _training_process.poll() is None:
+            return Response(f"Training is already running (pid {_training_process.pid}).", status=409)
+        try:
+            _training_process = subprocess.Popen([sys.executable, "-m", "isd.pipeline.training_pipeline"])
+        except Exception as e:
+            return Response(f"Error during training: {str(e)}", status=500)
+    print(f"Training started in process {_training_process.pid}")
+    return Response(f"Training started in a separate process (pid {_training_process.pid}).", status=202)
+
+
+@app.route("/healthz")
+def healthzRoute():
+    # Liveness: the process is up and serving HTTP
+    return jsonify({"status": "alive"})
+
+
+@app.route("/readyz")
+def readyzRoute():
+    # Readiness: only route traffic here once the model is loaded and warm
+    status = clApp.model_manager.status()
+    return jsonify(status), (200 if status["ready"] else 503)
+
+
+def adminRequired(route):
+    # Admin routes need the MODEL_MANAGER_ADMIN_TOKEN bearer token when one is configured
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        if MODEL_MANAGER_ADMIN_TOKEN and request.headers.get('Authorization') != f"Bearer {MODEL_MANAGER_ADMIN_TOKEN}":
+            return Response("Admin token required.", status=401)
+        return route(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/admin/model", methods=['GET'])
+@adminRequired
+def adminModelRoute():
+    # Loaded model, its S3 version and the state of the hot reload watcher
+    return jsonify(clApp.model_manager.status())
+
+
+@app.route("/admin/model/reload", methods=['POST'])
+@adminRequired
+def adminModelReloadRoute():
+    # Force a reload of the latest weights, or pin / unpin an S3 object version
+    data = request.get_json(silent=True) or {}
+    pin = data.get('pin')
     try:
-        obj = TrainPipeline()
-        obj.run_pipeline()  # This will train the model and save it
-        print("Training completed successfully!")
-        return "Training completed successfully!"
-    except Exception as e:
-        return Response(f"Error during training: {str(e)}", status=500)
+        clApp.model_manager.request_reload(version_id=data.get('version_id'),
+                                           pin=None if pin is None else bool(pin))
+    except ModelNotReadyError as e:
+        return Response(str(e), status=503)
+    except ValueError as val:
+        return Response(f"Invalid value inside JSON data: {val}", status=400)
+    # The reload runs in the background, poll GET /admin/model for its progress
+    return jsonify(clApp.model_manager.status()), 202
 
 
 @app.route("/")
 def home():
-    return render_template("index.html")
+    # The page downscales uploads to the model input size before sending them
+    return render_template("index.html", model_input_size=clApp.cpu_profile.image_size)
+
+
+def getPredictionOptions(data=None):
+    # Query string options, overridden by the fields of a JSON object body
+    options = request.args.to_dict()
+    if isinstance(data, dict):
+        options.update({key: value for key, value in data.items() if key not in ('image', 'images')})
+    params = parse_inference_params(options, clApp.names)
+    response_mode, render, compliance = parse_response_options(options)
+    compliance_engine = clApp.compliance_engine if compliance else None
+
+    # The size is fixed per request, and reported back in the X-Inference-Image-Size header
+    params['imgsz'] = g.inference_image_size = clApp.adaptive_resolution.select()
+
+    # Sliced or region-of-interest inference replaces the plain, cached path when asked for
+    predict_fn = None
+    slicing = parse_slicing_options(options)
+    if options.get('camera_id') is not None:
+        if slicing is not None:
+            raise ValueError("slice and camera_id cannot be combined")
+        camera = clApp.camera_registry.get(options['camera_id'])
+        predict_fn = functools.partial(clApp.roi_inference.predict, camera=camera)
+    elif slicing is not None:
+        predict_fn = functools.partial(clApp.sliced_inference.predict, slicing_config=slicing)
+    return params, response_mode, render, compliance_engine, predict_fn
+
+
+def emitViolations(compliance, route, options=None, **fields):
+    # Violating persons go to the event sink, which only queues them, so the response never waits for the write
+    if clApp.event_sink is None or compliance is None:
+        return
+    options = options if isinstance(options, dict) else {}
+    camera_id = options.get('camera_id', request.args.get('camera_id'))
+    clApp.event_sink.emit(violation_records(compliance, route, camera_id=camera_id, **fields))
+
+
+def readRequestImage():
+    # Raw image body, multipart upload or the base64 JSON field, plus the options sent with it
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        body = request.get_data()
+        with METRICS.stage("decode"):
+            return (decodeBytesIntoArray(body) if body else None), None
+    if request.files:
+        upload = request.files.get('image')
+        with METRICS.stage("decode"):
+            return (decodeBytesIntoArray(upload.read()) if upload else None), request.form.to_dict()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'image' not in data:
+        return None, data
+    with METRICS.stage("decode"):
+        return decodeImageIntoArray(data['image']), data
 
 
 @app.route("/predict", methods=['POST', 'GET'])
 @cross_origin()
+@modelRequired
+@admissionControlled
 def predictRoute():
     try:
+        # Decode the image straight into memory, no file is written
+        image, data = readRequestImage()
+
         # Check if the image is in the request
-        if 'image' not in request.json:
+        if image is None:
             return Response("No image file found in the request.", status=400)
 
-        # Ensure the "data" directory exists
-        if not os.path.exists('data'):
-            os.makedirs('data')
-
-        # Decode and save the image to the expected location
-        image = request.json['image']
-        decodeImage(image, clApp.filename)  # Save to "data/inputImage.jpg"
-        
-        if not os.path.exists(clApp.filename):
-            return Response("Failed to save the image", status=400)
-
-        # Predict using YOLOv8 model and save the result
-        results = clApp.model.predict(source=clApp.filename, save=True)  # Save the results automatically
-        
-        # Assuming the output is saved in the "runs/detect" folder, get the last prediction
-        output_dir = results[0].save_dir
-        output_image_path = os.path.join(output_dir, os.path.basename(clApp.filename))
-
-        # Encode the image in Base64 and return the result
-        opencodedbase64 = encodeImageIntoBase64(output_image_path)
-        result = {"image": opencodedbase64.decode('utf-8')}
-
-        # Clean up: Remove the 'runs' folder if no further use
-        runs_folder = os.path.dirname(output_dir)
-        if os.path.exists(runs_folder):
-            shutil.rmtree(runs_folder)  # Delete the entire 'runs' folder
+        # conf, classes and max_det filters are applied inside the model call
+        params, response_mode, render, compliance_engine, predict_fn = getPredictionOptions(data)
+
+        # Work still queued when the client's deadline passes is dropped instead of inferred
+        deadline = requestDeadline()
+        if deadline is not None:
+            params['deadline'] = deadline
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+        # Predict using YOLOv8 model, batched with any concurrent requests, unless the result is cached
+        if predict_fn is not None:
+            prediction = predict_fn([image], **params)[0]
+        else:
+            prediction = clApp.submit(image, **params).result(timeout)
 
+        # Clients asking for image/jpeg get the annotated image as raw bytes
+        if request.accept_mimetypes.best_match(['application/json', 'image/jpeg']) == 'image/jpeg':
+            return Response(render_jpeg(prediction), mimetype='image/jpeg')
+
+        # Structured detections, or the annotated image drawn and encoded in memory
+        result = build_prediction_payload(prediction, response_mode, render, compliance_engine)
+        emitViolations(result.get('compliance'), 'predict', data)
+
+    except DeadlineExceededError as e:
+        return Response(str(e), status=504)
+    except FutureTimeoutError:
+        return deadlineExceeded()
     except ValueError as val:
         print(val)
-        return Response("Value not found inside JSON data", status=400)
+        return Response(f"Invalid value inside JSON data: {val}", status=400)
     except KeyError:
         return Response("Key value error: incorrect key passed", status=400)
     except Exception as e:
@@ -107,9 +435,155 @@ def predictRoute():
     return jsonify(result)
 
 
-if __name__ == "__main__":
-    # Initialize the ClientApp instance with correct arguments (this needs to be passed in correctly)
-    model_pusher_config = ModelPusherConfig()  # Instantiate with the correct configuration
-    clApp = ClientApp(model_pusher_config=model_pusher_config)
+@app.route("/predict/batch", methods=['POST'])
+@cross_origin()
+@modelRequired
+@admissionControlled
+def predictBatchRoute():
+    # Images come either as a multipart upload or as a JSON array of base64 strings
+    if request.files:
+        uploads = request.files.getlist('images') or request.files.getlist('image')
+        sources = [lambda upload=upload: decodeBytesIntoArray(upload.read()) for upload in uploads]
+    else:
+        data = request.get_json(silent=True)
+        images = data.get('images') if isinstance(data, dict) else data
+        if not isinstance(images, list):
+            return Response("Expected a JSON array of base64 images or a multipart upload.", status=400)
+        sources = [lambda image=image: decodeImageIntoArray(image) for image in images]
+
+    if not sources:
+        return Response("No image file found in the request.", status=400)
 
-    app.run(host="0.0.0.0", port=8080)
\ No newline at end of file
+    try:
+        options = request.form.to_dict() if request.files else request.get_json(silent=True)
+        params, response_mode, render, compliance_engine, predict_fn = getPredictionOptions(options)
+        deadline = requestDeadline()
+        if deadline is not None:
+            params['deadline'] = deadline
+    except ValueError as val:
+        return Response(f"Invalid prediction option: {val}", status=400)
+
+    def submit_chunk(start):
+        # Decode only one chunk at a time, so memory stays bounded by the chunk size
+        chunk = []
+        for index in range(start, min(start + BATCH_PREDICT_CHUNK_SIZE, len(sources))):
+            try:
+                with METRICS.stage("decode"):
+                    image = sources[index]()
+                chunk.append((index, image if predict_fn is not None else clApp.submit(image, **params), None))
+            except Exception as e:
+                chunk.append((index, None, str(e)))
+        return chunk if predict_fn is None else predict_chunk(chunk)
+
+    def predict_chunk(chunk):
+        # Tiles or ROI crops of the whole chunk run as one batch, then each image is merged on its own
+        decoded = [(index, image) for index, image, error in chunk if error is None]
+        try:
+            predictions = predict_fn([image for _, image in decoded], **params)
+        except Exception as e:
+            return [(index, None, error or str(e)) for index, _, error in chunk]
+        results = dict(zip([index for index, _ in decoded], predictions))
+        return [(index, resolvedFuture(results[index]) if error is None else None, error)
+                for index, _, error in chunk]
+
+    def generate():
+        # The next chunk is already queued while the current one is streamed back
+        pending = submit_chunk(0)
+        for start in range(0, len(sources), BATCH_PREDICT_CHUNK_SIZE):
+            next_start = start + BATCH_PREDICT_CHUNK_SIZE
+            following = submit_chunk(next_start) if next_start < len(sources) else []
+            for index, future, error in pending:
+                line = {"index": index}
+                try:
+                    if error is not None:
+                        raise ValueError(error)
+                    line.update(build_prediction_payload(future.result(), response_mode, render,
+                                                               compliance_engine))
+                    emitViolations(line.get('compliance'), 'predict/batch', options, index=index)
+                except Exception as e:
+                    line["error"] = str(e)
+                yield json.dumps(line) + "\n"
+            pending = following
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/predict/video", methods=['POST'])
+@cross_origin()
+@modelRequired
+@admissionControlled
+def predictVideoRoute():
+    # Local video file, decoded frame by frame with a stride or target fps
+    data = request.get_json(silent=True) or {}
+    try:
+        if 'path' not in data:
+            return Response("No video path found in the request.", status=400)
+        video_path = clApp.video_inference.resolve_path(data['path'])
+        stride = int(data['stride']) if data.get('stride') is not None else None
+        target_fps = float(data['fps']) if data.get('fps') is not None else None
+        params, _, render, compliance_engine, predict_fn = getPredictionOptions(data)
+
+        # Optional static-scene frame skipping, one detector per stream
+        change_detector = None
+        if str(data.get('skip_static', '')).lower() in ('1', 'true', 'yes', 'on'):
+            change_detector = SceneChangeDetector(SceneChangeConfig(
+                threshold=float(data.get('skip_threshold', SceneChangeConfig.threshold)),
+                refresh_interval=int(data.get('refresh_interval', SceneChangeConfig.refresh_interval)),
+            ))
+
+        # Optional worker tracking with one event per violation and track, one tracker per stream
+        tracker = None
+        detect_interval = int(data.get('detect_every', TrackingConfig.detect_interval))
+        if detect_interval < 1:
+            raise ValueError(f"detect_every must be at least 1, got {detect_interval}")
+        if str(data.get('track', '')).lower() in ('1', 'true', 'yes', 'on'):
+            tracker = StreamTracker(clApp.compliance_engine, TrackingConfig(), clApp.event_sink, data['path'])
+            # The low-confidence detections keep occluded workers on their track
+            params.setdefault('conf', TrackingConfig.low_threshold)
+    except FileNotFoundError as e:
+        return Response(str(e), status=404)
+    except ValueError as val:
+        return Response(f"Invalid value inside JSON data: {val}", status=400)
+
+    if data.get('format', 'ndjson') == 'mjpeg':
+        frames = clApp.video_inference.iter_mjpeg(video_path, stride, target_fps, change_detector, predict_fn,
+                                                  tracker, detect_interval, **params)
+        return Response(stream_with_context(frames),
+                        mimetype=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}")
+
+    lines = clApp.video_inference.iter_ndjson(video_path, stride, target_fps, render=render,
+                                              change_detector=change_detector, predict_fn=predict_fn,
+                                              compliance_engine=compliance_engine, tracker=tracker,
+                                              detect_interval=detect_interval, **params)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+@app.route("/metrics")
+def metricsEndpointRoute():
+    # Prometheus text exposition of this process's serving metrics
+    return Response(METRICS.render(), content_type=METRICS.CONTENT_TYPE)
+
+
+@app.route("/streams")
+def streamsRoute():
+    # Achieved fps, dropped frames and lag of every camera stream run by this process
+    if clApp.stream_manager is None:
+        return jsonify({"streams": [], "batches": 0, "mean_batch_size": 0.0})
+    return jsonify(clApp.stream_manager.stats())
+
+
+@app.route("/predict/stats")
+def predictStatsRoute():
+    # Batch-size and queue-wait statistics of the inference scheduler, plus the result cache counters
+    stats = clApp.scheduler.stats()
+    stats["result_cache"] = clApp.result_cache.stats()
+    stats["frame_skipping"] = clApp.video_inference.skip_stats()
+    stats["adaptive_resolution"] = clApp.adaptive_resolution.stats()
+    stats["event_sink"] = clApp.event_sink.stats() if clApp.event_sink is not None else None
+    stats["cpu_profile"] = clApp.cpu_profile.settings
+    return jsonify(stats)
+
+
+if __name__ == "__main__":
+    # Per-request state lives in memory only, so requests can be served concurrently
+    create_app().run(host="0.0.0.0", port=8080, threaded=True)
@@ -8,8 +8,9 @@ from ultralytics import YOLO
 from isd.logger import logging
 from isd.exception import isdException
 from isd.constant.training_pipeline import *
-from isd.entity.config_entity import ModelEvaluationConfig
-from isd.entity.artifacts_entity import ModelEvaluationArtifact, ModelTrainerArtifact, DataIngestionArtifact
+from isd.entity.config_entity import ModelEvaluationConfig, ModelQuantizerConfig
+from isd.entity.artifacts_entity import (ModelEvaluationArtifact, ModelTrainerArtifact, DataIngestionArtifact,
+                                         ModelQuantizerArtifact, QuantizedModelEvaluationArtifact)
 
 
 class ModelEvaluation:
@@ -22,23 +23,24 @@ class ModelEvaluation:
         except Exception as e:
             raise isdException(e, sys)
 
-    def load_model(self):
-        logging.info(f"Loading trained model from {self.model_trainer_artifact.trained_model_file_path}")
+    def load_model(self, model_path: str = None):
+        model_path = model_path or self.model_trainer_artifact.trained_model_file_path
+        logging.info(f"Loading trained model from {model_path}")
 
         try:
-            # Load the trained YOLOv8 model
-            model = YOLO(self.model_trainer_artifact.trained_model_file_path)
-            logging.info(f"Loaded model from {self.model_trainer_artifact.trained_model_file_path}")
+            # Load the trained YOLOv8 model, or an exported one such as the INT8 ONNX model
+            model = YOLO(model_path, task="detect")
+            logging.info(f"Loaded model from {model_path}")
             return model
         except Exception as e:
             raise isdException(e, sys)
 
-    def evaluate_model(self):
+    def evaluate_model(self, model_path: str = None):
         logging.info("Starting model evaluation.")
 
         try:
             unzip_dir = "isd_dataset"
-            self.model = self.load_model()
+            self.model = self.load_model(model_path)
             
             # Evaluate model performance using YOLO's built-in validation method
             results = self.model.val(
@@ -57,8 +59,9 @@ class ModelEvaluation:
             }
 
             # Remove the entire 'isd_dataset' folder
-            shutil.rmtree(unzip_dir)
-            logging.info(f"Removed the {unzip_dir} directory")
+            if os.path.exists(unzip_dir):
+                shutil.rmtree(unzip_dir)
+                logging.info(f"Removed the {unzip_dir} directory")
 
             return metrics
 
@@ -70,7 +73,7 @@ class ModelEvaluation:
         try:
             mlflow.set_experiment("YOLOv8 Model Evaluation")
 
-            with mlflow.start_run():
+            with mlflow.start_run() as run:
                 # Evaluate on validation dataset
                 logging.info("Evaluating on validation dataset")
                 metrics = self.evaluate_model()
@@ -106,7 +109,8 @@ class ModelEvaluation:
                 # Create ModelEvaluationArtifact
                 model_evaluation_artifact = ModelEvaluationArtifact(
                     evaluated_model_metrics=metrics_serializable,
-                    evaluation_metrics_file_path=self.model_evaluation_config.metrics_file_path
+                    evaluation_metrics_file_path=self.model_evaluation_config.metrics_file_path,
+                    mlflow_run_id=run.info.run_id
                 )
 
                 logging.info(f"Model evaluation artifact: {model_evaluation_artifact}")
@@ -115,4 +119,60 @@ class ModelEvaluation:
                 return model_evaluation_artifact
 
         except Exception as e:
-            raise isdException(e, sys)
\ No newline at end of file
+            raise isdException(e, sys)
+
+    def initiate_quantized_model_evaluation(self, model_evaluation_artifact: ModelEvaluationArtifact,
+                                            model_quantizer_artifact: ModelQuantizerArtifact,
+                                            model_quantizer_config: ModelQuantizerConfig) -> QuantizedModelEvaluationArtifact:
+        """
+        Evaluates the INT8 model on the same validation data as the FP32 one and
+        accepts it only if the mAP_50 drop stays within max_map50_drop. The
+        result is logged to the MLflow run of the FP32 evaluation.
+        """
+        logging.info("Starting quantized model evaluation...")
+        try:
+            metrics = self.evaluate_model(model_quantizer_artifact.quantized_model_file_path)
+            quantized_metrics = {
+                metric: float(np.mean(value)) if isinstance(value, (list, tuple, np.ndarray)) else float(value)
+                for metric, value in metrics.items()
+            }
+
+            map50_drop = float(model_evaluation_artifact.evaluated_model_metrics["mAP_50"]) - quantized_metrics["mAP_50"]
+            is_model_accepted = map50_drop <= model_quantizer_config.max_map50_drop
+            logging.info(f"INT8 mAP_50 {quantized_metrics['mAP_50']:.4f}, drop {map50_drop:.4f}, "
+                         f"speedup {model_quantizer_artifact.speedup}x, accepted: {is_model_accepted}")
+
+            mlflow.set_experiment("YOLOv8 Model Evaluation")
+            with mlflow.start_run(run_id=model_evaluation_artifact.mlflow_run_id):
+                for metric, value in quantized_metrics.items():
+                    mlflow.log_metric(f"int8_{metric}", value)
+                mlflow.log_metric("int8_mAP_50_drop", map50_drop)
+                mlflow.log_metric("int8_speedup", model_quantizer_artifact.speedup)
+                mlflow.log_metric("int8_latency_ms", model_quantizer_artifact.latency_ms["onnx_int8"]["median"])
+                mlflow.log_metric("onnx_latency_ms", model_quantizer_artifact.latency_ms["onnx"]["median"])
+                mlflow.log_metric("int8_accepted", int(is_model_accepted))
+
+            if is_model_accepted:
+                # Publish next to the FP32 weights, where the server looks for the onnx_int8 backend
+                model_dir = os.path.dirname(self.model_trainer_artifact.trained_model_file_path)
+                shutil.copy(model_quantizer_artifact.quantized_model_file_path,
+                            os.path.join(model_dir, model_quantizer_config.quantized_model_name))
+            else:
+                logging.warning(f"INT8 model rejected, mAP_50 drop {map50_drop:.4f} exceeds "
+                                f"{model_quantizer_config.max_map50_drop}")
+
+            quantized_model_evaluation_artifact = QuantizedModelEvaluationArtifact(
+                is_model_accepted=is_model_accepted,
+                quantized_model_file_path=model_quantizer_artifact.quantized_model_file_path,
+                quantized_model_metrics=quantized_metrics,
+                map50_drop=map50_drop,
+                speedup=model_quantizer_artifact.speedup,
+            )
+
+            logging.info(f"Quantized model evaluation artifact: {quantized_model_evaluation_artifact}")
+            logging.info("Exited initiate_quantized_model_evaluation method of ModelEvaluation class")
+
+            return quantized_model_evaluation_artifact
+
+        except Exception as e:
+            raise isdException(e, sys)
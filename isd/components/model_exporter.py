@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from ultralytics import YOLO
+from isd.logger import logging
+from isd.exception import isdException
+from isd.constant.training_pipeline import *
+from isd.entity.config_entity import ModelExporterConfig
+from isd.entity.artifacts_entity import ModelExporterArtifact, ModelTrainerArtifact, DataIngestionArtifact
+
+
+class ModelExporter:
+    def __init__(self, model_trainer_artifact: ModelTrainerArtifact, model_exporter_config: ModelExporterConfig,
+                 data_ingestion_artifact: DataIngestionArtifact):
+        try:
+            self.model_trainer_artifact = model_trainer_artifact
+            self.model_exporter_config = model_exporter_config
+            self.data_ingestion_artifact = data_ingestion_artifact
+        except Exception as e:
+            raise isdException(e, sys)
+
+    def export_model(self, export_format: str) -> str:
+        logging.info(f"Exporting {self.model_trainer_artifact.trained_model_file_path} to {export_format}")
+
+        try:
+            model = YOLO(self.model_trainer_artifact.trained_model_file_path)
+            # Dynamic axes keep batched serving possible on the exported model
+            exported_path = model.export(
+                format=export_format,
+                imgsz=self.model_exporter_config.image_size,
+                dynamic=True,
+            )
+            logging.info(f"Exported {export_format} model to {exported_path}")
+            return str(exported_path)
+        except Exception as e:
+            raise isdException(e, sys)
+
+    @staticmethod
+    def file_md5(path: str) -> str:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load_validation_batch(self):
+        """A few validation images as a (B, 3, H, W) float tensor, random data if the split is missing"""
+        import cv2
+        import torch
+
+        size = self.model_exporter_config.image_size
+        images_dir = os.path.join(self.data_ingestion_artifact.feature_store_path, "valid", "images")
+        images = []
+        if os.path.isdir(images_dir):
+            for file_name in sorted(os.listdir(images_dir))[:self.model_exporter_config.validation_images]:
+                image = cv2.imread(os.path.join(images_dir, file_name))
+                if image is not None:
+                    images.append(cv2.resize(image, (size, size))[:, :, ::-1])
+
+        if not images:
+            logging.info("No validation images found, validating exports on random data")
+            rng = np.random.default_rng(0)
+            images = [rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+                      for _ in range(self.model_exporter_config.validation_images)]
+
+        batch = np.ascontiguousarray(np.stack(images).transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        return torch.from_numpy(batch)
+
+    @staticmethod
+    def load_backend(model_path: str):
+        import torch
+        from ultralytics.nn.autobackend import AutoBackend
+
+        return AutoBackend(model_path, device=torch.device("cpu"), fp16=False)
+
+    @staticmethod
+    def raw_predictions(backend, batch) -> np.ndarray:
+        outputs = backend(batch)
+        if isinstance(outputs, (list, tuple)):
+            outputs = outputs[0]
+        return outputs.detach().cpu().numpy() if hasattr(outputs, "detach") else np.asarray(outputs)
+
+    @staticmethod
+    def measure_latency(backend, batch, runs: int) -> dict:
+        """Median and p95 latency of a single-image forward pass on CPU"""
+        single = batch[:1]
+        ModelExporter.raw_predictions(backend, single)  # warm-up
+        timings = []
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            ModelExporter.raw_predictions(backend, single)
+            timings.append((time.perf_counter() - started_at) * 1000.0)
+        return {
+            "median": round(float(np.median(timings)), 3),
+            "p95": round(float(np.percentile(timings, 95)), 3),
+        }
+
+    def initiate_model_exporter(self) -> ModelExporterArtifact:
+        logging.info("Entered initiate_model_exporter method of ModelExporter class")
+
+        try:
+            os.makedirs(self.model_exporter_config.model_exporter_dir, exist_ok=True)
+            batch = self.load_validation_batch()
+
+            reference_backend = self.load_backend(self.model_trainer_artifact.trained_model_file_path)
+            reference = self.raw_predictions(reference_backend, batch)
+
+            exported_model_paths = {"pytorch": self.model_trainer_artifact.trained_model_file_path}
+            max_abs_diff = {"pytorch": 0.0}
+            latency_ms = {"pytorch": self.measure_latency(reference_backend, batch, self.model_exporter_config.latency_runs)}
+            valid_backends = ["pytorch"]
+
+            for export_format in self.model_exporter_config.formats:
+                try:
+                    exported_path = self.export_model(export_format)
+                    backend = self.load_backend(exported_path)
+                    outputs = self.raw_predictions(backend, batch)
+                    latency = self.measure_latency(backend, batch, self.model_exporter_config.latency_runs)
+                except Exception as e:
+                    # OpenVINO is optional, a backend that fails to export, load or run is only dropped
+                    logging.error(f"Skipping {export_format} backend, export or validation failed: {e}")
+                    continue
+
+                exported_model_paths[export_format] = exported_path
+                max_abs_diff[export_format] = float(np.abs(outputs - reference).max())
+                latency_ms[export_format] = latency
+
+                if np.allclose(outputs, reference, atol=self.model_exporter_config.atol,
+                               rtol=self.model_exporter_config.rtol):
+                    valid_backends.append(export_format)
+                    logging.info(f"{export_format} outputs match PyTorch, max abs diff {max_abs_diff[export_format]:.6f}")
+                else:
+                    logging.error(f"{export_format} outputs differ from PyTorch beyond tolerance, "
+                                  f"max abs diff {max_abs_diff[export_format]:.6f}")
+
+            best_backend = min(valid_backends, key=lambda name: latency_ms[name]["median"])
+
+            report = {
+                "exported_model_paths": exported_model_paths,
+                "max_abs_diff": max_abs_diff,
+                "latency_ms": latency_ms,
+                "valid_backends": valid_backends,
+                "best_backend": best_backend,
+                "image_size": self.model_exporter_config.image_size,
+                # The server only serves the exports together with the weights they were made from
+                "model_md5": self.file_md5(self.model_trainer_artifact.trained_model_file_path),
+            }
+            with open(self.model_exporter_config.export_report_file_path, 'w') as f:
+                json.dump(report, f, indent=4)
+
+            # Keep a copy next to the weights, the server reads it to pick the fastest backend
+            model_dir = os.path.dirname(self.model_trainer_artifact.trained_model_file_path)
+            shutil.copy(self.model_exporter_config.export_report_file_path,
+                        os.path.join(model_dir, MODEL_EXPORTER_REPORT_FILE_NAME))
+            logging.info(f"Export report saved to {self.model_exporter_config.export_report_file_path}")
+
+            model_exporter_artifact = ModelExporterArtifact(
+                exported_model_paths=exported_model_paths,
+                max_abs_diff=max_abs_diff,
+                latency_ms=latency_ms,
+                best_backend=best_backend,
+                export_report_file_path=self.model_exporter_config.export_report_file_path,
+            )
+
+            logging.info(f"Model exporter artifact: {model_exporter_artifact}")
+            logging.info("Exited initiate_model_exporter method of ModelExporter class")
+
+            return model_exporter_artifact
+
+        except Exception as e:
+            raise isdException(e, sys)
@@ -1,8 +1,12 @@
+import os
 import sys
+import json
 from isd.configuration.s3_operations import S3Operation
 from isd.entity.artifacts_entity import (
     ModelPusherArtifacts,
-    ModelTrainerArtifact
+    ModelTrainerArtifact,
+    ModelExporterArtifact,
+    QuantizedModelEvaluationArtifact
 )
 from isd.entity.config_entity import ModelPusherConfig
 from isd.exception import isdException
@@ -10,13 +14,53 @@ from isd.logger import logging
 
 
 class ModelPusher:
-    def __init__(self,model_pusher_config: ModelPusherConfig,model_trainer_artifact: ModelTrainerArtifact, s3: S3Operation):
+    def __init__(self,model_pusher_config: ModelPusherConfig,model_trainer_artifact: ModelTrainerArtifact, s3: S3Operation,
+                 quantized_model_evaluation_artifact: QuantizedModelEvaluationArtifact = None,
+                 model_exporter_artifact: ModelExporterArtifact = None):
 
         self.model_pusher_config = model_pusher_config
         self.model_trainer_artifacts = model_trainer_artifact
+        self.quantized_model_evaluation_artifact = quantized_model_evaluation_artifact
+        self.model_exporter_artifact = model_exporter_artifact
         self.s3 = s3
 
 
+    def push_exported_models(self) -> list:
+        """
+        Upload the exports that matched PyTorch and the export report, so
+        replicas serving onnx, openvino or auto get them from S3 too
+        """
+        with open(self.model_exporter_artifact.export_report_file_path) as f:
+            report = json.load(f)
+        s3_keys = {
+            "onnx": self.model_pusher_config.S3_ONNX_MODEL_KEY_PATH,
+            "openvino": self.model_pusher_config.S3_OPENVINO_MODEL_KEY_PATH,
+        }
+        pushed = []
+        for backend in report["valid_backends"]:
+            if backend not in s3_keys:
+                continue
+            exported_path = self.model_exporter_artifact.exported_model_paths[backend]
+            if os.path.isdir(exported_path):
+                # OpenVINO models are a directory of .xml, .bin and metadata files
+                for root, _, files in os.walk(exported_path):
+                    for file_name in files:
+                        local_path = os.path.join(root, file_name)
+                        relative_path = os.path.relpath(local_path, exported_path).replace(os.sep, "/")
+                        self.s3.upload_file(local_path, f"{s3_keys[backend]}/{relative_path}",
+                                            self.model_pusher_config.MODEL_BUCKET_NAME, remove=False)
+            else:
+                self.s3.upload_file(exported_path, s3_keys[backend],
+                                    self.model_pusher_config.MODEL_BUCKET_NAME, remove=False)
+            pushed.append(backend)
+
+        self.s3.upload_file(self.model_exporter_artifact.export_report_file_path,
+                            self.model_pusher_config.S3_EXPORT_REPORT_KEY_PATH,
+                            self.model_pusher_config.MODEL_BUCKET_NAME, remove=False)
+        logging.info(f"Uploaded {pushed} exported models and the export report to s3 bucket")
+        return pushed
+
+
     
     def initiate_model_pusher(self) -> ModelPusherArtifacts:
 
@@ -29,6 +73,14 @@ class ModelPusher:
         """
         logging.info("Entered initiate_model_pusher method of Modelpusher class")
         try:
+            # Exports go first, so they are already in place when replicas see the new best model
+            if self.model_exporter_artifact is not None:
+                try:
+                    self.push_exported_models()
+                except Exception as e:
+                    # Replicas then fall back to PyTorch, the best model is still published
+                    logging.error(f"Could not upload the exported models: {e}")
+
             # Uploading the best model to s3 bucket
             self.s3.upload_file(
                 self.model_trainer_artifacts.trained_model_file_path,
@@ -37,12 +89,26 @@ class ModelPusher:
                 remove=False,
             )
             logging.info("Uploaded best model to s3 bucket")
+
+            # The INT8 model is only published when it passed the accuracy gate
+            s3_quantized_model_path = None
+            if self.quantized_model_evaluation_artifact is not None and \
+                    self.quantized_model_evaluation_artifact.is_model_accepted:
+                self.s3.upload_file(
+                    self.quantized_model_evaluation_artifact.quantized_model_file_path,
+                    self.model_pusher_config.S3_QUANTIZED_MODEL_KEY_PATH,
+                    self.model_pusher_config.MODEL_BUCKET_NAME,
+                    remove=False,
+                )
+                s3_quantized_model_path = self.model_pusher_config.S3_QUANTIZED_MODEL_KEY_PATH
+                logging.info("Uploaded INT8 model to s3 bucket")
             logging.info("Exited initiate_model_pusher method of ModelTrainer class")
 
             # Saving the model pusher artifacts
             model_pusher_artifact = ModelPusherArtifacts(
                 bucket_name=self.model_pusher_config.MODEL_BUCKET_NAME,
                 s3_model_path=self.model_pusher_config.S3_MODEL_KEY_PATH,
+                s3_quantized_model_path=s3_quantized_model_path,
             )
 
             return model_pusher_artifact
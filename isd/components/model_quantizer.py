@@ -0,0 +1,163 @@
+import os
+import sys
+import numpy as np
+from ultralytics import YOLO
+from isd.logger import logging
+from isd.exception import isdException
+from isd.constant.training_pipeline import *
+from isd.entity.config_entity import ModelQuantizerConfig, ModelExporterConfig
+from isd.entity.artifacts_entity import (ModelQuantizerArtifact, ModelExporterArtifact,
+                                         ModelTrainerArtifact, DataIngestionArtifact)
+from isd.components.model_exporter import ModelExporter
+
+
+class ValidationCalibrationReader:
+    """Feeds letterboxed validation images to onnxruntime's static quantization one at a time"""
+
+    def __init__(self, image_paths, input_name: str, image_size: int):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.image_size = image_size
+        self._index = 0
+
+    def preprocess(self, image_path: str):
+        import cv2
+        from ultralytics.data.augment import LetterBox
+
+        image = cv2.imread(image_path)
+        if image is None:
+            return None
+        # Same letterboxing as inference, so the activation ranges match what serving sees
+        image = LetterBox(new_shape=(self.image_size, self.image_size), auto=False)(image=image)
+        image = image[:, :, ::-1].transpose(2, 0, 1)[None]
+        return np.ascontiguousarray(image, dtype=np.float32) / 255.0
+
+    def get_next(self):
+        while self._index < len(self.image_paths):
+            image = self.preprocess(self.image_paths[self._index])
+            self._index += 1
+            if image is not None:
+                return {self.input_name: image}
+        return None
+
+    def rewind(self):
+        self._index = 0
+
+
+class ModelQuantizer:
+    def __init__(self, model_exporter_artifact: ModelExporterArtifact, model_trainer_artifact: ModelTrainerArtifact,
+                 model_quantizer_config: ModelQuantizerConfig, data_ingestion_artifact: DataIngestionArtifact):
+        try:
+            self.model_exporter_artifact = model_exporter_artifact
+            self.model_trainer_artifact = model_trainer_artifact
+            self.model_quantizer_config = model_quantizer_config
+            self.data_ingestion_artifact = data_ingestion_artifact
+        except Exception as e:
+            raise isdException(e, sys)
+
+    def get_onnx_model_path(self) -> str:
+        """FP32 ONNX model to quantize, exported here if the exporter stage skipped it"""
+        onnx_path = self.model_exporter_artifact.exported_model_paths.get("onnx")
+        if onnx_path and os.path.exists(onnx_path):
+            return onnx_path
+
+        logging.info("No ONNX export found, exporting the trained model before quantization")
+        model = YOLO(self.model_trainer_artifact.trained_model_file_path)
+        return str(model.export(format="onnx", imgsz=self.model_quantizer_config.image_size, dynamic=True))
+
+    def get_calibration_images(self) -> list:
+        images_dir = os.path.join(self.data_ingestion_artifact.feature_store_path, "valid", "images")
+        if not os.path.isdir(images_dir):
+            raise FileNotFoundError(f"Calibration images not found in {images_dir}")
+
+        image_paths = [os.path.join(images_dir, file_name) for file_name in sorted(os.listdir(images_dir))]
+        image_paths = image_paths[:self.model_quantizer_config.calibration_images]
+        if not image_paths:
+            raise FileNotFoundError(f"No calibration images in {images_dir}")
+        return image_paths
+
+    def get_nodes_to_exclude(self, onnx_model_path: str) -> list:
+        """
+        The detect head decodes boxes into pixel coordinates, a range INT8 cannot
+        hold without large errors, so it stays in FP32 and only the backbone and
+        neck are quantized.
+        """
+        import onnx
+
+        detect_index = len(YOLO(self.model_trainer_artifact.trained_model_file_path).model.model) - 1
+        prefix = f"/model.{detect_index}/"
+        graph = onnx.load(onnx_model_path).graph
+        return [node.name for node in graph.node if node.name.startswith(prefix)]
+
+    def quantize_model(self, onnx_model_path: str, calibration_images: list) -> str:
+        logging.info(f"Quantizing {onnx_model_path} to INT8 with {len(calibration_images)} calibration images")
+
+        try:
+            import onnxruntime as ort
+            from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            os.makedirs(self.model_quantizer_config.model_quantizer_dir, exist_ok=True)
+            preprocessed_path = os.path.join(self.model_quantizer_config.model_quantizer_dir, "preprocessed.onnx")
+            quantized_path = os.path.join(self.model_quantizer_config.model_quantizer_dir,
+                                          self.model_quantizer_config.quantized_model_name)
+
+            # Symbolic shape inference fails on the dynamic axes, ONNX shape inference is enough here
+            quant_pre_process(onnx_model_path, preprocessed_path, skip_symbolic_shape=True)
+
+            input_name = ort.InferenceSession(onnx_model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            calibration_reader = ValidationCalibrationReader(calibration_images, input_name,
+                                                             self.model_quantizer_config.image_size)
+
+            quantize_static(
+                preprocessed_path,
+                quantized_path,
+                calibration_reader,
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                nodes_to_exclude=self.get_nodes_to_exclude(onnx_model_path),
+            )
+            os.remove(preprocessed_path)
+
+            logging.info(f"Quantized model saved to {quantized_path}")
+            return quantized_path
+        except Exception as e:
+            raise isdException(e, sys)
+
+    def initiate_model_quantizer(self) -> ModelQuantizerArtifact:
+        logging.info("Entered initiate_model_quantizer method of ModelQuantizer class")
+
+        try:
+            onnx_model_path = self.get_onnx_model_path()
+            calibration_images = self.get_calibration_images()
+            quantized_model_path = self.quantize_model(onnx_model_path, calibration_images)
+
+            # Latency on the same validation batch the exporter uses, FP32 ONNX is the baseline
+            batch = ModelExporter(self.model_trainer_artifact, ModelExporterConfig(
+                image_size=self.model_quantizer_config.image_size
+            ), self.data_ingestion_artifact).load_validation_batch()
+            latency_ms = {
+                "onnx": ModelExporter.measure_latency(ModelExporter.load_backend(onnx_model_path), batch,
+                                                      self.model_quantizer_config.latency_runs),
+                "onnx_int8": ModelExporter.measure_latency(ModelExporter.load_backend(quantized_model_path), batch,
+                                                           self.model_quantizer_config.latency_runs),
+            }
+            speedup = round(latency_ms["onnx"]["median"] / max(latency_ms["onnx_int8"]["median"], 1e-9), 3)
+            logging.info(f"INT8 latency {latency_ms['onnx_int8']} vs FP32 {latency_ms['onnx']}, speedup {speedup}x")
+
+            model_quantizer_artifact = ModelQuantizerArtifact(
+                quantized_model_file_path=quantized_model_path,
+                calibration_images=len(calibration_images),
+                latency_ms=latency_ms,
+                speedup=speedup,
+            )
+
+            logging.info(f"Model quantizer artifact: {model_quantizer_artifact}")
+            logging.info("Exited initiate_model_quantizer method of ModelQuantizer class")
+
+            return model_quantizer_artifact
+
+        except Exception as e:
+            raise isdException(e, sys)
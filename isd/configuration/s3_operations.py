@@ -19,9 +19,37 @@ class S3Operation:
         self.s3_resource = boto3.resource("s3")
 
     
-    def download_object(self,key, bucket_name, filename):
+    def download_object(self,key, bucket_name, filename, version_id: str = None):
         bucket = self.s3_resource.Bucket(bucket_name)
-        bucket.download_file(Key = key, Filename = filename)
+        # A version id downloads that exact object version of a versioned bucket
+        extra_args = {"VersionId": version_id} if version_id else None
+        bucket.download_file(Key = key, Filename = filename, ExtraArgs = extra_args)
+
+
+    def get_object_version(self, bucket_name: str, key: str, version_id: str = None) -> Union[dict, None]:
+
+        """
+        Method Name :   get_object_version
+
+        Description :   This method reads the ETag and version id of an object without downloading it
+        
+        Output      :   dict with etag, version_id and last_modified, None if the object does not exist
+        """
+        try:
+            head_args = {"Bucket": bucket_name, "Key": key}
+            if version_id:
+                head_args["VersionId"] = version_id
+            response = self.s3_client.head_object(**head_args)
+            return {
+                "etag": response["ETag"].strip('"'),
+                "version_id": response.get("VersionId"),
+                "last_modified": str(response.get("LastModified")),
+            }
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NoSuchVersion"):
+                return None
+            raise isdException(e, sys) from e
 
 
     @staticmethod
@@ -208,6 +236,32 @@ class S3Operation:
         except Exception as e:
             raise isdException(e, sys) from e
 
+    def download_folder(self, prefix: str, bucket_name: str, folder_name: str) -> int:
+
+        """
+        Method Name :   download_folder
+
+        Description :   This method downloads every object under the prefix/ key prefix into folder_name
+        
+        Output      :   Number of files downloaded
+        """
+        try:
+            bucket = self.s3_resource.Bucket(bucket_name)
+            count = 0
+            for object_summary in bucket.objects.filter(Prefix=prefix.rstrip("/") + "/"):
+                relative_path = object_summary.key[len(prefix.rstrip("/")) + 1:]
+                if not relative_path or relative_path.endswith("/"):
+                    continue
+                filename = os.path.join(folder_name, relative_path)
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                bucket.download_file(Key=object_summary.key, Filename=filename)
+                count += 1
+            return count
+
+        except Exception as e:
+            raise isdException(e, sys) from e
+
+
     def upload_folder(self, folder_name: str, bucket_name: str) -> None:
 
         """
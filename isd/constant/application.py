@@ -0,0 +1,262 @@
+import os
+
+
+"""
+Prediction related constant start with PREDICTION var name
+"""
+PREDICTION_IMAGE_SIZE: int = int(os.getenv("PREDICTION_IMAGE_SIZE", 640))
+
+
+"""
+Model manager related constant start with MODEL_MANAGER var name
+"""
+MODEL_MANAGER_MODEL_DIR: str = "model"
+
+MODEL_MANAGER_MODEL_FILE_NAME: str = "best.pt"
+
+MODEL_MANAGER_RETRY_INTERVAL: float = float(os.getenv("MODEL_MANAGER_RETRY_INTERVAL", 30))
+
+MODEL_MANAGER_EXPORT_REPORT_FILE_NAME: str = "export_report.json"
+
+MODEL_MANAGER_RELOAD_INTERVAL: float = float(os.getenv("MODEL_MANAGER_RELOAD_INTERVAL", 60))
+
+MODEL_MANAGER_ADMIN_TOKEN: str = os.getenv("MODEL_MANAGER_ADMIN_TOKEN", "")
+
+MODEL_MANAGER_SOURCE_FILE_SUFFIX: str = ".source.json"
+
+
+"""
+Inference backend related constant start with INFERENCE_BACKEND var name
+"""
+INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "pytorch")
+
+INFERENCE_BACKEND_MODEL_FILES = {
+    "pytorch": "best.pt",
+    "onnx": "best.onnx",
+    "openvino": "best_openvino_model",
+    "onnx_int8": "best_int8.onnx",
+}
+
+
+"""
+Inference scheduler related constant start with INFERENCE_SCHEDULER var name
+"""
+INFERENCE_SCHEDULER_MAX_BATCH_SIZE: int = int(os.getenv("INFERENCE_SCHEDULER_MAX_BATCH_SIZE", 8))
+
+INFERENCE_SCHEDULER_MAX_WAIT_MS: float = float(os.getenv("INFERENCE_SCHEDULER_MAX_WAIT_MS", 10))
+
+INFERENCE_SCHEDULER_STATS_WINDOW: int = 1024
+
+# Images allowed to wait before new requests are answered 503, 0 leaves the queue unbounded
+INFERENCE_SCHEDULER_MAX_QUEUE_DEPTH: int = int(os.getenv("INFERENCE_SCHEDULER_MAX_QUEUE_DEPTH", 64))
+
+INFERENCE_SCHEDULER_RETRY_AFTER_SECONDS: int = int(os.getenv("INFERENCE_SCHEDULER_RETRY_AFTER_SECONDS", 1))
+
+# Remaining time budget of a request in milliseconds, queued work past it is dropped
+INFERENCE_SCHEDULER_DEADLINE_HEADER: str = "X-Request-Deadline-Ms"
+
+
+"""
+Inference worker pool related constant start with INFERENCE_WORKER var name
+"""
+INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", 0))
+
+INFERENCE_WORKER_THREADS: int = int(os.getenv("INFERENCE_WORKER_THREADS", 0))
+
+INFERENCE_WORKER_INTEROP_THREADS: int = int(os.getenv("INFERENCE_WORKER_INTEROP_THREADS", 0))
+
+INFERENCE_WORKER_START_TIMEOUT: float = 300.0
+
+INFERENCE_WORKER_PREDICT_TIMEOUT: float = float(os.getenv("INFERENCE_WORKER_PREDICT_TIMEOUT", 120))
+
+INFERENCE_WORKER_RESTART_BACKOFF: float = 5.0
+
+INFERENCE_WORKER_SHARED_MEMORY_SIZE: int = 64 * 1024 * 1024
+
+
+
+"""
+Batch prediction related constant start with BATCH_PREDICT var name
+"""
+BATCH_PREDICT_CHUNK_SIZE: int = int(os.getenv("BATCH_PREDICT_CHUNK_SIZE", INFERENCE_SCHEDULER_MAX_BATCH_SIZE))
+
+
+
+"""
+Result cache related constant start with RESULT_CACHE var name
+"""
+RESULT_CACHE_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+RESULT_CACHE_TTL_SECONDS: float = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 30))
+
+
+
+"""
+Video inference related constant start with VIDEO var name
+"""
+VIDEO_INPUT_DIR: str = os.getenv("VIDEO_INPUT_DIR", "data/videos")
+
+VIDEO_BATCH_SIZE: int = int(os.getenv("VIDEO_BATCH_SIZE", INFERENCE_SCHEDULER_MAX_BATCH_SIZE))
+
+VIDEO_DEFAULT_STRIDE: int = 1
+
+
+
+"""
+Scene change related constant start with SCENE_CHANGE var name
+"""
+SCENE_CHANGE_THRESHOLD: float = float(os.getenv("SCENE_CHANGE_THRESHOLD", 2.0))
+
+SCENE_CHANGE_REFRESH_INTERVAL: int = int(os.getenv("SCENE_CHANGE_REFRESH_INTERVAL", 30))
+
+SCENE_CHANGE_THUMBNAIL_WIDTH: int = 64
+
+
+
+"""
+Sliced inference related constant start with SLICING var name
+"""
+SLICING_TILE_SIZE: int = int(os.getenv("SLICING_TILE_SIZE", PREDICTION_IMAGE_SIZE))
+
+SLICING_OVERLAP: float = float(os.getenv("SLICING_OVERLAP", 0.2))
+
+SLICING_MERGE_IOU: float = float(os.getenv("SLICING_MERGE_IOU", 0.5))
+
+SLICING_FULL_FRAME: bool = os.getenv("SLICING_FULL_FRAME", "1") == "1"
+
+
+
+"""
+Camera region of interest related constant start with CAMERA var name
+"""
+CAMERA_CONFIG_FILE_PATH: str = os.getenv("CAMERA_CONFIG_FILE_PATH", os.path.join("config", "cameras.yaml"))
+
+CAMERA_ROI_PADDING: int = int(os.getenv("CAMERA_ROI_PADDING", 16))
+
+CAMERA_ROI_ANCHOR: str = os.getenv("CAMERA_ROI_ANCHOR", "center")
+
+CAMERA_ROI_STRIDE: int = 32
+
+
+
+"""
+Adaptive resolution related constant start with ADAPTIVE_RESOLUTION var name
+"""
+# Comma separated ladder of inference sizes, a single size keeps the resolution fixed
+ADAPTIVE_RESOLUTION_IMAGE_SIZES: tuple = tuple(
+    int(size) for size in os.getenv("ADAPTIVE_RESOLUTION_IMAGE_SIZES", str(PREDICTION_IMAGE_SIZE)).split(",")
+)
+
+ADAPTIVE_RESOLUTION_LATENCY_TARGET_MS: float = float(os.getenv("ADAPTIVE_RESOLUTION_LATENCY_TARGET_MS", 500))
+
+ADAPTIVE_RESOLUTION_MAX_QUEUE_DEPTH: int = int(os.getenv("ADAPTIVE_RESOLUTION_MAX_QUEUE_DEPTH",
+                                                         4 * INFERENCE_SCHEDULER_MAX_BATCH_SIZE))
+
+ADAPTIVE_RESOLUTION_INTERVAL: float = float(os.getenv("ADAPTIVE_RESOLUTION_INTERVAL", 5))
+
+ADAPTIVE_RESOLUTION_MIN_SAMPLES: int = 20
+
+ADAPTIVE_RESOLUTION_STEP_UP_HEADROOM: float = 0.8
+
+
+
+"""
+PPE compliance related constant start with COMPLIANCE var name
+"""
+COMPLIANCE_PERSON_CLASS: str = "Person"
+
+# (item, worn class, missing class) triples of the model's PPE classes
+COMPLIANCE_PPE_CLASSES: tuple = (
+    ("Hardhat", "Hardhat", "NO-Hardhat"),
+    ("Mask", "Mask", "NO-Mask"),
+    ("Safety Vest", "Safety Vest", "NO-Safety Vest"),
+)
+
+# Items that count as a violation when neither worn nor missing was detected on a person
+COMPLIANCE_REQUIRED_PPE: tuple = tuple(
+    item.strip() for item in os.getenv("COMPLIANCE_REQUIRED_PPE", "").split(",") if item.strip()
+)
+
+COMPLIANCE_MIN_CONTAINMENT: float = float(os.getenv("COMPLIANCE_MIN_CONTAINMENT", 0.5))
+
+
+
+"""
+Multi-object tracking related constant start with TRACKING var name
+"""
+# Detections above the high threshold start and extend tracks, those between the two thresholds only extend them
+TRACKING_HIGH_THRESHOLD: float = float(os.getenv("TRACKING_HIGH_THRESHOLD", 0.5))
+
+TRACKING_LOW_THRESHOLD: float = float(os.getenv("TRACKING_LOW_THRESHOLD", 0.1))
+
+TRACKING_NEW_TRACK_THRESHOLD: float = float(os.getenv("TRACKING_NEW_TRACK_THRESHOLD", 0.6))
+
+TRACKING_MATCH_IOU: float = float(os.getenv("TRACKING_MATCH_IOU", 0.2))
+
+TRACKING_LOW_MATCH_IOU: float = float(os.getenv("TRACKING_LOW_MATCH_IOU", 0.5))
+
+TRACKING_MIN_HITS: int = int(os.getenv("TRACKING_MIN_HITS", 2))
+
+# Detection frames a lost track is kept for before its events are closed
+TRACKING_BUFFER: int = int(os.getenv("TRACKING_BUFFER", 30))
+
+TRACKING_DETECT_INTERVAL: int = int(os.getenv("TRACKING_DETECT_INTERVAL", 1))
+
+TRACKING_VIOLATION_MIN_FRAMES: int = int(os.getenv("TRACKING_VIOLATION_MIN_FRAMES", 3))
+
+
+
+"""
+Violation event sink related constant start with EVENT_SINK var name
+"""
+# none, jsonl or sqlite
+EVENT_SINK_BACKEND: str = os.getenv("EVENT_SINK_BACKEND", "none")
+
+EVENT_SINK_PATH: str = os.getenv("EVENT_SINK_PATH", os.path.join(
+    "events", "violations.db" if EVENT_SINK_BACKEND == "sqlite" else "violations.jsonl"))
+
+EVENT_SINK_BATCH_SIZE: int = int(os.getenv("EVENT_SINK_BATCH_SIZE", 256))
+
+EVENT_SINK_FLUSH_INTERVAL: float = float(os.getenv("EVENT_SINK_FLUSH_INTERVAL", 1.0))
+
+# Events buffered in memory before new ones are dropped
+EVENT_SINK_MAX_PENDING: int = int(os.getenv("EVENT_SINK_MAX_PENDING", 50000))
+
+EVENT_SINK_MAX_RETRIES: int = int(os.getenv("EVENT_SINK_MAX_RETRIES", 3))
+
+EVENT_SINK_FSYNC: bool = os.getenv("EVENT_SINK_FSYNC", "0") == "1"
+
+
+
+"""
+Camera stream manager related constant start with STREAM var name
+"""
+STREAM_CONFIG_FILE_PATH: str = os.getenv("STREAM_CONFIG_FILE_PATH", os.path.join("config", "streams.yaml"))
+
+STREAM_DEFAULT_TARGET_FPS: float = float(os.getenv("STREAM_DEFAULT_TARGET_FPS", 5))
+
+STREAM_DEFAULT_CONF: float = float(os.getenv("STREAM_DEFAULT_CONF", 0.25))
+
+# Stream frames are queued as background work: they count for adaptive resolution but not towards
+# INFERENCE_SCHEDULER_MAX_QUEUE_DEPTH, so cameras never shed HTTP requests, and one batch in flight
+# per scheduling pass bounds what they can add to the queue
+STREAM_MAX_BATCH_SIZE: int = int(os.getenv("STREAM_MAX_BATCH_SIZE", INFERENCE_SCHEDULER_MAX_BATCH_SIZE))
+
+# Seconds before a reader reopens a source that failed or ended
+STREAM_RECONNECT_INTERVAL: float = float(os.getenv("STREAM_RECONNECT_INTERVAL", 5))
+
+STREAM_STATS_WINDOW: int = 256
+
+
+
+"""
+CPU profile related constant start with CPU_PROFILE var name
+"""
+CPU_PROFILE_FILE_PATH: str = os.getenv("CPU_PROFILE_FILE_PATH", os.path.join(MODEL_MANAGER_MODEL_DIR, "cpu_profile.json"))
+
+CPU_PROFILE_LATENCY_TARGET_MS: float = float(os.getenv("CPU_PROFILE_LATENCY_TARGET_MS",
+                                                       ADAPTIVE_RESOLUTION_LATENCY_TARGET_MS))
+
+CPU_PROFILE_RUNS: int = 10
+
+CPU_PROFILE_WARMUP_RUNS: int = 2
@@ -47,6 +47,10 @@ MODEL PUSHER related constant start with MODEL_PUSHER var name
 """
 MODEL_BUCKET_NAME = "isd-complete"
 S3_MODEL_NAME = "best.pt"
+S3_QUANTIZED_MODEL_NAME = "best_int8.onnx"
+S3_ONNX_MODEL_NAME = "best.onnx"
+S3_OPENVINO_MODEL_NAME = "best_openvino_model"
+S3_EXPORT_REPORT_NAME = "export_report.json"
 
 
 """
@@ -61,4 +65,40 @@ MODEL_EVALUATION_BATCH_SIZE: int = 8
 
 MODEL_EVALUATION_IMAGE_SIZE: int = 640
 
-MODEL_EVALUATION_DATA_YAML = "data.yaml"
\ No newline at end of file
+MODEL_EVALUATION_DATA_YAML = "data.yaml"
+
+
+
+"""
+Model Exporter related constant start with MODEL_EXPORTER var name
+"""
+
+MODEL_EXPORTER_DIR_NAME: str = "model_exporter"
+
+MODEL_EXPORTER_REPORT_FILE_NAME: str = "export_report.json"
+
+MODEL_EXPORTER_FORMATS: tuple = ("onnx", "openvino")
+
+MODEL_EXPORTER_IMAGE_SIZE: int = 640
+
+MODEL_EXPORTER_ATOL: float = 1e-3
+
+MODEL_EXPORTER_RTOL: float = 1e-3
+
+MODEL_EXPORTER_VALIDATION_IMAGES: int = 4
+
+MODEL_EXPORTER_LATENCY_RUNS: int = 20
+
+
+
+"""
+Model Quantizer related constant start with MODEL_QUANTIZER var name
+"""
+
+MODEL_QUANTIZER_DIR_NAME: str = "model_quantizer"
+
+MODEL_QUANTIZER_MODEL_NAME: str = "best_int8.onnx"
+
+MODEL_QUANTIZER_CALIBRATION_IMAGES: int = 100
+
+MODEL_QUANTIZER_MAX_MAP50_DROP: float = 0.01
@@ -26,10 +26,41 @@ class ModelTrainerArtifact:
 class ModelPusherArtifacts:
     bucket_name: str
     s3_model_path: str
+    s3_quantized_model_path: str = None
 
 
 
 @dataclass
 class ModelEvaluationArtifact:
     evaluated_model_metrics: dict
-    evaluation_metrics_file_path: str
\ No newline at end of file
+    evaluation_metrics_file_path: str
+    mlflow_run_id: str = None
+
+
+
+@dataclass
+class ModelExporterArtifact:
+    exported_model_paths: dict
+    max_abs_diff: dict
+    latency_ms: dict
+    best_backend: str
+    export_report_file_path: str
+
+
+
+@dataclass
+class ModelQuantizerArtifact:
+    quantized_model_file_path: str
+    calibration_images: int
+    latency_ms: dict
+    speedup: float
+
+
+
+@dataclass
+class QuantizedModelEvaluationArtifact:
+    is_model_accepted: bool
+    quantized_model_file_path: str
+    quantized_model_metrics: dict
+    map50_drop: float
+    speedup: float
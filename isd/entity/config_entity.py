@@ -2,6 +2,7 @@ import os
 from dataclasses import dataclass
 from datetime import datetime
 from isd.constant.training_pipeline import *
+from isd.constant.application import *
 
 TIMESTAMP: str = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
 
@@ -60,6 +61,10 @@ class ModelTrainerConfig:
 class ModelPusherConfig:
     MODEL_BUCKET_NAME: str = MODEL_BUCKET_NAME
     S3_MODEL_KEY_PATH: str = S3_MODEL_NAME
+    S3_QUANTIZED_MODEL_KEY_PATH: str = S3_QUANTIZED_MODEL_NAME
+    S3_ONNX_MODEL_KEY_PATH: str = S3_ONNX_MODEL_NAME
+    S3_OPENVINO_MODEL_KEY_PATH: str = S3_OPENVINO_MODEL_NAME
+    S3_EXPORT_REPORT_KEY_PATH: str = S3_EXPORT_REPORT_NAME
 
 
 
@@ -75,4 +80,249 @@ class ModelEvaluationConfig:
 
     image_size: int = MODEL_EVALUATION_IMAGE_SIZE
 
-    data_yaml_path: str = MODEL_EVALUATION_DATA_YAML
\ No newline at end of file
+    data_yaml_path: str = MODEL_EVALUATION_DATA_YAML
+
+
+
+@dataclass
+class ModelExporterConfig:
+    model_exporter_dir: str = os.path.join(
+        training_pipeline_config.artifacts_dir, MODEL_EXPORTER_DIR_NAME
+    )
+
+    export_report_file_path: str = os.path.join(model_exporter_dir, MODEL_EXPORTER_REPORT_FILE_NAME)
+
+    formats: tuple = MODEL_EXPORTER_FORMATS
+
+    image_size: int = MODEL_EXPORTER_IMAGE_SIZE
+
+    atol: float = MODEL_EXPORTER_ATOL
+
+    rtol: float = MODEL_EXPORTER_RTOL
+
+    validation_images: int = MODEL_EXPORTER_VALIDATION_IMAGES
+
+    latency_runs: int = MODEL_EXPORTER_LATENCY_RUNS
+
+
+
+@dataclass
+class ModelQuantizerConfig:
+    model_quantizer_dir: str = os.path.join(
+        training_pipeline_config.artifacts_dir, MODEL_QUANTIZER_DIR_NAME
+    )
+
+    quantized_model_name: str = MODEL_QUANTIZER_MODEL_NAME
+
+    image_size: int = MODEL_EXPORTER_IMAGE_SIZE
+
+    calibration_images: int = MODEL_QUANTIZER_CALIBRATION_IMAGES
+
+    max_map50_drop: float = MODEL_QUANTIZER_MAX_MAP50_DROP
+
+    latency_runs: int = MODEL_EXPORTER_LATENCY_RUNS
+
+
+
+@dataclass
+class InferenceSchedulerConfig:
+    max_batch_size: int = INFERENCE_SCHEDULER_MAX_BATCH_SIZE
+
+    max_wait_ms: float = INFERENCE_SCHEDULER_MAX_WAIT_MS
+
+    stats_window: int = INFERENCE_SCHEDULER_STATS_WINDOW
+
+    max_queue_depth: int = INFERENCE_SCHEDULER_MAX_QUEUE_DEPTH
+
+    retry_after_seconds: int = INFERENCE_SCHEDULER_RETRY_AFTER_SECONDS
+
+    concurrency: int = 1
+
+
+
+@dataclass
+class ResultCacheConfig:
+    max_bytes: int = RESULT_CACHE_MAX_BYTES
+
+    ttl_seconds: float = RESULT_CACHE_TTL_SECONDS
+
+
+
+@dataclass
+class InferenceWorkerPoolConfig:
+    num_workers: int = INFERENCE_WORKERS
+
+    threads_per_worker: int = INFERENCE_WORKER_THREADS
+
+    interop_threads: int = INFERENCE_WORKER_INTEROP_THREADS
+
+    start_timeout: float = INFERENCE_WORKER_START_TIMEOUT
+
+    predict_timeout: float = INFERENCE_WORKER_PREDICT_TIMEOUT
+
+    restart_backoff: float = INFERENCE_WORKER_RESTART_BACKOFF
+
+    shared_memory_size: int = INFERENCE_WORKER_SHARED_MEMORY_SIZE
+
+
+
+@dataclass
+class VideoInferenceConfig:
+    input_dir: str = VIDEO_INPUT_DIR
+
+    batch_size: int = VIDEO_BATCH_SIZE
+
+    default_stride: int = VIDEO_DEFAULT_STRIDE
+
+
+
+@dataclass
+class SceneChangeConfig:
+    threshold: float = SCENE_CHANGE_THRESHOLD
+
+    refresh_interval: int = SCENE_CHANGE_REFRESH_INTERVAL
+
+    thumbnail_width: int = SCENE_CHANGE_THUMBNAIL_WIDTH
+
+
+
+@dataclass
+class SlicingConfig:
+    tile_size: int = SLICING_TILE_SIZE
+
+    overlap: float = SLICING_OVERLAP
+
+    merge_iou: float = SLICING_MERGE_IOU
+
+    full_frame: bool = SLICING_FULL_FRAME
+
+
+
+@dataclass
+class CameraRegistryConfig:
+    config_file_path: str = CAMERA_CONFIG_FILE_PATH
+
+    padding: int = CAMERA_ROI_PADDING
+
+    anchor: str = CAMERA_ROI_ANCHOR
+
+    stride: int = CAMERA_ROI_STRIDE
+
+    image_size: int = PREDICTION_IMAGE_SIZE
+
+
+
+@dataclass
+class AdaptiveResolutionConfig:
+    image_sizes: tuple = ADAPTIVE_RESOLUTION_IMAGE_SIZES
+
+    latency_target_ms: float = ADAPTIVE_RESOLUTION_LATENCY_TARGET_MS
+
+    max_queue_depth: int = ADAPTIVE_RESOLUTION_MAX_QUEUE_DEPTH
+
+    interval: float = ADAPTIVE_RESOLUTION_INTERVAL
+
+    min_samples: int = ADAPTIVE_RESOLUTION_MIN_SAMPLES
+
+    step_up_headroom: float = ADAPTIVE_RESOLUTION_STEP_UP_HEADROOM
+
+
+
+@dataclass
+class ComplianceConfig:
+    person_class: str = COMPLIANCE_PERSON_CLASS
+
+    ppe_classes: tuple = COMPLIANCE_PPE_CLASSES
+
+    required_ppe: tuple = COMPLIANCE_REQUIRED_PPE
+
+    min_containment: float = COMPLIANCE_MIN_CONTAINMENT
+
+
+
+@dataclass
+class TrackingConfig:
+    high_threshold: float = TRACKING_HIGH_THRESHOLD
+
+    low_threshold: float = TRACKING_LOW_THRESHOLD
+
+    new_track_threshold: float = TRACKING_NEW_TRACK_THRESHOLD
+
+    match_iou: float = TRACKING_MATCH_IOU
+
+    low_match_iou: float = TRACKING_LOW_MATCH_IOU
+
+    min_hits: int = TRACKING_MIN_HITS
+
+    track_buffer: int = TRACKING_BUFFER
+
+    detect_interval: int = TRACKING_DETECT_INTERVAL
+
+    violation_min_frames: int = TRACKING_VIOLATION_MIN_FRAMES
+
+
+
+
+@dataclass
+class EventSinkConfig:
+    backend: str = EVENT_SINK_BACKEND
+
+    path: str = EVENT_SINK_PATH
+
+    batch_size: int = EVENT_SINK_BATCH_SIZE
+
+    flush_interval: float = EVENT_SINK_FLUSH_INTERVAL
+
+    max_pending: int = EVENT_SINK_MAX_PENDING
+
+    max_retries: int = EVENT_SINK_MAX_RETRIES
+
+    fsync: bool = EVENT_SINK_FSYNC
+
+
+
+
+@dataclass
+class StreamManagerConfig:
+    config_file_path: str = STREAM_CONFIG_FILE_PATH
+
+    default_target_fps: float = STREAM_DEFAULT_TARGET_FPS
+
+    default_conf: float = STREAM_DEFAULT_CONF
+
+    max_batch_size: int = STREAM_MAX_BATCH_SIZE
+
+    reconnect_interval: float = STREAM_RECONNECT_INTERVAL
+
+    stats_window: int = STREAM_STATS_WINDOW
+
+
+
+
+@dataclass
+class CpuProfileConfig:
+    file_path: str = CPU_PROFILE_FILE_PATH
+
+    latency_target_ms: float = CPU_PROFILE_LATENCY_TARGET_MS
+
+    runs: int = CPU_PROFILE_RUNS
+
+    warmup_runs: int = CPU_PROFILE_WARMUP_RUNS
+
+
+
+@dataclass
+class ModelManagerConfig:
+    model_dir: str = MODEL_MANAGER_MODEL_DIR
+
+    model_path: str = os.path.join(model_dir, MODEL_MANAGER_MODEL_FILE_NAME)
+
+    warmup_image_size: int = PREDICTION_IMAGE_SIZE
+
+    retry_interval: float = MODEL_MANAGER_RETRY_INTERVAL
+
+    backend: str = INFERENCE_BACKEND
+
+    export_report_file_path: str = os.path.join(model_dir, MODEL_MANAGER_EXPORT_REPORT_FILE_NAME)
+
+    reload_interval: float = MODEL_MANAGER_RELOAD_INTERVAL
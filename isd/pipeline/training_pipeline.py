@@ -7,12 +7,16 @@ from isd.components.data_validation import DataValidation
 from isd.components.model_trainer import ModelTrainer
 from isd.components.model_evaluation import ModelEvaluation
 from isd.components.model_pusher import ModelPusher
+from isd.components.model_exporter import ModelExporter
+from isd.components.model_quantizer import ModelQuantizer
 
 
 from isd.entity.config_entity import (DataIngestionConfig,
                                       DataValidationConfig,
                                       ModelTrainerConfig,
                                       ModelEvaluationConfig,
+                                      ModelExporterConfig,
+                                      ModelQuantizerConfig,
                                       ModelPusherConfig)
 
 
@@ -20,6 +24,9 @@ from isd.entity.artifacts_entity import (DataIngestionArtifact,
                                          DataValidationArtifact,
                                          ModelTrainerArtifact,
                                          ModelEvaluationArtifact,
+                                         ModelExporterArtifact,
+                                         ModelQuantizerArtifact,
+                                         QuantizedModelEvaluationArtifact,
                                          ModelPusherArtifacts)
 
 
@@ -29,6 +36,8 @@ class TrainPipeline:
         self.data_validation_config = DataValidationConfig()
         self.model_trainer_config = ModelTrainerConfig()
         self.model_evaluation_config = ModelEvaluationConfig() 
+        self.model_exporter_config = ModelExporterConfig()
+        self.model_quantizer_config = ModelQuantizerConfig()
         self.model_pusher_config = ModelPusherConfig()
         self.s3_operations = S3Operation()
 
@@ -118,14 +127,84 @@ class TrainPipeline:
             raise isdException(e, sys)
 
 
-    def start_model_pusher(self, model_trainer_artifact: ModelTrainerArtifact, s3: S3Operation):
+    def start_model_exporter(
+        self, model_trainer_artifact: ModelTrainerArtifact, data_ingestion_artifact: DataIngestionArtifact
+    ) -> ModelExporterArtifact:
+        logging.info("Entered the start_model_exporter method of TrainPipeline class")
+        try:
+            model_exporter = ModelExporter(
+                model_exporter_config=self.model_exporter_config,
+                model_trainer_artifact=model_trainer_artifact,
+                data_ingestion_artifact=data_ingestion_artifact,
+            )
+            model_exporter_artifact = model_exporter.initiate_model_exporter()
+
+            logging.info("Performed the model export operation")
+            logging.info("Exited the start_model_exporter method of TrainPipeline class")
+            return model_exporter_artifact
+
+        except Exception as e:
+            raise isdException(e, sys)
+
+
+    def start_model_quantizer(
+        self, model_exporter_artifact: ModelExporterArtifact, model_trainer_artifact: ModelTrainerArtifact,
+        data_ingestion_artifact: DataIngestionArtifact
+    ) -> ModelQuantizerArtifact:
+        logging.info("Entered the start_model_quantizer method of TrainPipeline class")
+        try:
+            model_quantizer = ModelQuantizer(
+                model_exporter_artifact=model_exporter_artifact,
+                model_trainer_artifact=model_trainer_artifact,
+                model_quantizer_config=self.model_quantizer_config,
+                data_ingestion_artifact=data_ingestion_artifact,
+            )
+            model_quantizer_artifact = model_quantizer.initiate_model_quantizer()
+
+            logging.info("Performed the model quantization operation")
+            logging.info("Exited the start_model_quantizer method of TrainPipeline class")
+            return model_quantizer_artifact
+
+        except Exception as e:
+            raise isdException(e, sys)
+
+
+    def start_quantized_model_evaluation(
+        self, model_trainer_artifact: ModelTrainerArtifact, data_ingestion_artifact: DataIngestionArtifact,
+        model_evaluation_artifact: ModelEvaluationArtifact, model_quantizer_artifact: ModelQuantizerArtifact
+    ) -> QuantizedModelEvaluationArtifact:
+        logging.info("Entered the start_quantized_model_evaluation method of TrainPipeline class")
+        try:
+            model_evaluation = ModelEvaluation(
+                model_evaluation_config=self.model_evaluation_config,
+                model_trainer_artifact=model_trainer_artifact,
+                data_ingestion_artifact=data_ingestion_artifact,
+            )
+            quantized_model_evaluation_artifact = model_evaluation.initiate_quantized_model_evaluation(
+                model_evaluation_artifact=model_evaluation_artifact,
+                model_quantizer_artifact=model_quantizer_artifact,
+                model_quantizer_config=self.model_quantizer_config,
+            )
+
+            logging.info("Performed the quantized model evaluation operation")
+            logging.info("Exited the start_quantized_model_evaluation method of TrainPipeline class")
+            return quantized_model_evaluation_artifact
+
+        except Exception as e:
+            raise isdException(e, sys)
+
+
+    def start_model_pusher(self, model_trainer_artifact: ModelTrainerArtifact, s3: S3Operation,
+                           quantized_model_evaluation_artifact: QuantizedModelEvaluationArtifact = None,
+                           model_exporter_artifact: ModelExporterArtifact = None):
 
         try:
             model_pusher = ModelPusher(
                 model_pusher_config=self.model_pusher_config,
                 model_trainer_artifact= model_trainer_artifact,
-                s3=s3
-                
+                s3=s3,
+                quantized_model_evaluation_artifact=quantized_model_evaluation_artifact,
+                model_exporter_artifact=model_exporter_artifact
             )
             model_pusher_artifact = model_pusher.initiate_model_pusher()
             return model_pusher_artifact
@@ -160,10 +239,38 @@ class TrainPipeline:
                 print(f">>>>>> stage MODEL EVALUATION started <<<<<<")   
                 model_evaluation_artifact = self.start_model_evaluation(model_trainer_artifact=model_trainer_artifact,data_ingestion_artifact=data_ingestion_artifact)
                 print(f">>>>>> stage MODEL EVALUATION completed <<<<<<\n\nx==========x")
+
+                # The exported and INT8 models are optional extras, a failure must not keep the accepted FP32 model from being pushed
+                try:
+                    print(f"*******************")
+                    print(f">>>>>> stage MODEL EXPORTER started <<<<<<")
+                    model_exporter_artifact = self.start_model_exporter(model_trainer_artifact=model_trainer_artifact,data_ingestion_artifact=data_ingestion_artifact)
+                    print(f">>>>>> stage MODEL EXPORTER completed <<<<<<\n\nx==========x")
+                except Exception as e:
+                    logging.error(f"Skipping the exported models, export failed: {e}")
+                    print(f">>>>>> stage MODEL EXPORTER skipped <<<<<<\n\nx==========x")
+                    model_exporter_artifact = None
+
+                quantized_model_evaluation_artifact = None
+                # The INT8 model is quantized from the ONNX export, so it is skipped along with the exports
+                if model_exporter_artifact is not None:
+                    try:
+                        print(f"*******************")
+                        print(f">>>>>> stage MODEL QUANTIZER started <<<<<<")
+                        model_quantizer_artifact = self.start_model_quantizer(model_exporter_artifact=model_exporter_artifact,model_trainer_artifact=model_trainer_artifact,data_ingestion_artifact=data_ingestion_artifact)
+                        print(f">>>>>> stage MODEL QUANTIZER completed <<<<<<\n\nx==========x")
+
+                        print(f"*******************")
+                        print(f">>>>>> stage QUANTIZED MODEL EVALUATION started <<<<<<")
+                        quantized_model_evaluation_artifact = self.start_quantized_model_evaluation(model_trainer_artifact=model_trainer_artifact,data_ingestion_artifact=data_ingestion_artifact,model_evaluation_artifact=model_evaluation_artifact,model_quantizer_artifact=model_quantizer_artifact)
+                        print(f">>>>>> stage QUANTIZED MODEL EVALUATION completed <<<<<<\n\nx==========x")
+                    except Exception as e:
+                        logging.error(f"Skipping the INT8 model, quantization failed: {e}")
+                        print(f">>>>>> stage MODEL QUANTIZER skipped <<<<<<\n\nx==========x")
                 
                 print(f"*******************")
                 print(f">>>>>> stage MODEL PUSHER started <<<<<<") 
-                model_pusher_artifact = self.start_model_pusher(model_trainer_artifact=model_trainer_artifact,s3=self.s3_operations)
+                model_pusher_artifact = self.start_model_pusher(model_trainer_artifact=model_trainer_artifact,s3=self.s3_operations,quantized_model_evaluation_artifact=quantized_model_evaluation_artifact,model_exporter_artifact=model_exporter_artifact)
                 print(f">>>>>> stage MODEL PUSHER completed <<<<<<\n\nx==========x")
 
             else:
@@ -171,4 +278,9 @@ class TrainPipeline:
 
 
         except Exception as e:
-            raise isdException(e, sys)
\ No newline at end of file
+            raise isdException(e, sys)
+
+
+if __name__ == "__main__":
+    # Entry point used by the /train route, so training runs outside the serving process
+    TrainPipeline().run_pipeline()
@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from isd.logger import logging
+from isd.entity.config_entity import AdaptiveResolutionConfig
+from isd.serving.metrics import METRICS
+
+
+class AdaptiveResolutionController:
+    """
+    Picks the inference image size from a ladder according to the current load.
+
+    The scheduler reports how long each request spent queued and inferred.
+    Every interval the controller looks at the p95 of those latencies at the
+    current size and at the scheduler's queue depth. Over the latency target,
+    or with a queue deeper than max_queue_depth, it steps down to the next
+    smaller size. It steps back up once the p95, scaled by the pixel ratio of
+    the larger size, would still stay below the target with some headroom, so
+    it does not flap between two sizes. Decisions are exported as metrics.
+    """
+
+    def __init__(self, queue_depth: Callable[[], int],
+                 adaptive_resolution_config: AdaptiveResolutionConfig = AdaptiveResolutionConfig()):
+        self.queue_depth = queue_depth
+        self.adaptive_resolution_config = adaptive_resolution_config
+        self.image_sizes = sorted(set(adaptive_resolution_config.image_sizes), reverse=True)
+
+        self._lock = threading.Lock()
+        self._level = 0
+        self._latencies = deque(maxlen=1024)
+        self._decided_at = time.monotonic()
+        self._last_p95: Optional[float] = None
+        self.changes: List[Dict[str, Any]] = []
+        METRICS.adaptive_image_size.set(self.image_size)
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.image_sizes) > 1
+
+    @property
+    def image_size(self) -> int:
+        return self.image_sizes[self._level]
+
+    def observe(self, params: Dict[str, Any], latencies: List[float]) -> None:
+        """Scheduler listener, only requests run at the current size count towards the next decision"""
+        if self.enabled and params.get("imgsz") == self.image_size:
+            with self._lock:
+                self._latencies.extend(latencies)
+
+    def select(self) -> int:
+        """Image size for the next request, re-evaluated at most once per interval"""
+        if not self.enabled:
+            return self.image_size
+        if time.monotonic() - self._decided_at >= self.adaptive_resolution_config.interval:
+            with self._lock:
+                if time.monotonic() - self._decided_at >= self.adaptive_resolution_config.interval:
+                    self._decide()
+        return self.image_size
+
+    def _decide(self) -> None:
+        config = self.adaptive_resolution_config
+        self._decided_at = time.monotonic()
+        depth = self.queue_depth()
+        target = config.latency_target_ms / 1000.0
+        p95 = None
+        if len(self._latencies) >= config.min_samples:
+            # Every decision looks at the requests of its own interval only
+            p95 = self._last_p95 = float(np.percentile(self._latencies, 95))
+            self._latencies.clear()
+            METRICS.adaptive_latency_p95.set(p95)
+
+        level = self._level
+        if depth > config.max_queue_depth and level < len(self.image_sizes) - 1:
+            self._change(level + 1, "down", "queue", p95, depth)
+        elif p95 is not None and p95 > target and level < len(self.image_sizes) - 1:
+            self._change(level + 1, "down", "latency", p95, depth)
+        elif p95 is not None and level > 0 and depth <= config.max_queue_depth // 2:
+            # Latency grows roughly with the pixel count, so predict it at the larger size first
+            larger = self.image_sizes[level - 1]
+            expected = p95 * (larger / self.image_size) ** 2
+            if expected < target * config.step_up_headroom:
+                self._change(level - 1, "up", "recovered", p95, depth)
+
+    def _change(self, level: int, direction: str, reason: str, p95: Optional[float], depth: int) -> None:
+        previous = self.image_size
+        self._level = level
+        # Latencies measured at the old size say nothing about the new one
+        self._latencies.clear()
+        METRICS.adaptive_image_size.set(self.image_size)
+        METRICS.adaptive_changes.inc(direction=direction, reason=reason)
+        self.changes.append({
+            "time": round(time.time(), 3),
+            "from": previous,
+            "to": self.image_size,
+            "reason": reason,
+            "p95_ms": None if p95 is None else round(p95 * 1000.0, 3),
+            "queue_depth": depth,
+        })
+        del self.changes[:-20]
+        logging.info(f"Adaptive resolution stepped {direction} from {previous} to {self.image_size} "
+                     f"({reason}, p95={p95}, queue_depth={depth})")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "image_size": self.image_size,
+                "image_sizes": self.image_sizes,
+                "latency_target_ms": self.adaptive_resolution_config.latency_target_ms,
+                "p95_ms": None if self._last_p95 is None else round(self._last_p95 * 1000.0, 3),
+                "recent_changes": list(self.changes),
+            }
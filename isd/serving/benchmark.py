@@ -0,0 +1,329 @@
+"""
+Latency and throughput benchmark for the prediction server and the model.
+
+HTTP mode sends /predict requests to a running server, or to one it starts
+itself with --start-server. The load is either closed-loop, with a fixed
+number of requests in flight (--concurrency), or open-loop at a fixed arrival
+rate (--rate). In open-loop mode the latency is measured from the scheduled
+send time, so a server that falls behind cannot hide its queueing delay.
+Model mode runs the same images through the model in-process, without HTTP,
+scheduler or encoding, which separates framework overhead from inference
+cost.
+
+    python -m isd.serving.benchmark --start-server --concurrency 8 --requests 500 --output before.json
+    python -m isd.serving.benchmark --rate 20 --duration 30 --images data/samples --compare before.json
+    python -m isd.serving.benchmark --mode model --batch-size 4 --requests 200
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def summarize(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    array = np.asarray(latencies_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "mean": round(float(array.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(array.max()), 3),
+    }
+
+
+def load_images(images_dir: Optional[str], count: int, width: int, height: int) -> List[np.ndarray]:
+    """Images to replay from a directory, or synthetic camera-sized frames"""
+    if images_dir:
+        paths = sorted(
+            os.path.join(images_dir, name) for name in os.listdir(images_dir)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        images = [image for image in (cv2.imread(path) for path in paths[:count]) if image is not None]
+        if not images:
+            raise ValueError(f"No readable images in {images_dir}")
+        return images
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        # Smooth noise compresses like a real frame, pure noise would inflate the JPEG size
+        small = rng.integers(0, 256, size=(max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+        images.append(cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR))
+    return images
+
+
+def make_payload(image: np.ndarray, index: int, unique: bool) -> bytes:
+    if unique:
+        # One stamped pixel per request keeps the server's result cache from answering
+        image = image.copy()
+        image[0, 0] = (index & 0xFF, (index >> 8) & 0xFF, (index >> 16) & 0xFF)
+    success, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not success:
+        raise ValueError("Could not encode benchmark image")
+    return encoded.tobytes()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(url: str, timeout: float) -> subprocess.Popen:
+    """Start app.py in a child process and wait until /readyz reports the model warm"""
+    import requests
+
+    process = subprocess.Popen([sys.executable, "app.py"])
+    base_url = url.split("/predict")[0]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise TimeoutError(f"Server was not ready after {timeout}s")
+
+
+class HttpBenchmark:
+    def __init__(self, url: str, payloads: List[bytes], response_mode: str, timeout: float):
+        import requests
+
+        self.url = f"{url}{'&' if '?' in url else '?'}response={response_mode}"
+        self.payloads = payloads
+        self.timeout = timeout
+        self._local = threading.local()
+        self._requests = requests
+
+    def _session(self):
+        # One keep-alive connection per client thread
+        if not hasattr(self._local, "session"):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def send(self, index: int, scheduled_at: Optional[float] = None) -> Tuple[float, str]:
+        """Latency in ms from the scheduled (or actual) send time, and the status"""
+        started_at = scheduled_at if scheduled_at is not None else time.perf_counter()
+        try:
+            response = self._session().post(self.url, data=self.payloads[index % len(self.payloads)],
+                                            headers={"Content-Type": "image/jpeg"}, timeout=self.timeout)
+            status = str(response.status_code)
+        except self._requests.RequestException as e:
+            status = type(e).__name__
+        return (time.perf_counter() - started_at) * 1000.0, status
+
+    def run_closed_loop(self, concurrency: int, total: int, duration: Optional[float]):
+        results = []
+        counter = iter(range(10 ** 12))
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration if duration else None
+
+        def client():
+            while True:
+                with lock:
+                    index = next(counter)
+                if (deadline is None and index >= total) or (deadline is not None and time.perf_counter() >= deadline):
+                    return
+                outcome = self.send(index)
+                with lock:
+                    results.append(outcome)
+
+        started_at = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started_at
+
+    def run_open_loop(self, rate: float, total: int, duration: Optional[float], max_in_flight: int, poisson: bool):
+        total = int(rate * duration) if duration else total
+        rng = random.Random(0)
+        offsets, offset = [], 0.0
+        for _ in range(total):
+            offsets.append(offset)
+            offset += rng.expovariate(rate) if poisson else 1.0 / rate
+
+        started_at = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for index, offset in enumerate(offsets):
+                scheduled_at = started_at + offset
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self.send, index, scheduled_at))
+            results = [future.result() for future in futures]
+        return results, time.perf_counter() - started_at
+
+
+def http_report(results: List[Tuple[float, str]], elapsed: float) -> Dict[str, Any]:
+    statuses = Counter(status for _, status in results)
+    ok = [latency for latency, status in results if status == "200"]
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "status_codes": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": summarize(ok),
+    }
+
+
+def run_model_benchmark(model_path: str, images: List[np.ndarray], batch_size: int, total: int,
+                        warmup: int, image_size: int) -> Dict[str, Any]:
+    """Forward passes only: no HTTP, no scheduler, no encoding"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path, task="detect")
+    batches = [
+        [images[(start + offset) % len(images)] for offset in range(batch_size)]
+        for start in range(0, max(total, batch_size), batch_size)
+    ]
+    for batch in batches[:warmup]:
+        model.predict(source=batch, imgsz=image_size, verbose=False)
+
+    latencies, stages = [], {"preprocess": [], "inference": [], "postprocess": []}
+    started_at = time.perf_counter()
+    for batch in batches:
+        call_started_at = time.perf_counter()
+        predictions = model.predict(source=batch, imgsz=image_size, verbose=False)
+        latencies.append((time.perf_counter() - call_started_at) * 1000.0)
+        for stage in stages:
+            stages[stage].append(float(np.mean([prediction.speed[stage] for prediction in predictions])))
+    elapsed = time.perf_counter() - started_at
+
+    frames = len(batches) * batch_size
+    return {
+        "batches": len(batches),
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "throughput_fps": round(frames / elapsed, 3) if elapsed > 0 else 0.0,
+        "batch_latency_ms": summarize(latencies),
+        "per_image_stage_ms": {stage: summarize(values) for stage, values in stages.items()},
+    }
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> List[str]:
+    """Relative change of the headline numbers against an earlier result file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    lines = [f"compared with {baseline_path} (commit {baseline.get('commit')}):"]
+    current_result, baseline_result = current["result"], baseline.get("result", {})
+    throughput_key = "throughput_rps" if "throughput_rps" in current_result else "throughput_fps"
+    latency_key = "latency_ms" if "latency_ms" in current_result else "batch_latency_ms"
+    pairs = [(throughput_key, current_result.get(throughput_key), baseline_result.get(throughput_key))]
+    for name in ("p50", "p95", "p99"):
+        pairs.append((f"{latency_key}.{name}", current_result.get(latency_key, {}).get(name),
+                      baseline_result.get(latency_key, {}).get(name)))
+    for name, value, base in pairs:
+        if value is None or not base:
+            continue
+        lines.append(f"  {name:<22} {base:>10.2f} -> {value:>10.2f} ({(value - base) / base * 100:+.1f}%)")
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark /predict latency and throughput, or the model alone")
+    parser.add_argument("--mode", choices=["http", "model"], default="http")
+    parser.add_argument("--url", default="http://localhost:8080/predict")
+    parser.add_argument("--start-server", action="store_true", help="start app.py and wait until it is ready")
+    parser.add_argument("--server-timeout", type=float, default=300.0)
+    parser.add_argument("--images", default=None, help="directory of images to replay, synthetic frames otherwise")
+    parser.add_argument("--image-count", type=int, default=16, help="distinct images to use")
+    parser.add_argument("--width", type=int, default=1280, help="synthetic frame width")
+    parser.add_argument("--height", type=int, default=720, help="synthetic frame height")
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="resend identical bytes, so the server's result cache may answer")
+    parser.add_argument("--response", choices=["detections", "image"], default="detections")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop: requests in flight")
+    parser.add_argument("--rate", type=float, default=None, help="open loop: requests per second")
+    parser.add_argument("--poisson", action="store_true", help="open loop: exponential inter-arrival times")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open loop: client thread limit")
+    parser.add_argument("--requests", type=int, default=200, help="requests (or frames in model mode)")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run, overrides --requests")
+    parser.add_argument("--warmup", type=int, default=5, help="requests or batches excluded from the results")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--model", default="model/best.pt", help="model mode: weights to load")
+    parser.add_argument("--batch-size", type=int, default=1, help="model mode: images per forward pass")
+    parser.add_argument("--imgsz", type=int, default=640, help="model mode: inference size")
+    parser.add_argument("--output", default="benchmark.json", help="JSON result file")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare with")
+    args = parser.parse_args(argv)
+
+    images = load_images(args.images, args.image_count, args.width, args.height)
+
+    server = None
+    try:
+        if args.mode == "model":
+            result = run_model_benchmark(args.model, images, args.batch_size, args.requests,
+                                         args.warmup, args.imgsz)
+        else:
+            if args.start_server:
+                server = start_server(args.url, args.server_timeout)
+            # Payloads are encoded up front so the client does not compete with the server for CPU;
+            # a closed loop with --duration reuses them once it has sent --requests requests
+            measured = int(args.rate * args.duration) if args.rate and args.duration else args.requests
+            payloads = [make_payload(images[index % len(images)], index, not args.allow_cache)
+                        for index in range(measured + args.warmup if not args.allow_cache else len(images))]
+            benchmark = HttpBenchmark(args.url, payloads, args.response, args.timeout)
+            # Warm-up requests use payload indices after the measured ones, so they never warm the cache
+            for index in range(args.warmup):
+                benchmark.send(measured + index)
+
+            if args.rate:
+                results, elapsed = benchmark.run_open_loop(args.rate, args.requests, args.duration,
+                                                           args.max_in_flight, args.poisson)
+            else:
+                results, elapsed = benchmark.run_closed_loop(args.concurrency, args.requests, args.duration)
+            result = http_report(results, elapsed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "mode": args.mode,
+        "load": ("open_loop" if args.rate else "closed_loop") if args.mode == "http" else "model",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "config": vars(args),
+        "image_shape": list(images[0].shape),
+        "result": result,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(json.dumps(result, indent=4))
+    if args.compare:
+        print("\n".join(compare(report, args.compare)))
+    print(f"Results written to {args.output}")
+    return 0 if args.mode == "model" or result["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import threading
+from typing import Any, Dict, Optional
+import cv2
+import numpy as np
+from isd.entity.config_entity import SceneChangeConfig
+
+
+class SceneChangeDetector:
+    """
+    Decides per frame whether a fixed camera's scene changed enough to run the model.
+
+    Every frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail of the last frame that went through the model. When the mean
+    absolute difference stays below the threshold, the caller reuses the
+    previous detections. After refresh_interval skipped frames in a row the
+    next frame is inferred anyway, so results never get too stale. Keep one
+    detector per stream.
+    """
+
+    def __init__(self, scene_change_config: SceneChangeConfig = SceneChangeConfig()):
+        self.scene_change_config = scene_change_config
+        self._reference: Optional[np.ndarray] = None
+        self._skipped_in_row = 0
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.inferred = 0
+        self.skipped = 0
+        self.forced_refreshes = 0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        thumbnail_width = self.scene_change_config.thumbnail_width
+        thumbnail_height = max(1, int(round(height * thumbnail_width / max(width, 1))))
+        # INTER_AREA averages the pixels away, so sensor noise does not count as change
+        thumbnail = cv2.resize(frame, (thumbnail_width, thumbnail_height), interpolation=cv2.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        return thumbnail
+
+    def change_score(self, frame: np.ndarray) -> float:
+        """Mean absolute difference (0-255) to the last inferred frame, inf when there is none"""
+        if self._reference is None:
+            return float("inf")
+        thumbnail = self._thumbnail(frame)
+        if thumbnail.shape != self._reference.shape:
+            return float("inf")
+        return float(cv2.absdiff(thumbnail, self._reference).mean())
+
+    def should_infer(self, frame: np.ndarray) -> bool:
+        with self._lock:
+            self.frames += 1
+            score = self.change_score(frame)
+            forced = self._skipped_in_row >= self.scene_change_config.refresh_interval
+            if score >= self.scene_change_config.threshold or forced:
+                self._reference = self._thumbnail(frame)
+                self._skipped_in_row = 0
+                self.inferred += 1
+                self.forced_refreshes += int(forced and score < self.scene_change_config.threshold)
+                return True
+            self._skipped_in_row += 1
+            self.skipped += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "inferred": self.inferred,
+                "skipped": self.skipped,
+                "skip_rate": round(self.skipped / self.frames, 4) if self.frames else 0.0,
+                "forced_refreshes": self.forced_refreshes,
+                "threshold": self.scene_change_config.threshold,
+                "refresh_interval": self.scene_change_config.refresh_interval,
+            }
@@ -0,0 +1,96 @@
+"""
+Concurrency check for a running prediction server.
+
+Fires hundreds of parallel /predict requests, each carrying an image with its
+own unique size and fill colour, and verifies that every response is the
+annotated version of that request's own input: same size, and the median
+pixel within a compression tolerance of its fill colour. Any cross-talk
+between requests shows up as a size or colour mismatch. Requests shed with
+503 while the server's queue is full are retried after Retry-After, so only
+wrong answers and real errors count as failures.
+
+    python -m isd.serving.concurrency_check --url http://localhost:8080/predict --requests 300
+"""
+import sys
+import time
+import random
+import base64
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+import cv2
+import numpy as np
+import requests
+
+
+# Largest per-channel difference of the response's median pixel from the fill colour, allows for JPEG encoding
+COLOUR_TOLERANCE = 12
+
+
+def fill_colour(index: int) -> np.ndarray:
+    # Neighbouring requests get far-apart colours, so a swapped response is well outside the tolerance
+    return np.array([(index * 37) % 256, (index * 91) % 256, (index * 53) % 256], dtype=np.uint8)
+
+
+def make_image(index: int) -> np.ndarray:
+    # Unique height per request, the annotated response keeps the input size
+    height, width = 160 + index, 240 + (index * 7) % 97
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:] = fill_colour(index)
+    return image
+
+
+def check_one(url: str, index: int, timeout: float, retries: int) -> Tuple[bool, str]:
+    image = make_image(index)
+    payload = {"image": base64.b64encode(cv2.imencode(".png", image)[1]).decode("utf-8")}
+    for _ in range(retries + 1):
+        try:
+            response = requests.post(url, json=payload, timeout=timeout)
+        except requests.RequestException as e:
+            return False, f"request {index}: {e}"
+        if response.status_code != 503:
+            break
+        # Shed by admission control or not ready yet, not a concurrency bug; the jitter spreads the retries out
+        time.sleep(float(response.headers.get("Retry-After", 1)) * random.uniform(1.0, 2.0))
+    if response.status_code != 200:
+        return False, f"request {index}: HTTP {response.status_code} {response.text[:200]}"
+
+    annotated = cv2.imdecode(
+        np.frombuffer(base64.b64decode(response.json()["image"]), dtype=np.uint8), cv2.IMREAD_COLOR
+    )
+    if annotated is None or annotated.shape != image.shape:
+        shape = None if annotated is None else annotated.shape
+        return False, f"request {index}: sent {image.shape}, got back {shape}"
+    # Boxes drawn on the image only cover a few pixels, the median stays the fill colour
+    median = np.median(annotated.reshape(-1, 3), axis=0)
+    if np.abs(median - fill_colour(index)).max() > COLOUR_TOLERANCE:
+        return False, f"request {index}: sent colour {fill_colour(index).tolist()}, got back {median.tolist()}"
+    return True, ""
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check that concurrent /predict responses match their own inputs")
+    parser.add_argument("--url", default="http://localhost:8080/predict")
+    parser.add_argument("--requests", type=int, default=300, help="number of requests to send")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="requests in flight at once, keep it below INFERENCE_SCHEDULER_MAX_QUEUE_DEPTH")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--retries", type=int, default=10, help="retries of a request answered with 503")
+    args = parser.parse_args(argv)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(lambda i: check_one(args.url, i, args.timeout, args.retries),
+                                     range(args.requests)))
+    elapsed = time.perf_counter() - started_at
+
+    failures = [message for ok, message in outcomes if not ok]
+    for message in failures[:20]:
+        print(message)
+    print(f"{args.requests - len(failures)}/{args.requests} responses matched their input "
+          f"({args.concurrency} concurrent, {elapsed:.1f}s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Mapping
+import numpy as np
+from isd.utils.main_utils import encodeArrayIntoBase64, encodeArrayIntoBytes
+from isd.serving.metrics import METRICS
+
+
+RESPONSE_MODES = ("image", "detections")
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def parse_inference_params(options: Mapping[str, Any], names: Mapping[int, str]) -> Dict[str, Any]:
+    """
+    Turn the optional conf, classes and max_det request options into predict()
+    keyword arguments. They are applied inside the model call, so low-confidence
+    and unwanted classes are dropped before NMS instead of after rendering.
+    Classes may be given as ids or names, as a list or a comma separated string.
+    """
+    params = {}
+
+    if options.get("conf") is not None:
+        conf = float(options["conf"])
+        if not 0.0 <= conf <= 1.0:
+            raise ValueError(f"conf must be between 0 and 1, got {conf}")
+        params["conf"] = conf
+
+    if options.get("classes") is not None:
+        classes = options["classes"]
+        if isinstance(classes, str):
+            classes = [item.strip() for item in classes.split(",") if item.strip()]
+        elif not isinstance(classes, (list, tuple)):
+            classes = [classes]
+        ids_by_name = {name.lower(): class_id for class_id, name in names.items()}
+        class_ids = []
+        for item in classes:
+            if isinstance(item, str) and not item.isdigit():
+                if item.lower() not in ids_by_name:
+                    raise ValueError(f"Unknown class name {item!r}")
+                class_ids.append(ids_by_name[item.lower()])
+            else:
+                class_id = int(item)
+                if class_id not in names:
+                    raise ValueError(f"Unknown class id {class_id}")
+                class_ids.append(class_id)
+        params["classes"] = sorted(set(class_ids))
+
+    if options.get("max_det") is not None:
+        max_det = int(options["max_det"])
+        if max_det < 1:
+            raise ValueError(f"max_det must be at least 1, got {max_det}")
+        params["max_det"] = max_det
+
+    return params
+
+
+def parse_response_options(options: Mapping[str, Any]):
+    """Return the (response_mode, render, compliance) options requested by the client"""
+    response_mode = str(options.get("response") or "image").lower()
+    if response_mode not in RESPONSE_MODES:
+        raise ValueError(f"response must be one of {', '.join(RESPONSE_MODES)}, got {response_mode!r}")
+    return response_mode, _parse_bool(options.get("render", False)), _parse_bool(options.get("compliance", False))
+
+
+def results_from_boxes(image: np.ndarray, boxes: np.ndarray, names: Mapping[int, str],
+                       speed: Dict[str, float] = None):
+    """Rebuild an ultralytics Results object from a raw (N, 6) xyxy, conf, cls or (N, 7) xyxy, id, conf, cls array"""
+    import torch
+    from ultralytics.engine.results import Results
+
+    return Results(orig_img=image, path="", names=dict(names), boxes=torch.from_numpy(boxes), speed=speed)
+
+
+def render_jpeg(prediction) -> bytes:
+    """Annotated image as JPEG bytes, timed as the render and encode stages"""
+    with METRICS.stage("render"):
+        image = prediction.plot()
+    with METRICS.stage("encode"):
+        return encodeArrayIntoBytes(image)
+
+
+def render_base64(prediction) -> str:
+    with METRICS.stage("render"):
+        image = prediction.plot()
+    with METRICS.stage("encode"):
+        return encodeArrayIntoBase64(image).decode("utf-8")
+
+
+def detection_array(prediction) -> np.ndarray:
+    """(N, 6) xyxy, conf, cls boxes of one Results object, without the track id column of tracked results"""
+    data = prediction.boxes.data.cpu().numpy()
+    if data.shape[1] == 7:
+        return data[:, [0, 1, 2, 3, 5, 6]]
+    return data
+
+
+def to_detections(prediction) -> List[Dict[str, Any]]:
+    """Structured detections (box, class, confidence) of one Results object"""
+    boxes = prediction.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+
+    xyxy = np.round(boxes.xyxy.cpu().numpy().astype(np.float64), 2).tolist()
+    confidences = np.round(boxes.conf.cpu().numpy().astype(np.float64), 4).tolist()
+    class_ids = boxes.cls.cpu().numpy().astype(np.int64).tolist()
+    detections = [
+        {
+            "box": box,
+            "class_id": class_id,
+            "class_name": prediction.names[class_id],
+            "confidence": confidence,
+        }
+        for box, class_id, confidence in zip(xyxy, class_ids, confidences)
+    ]
+    if boxes.id is not None:
+        for detection, track_id in zip(detections, boxes.id.cpu().numpy().astype(np.int64).tolist()):
+            detection["track_id"] = track_id
+    return detections
+
+
+def evaluate_compliance(prediction, compliance_engine) -> Dict[str, Any]:
+    """PPE compliance records of one prediction, with the track id of every person when it was tracked"""
+    compliance = compliance_engine.evaluate(detection_array(prediction), prediction.names)
+    if prediction.boxes.id is not None:
+        track_ids = prediction.boxes.id.cpu().numpy().astype(np.int64).tolist()
+        for person in compliance["persons"]:
+            person["track_id"] = track_ids[person["person_index"]]
+    return compliance
+
+
+def build_prediction_payload(prediction, response_mode: str = "image", render: bool = False,
+                             compliance_engine=None) -> Dict[str, Any]:
+    """
+    Response body for one prediction. The legacy image mode returns the
+    annotated JPEG only. The detections mode skips plotting and re-encoding
+    unless render is requested on top. With a compliance engine, the per-person
+    PPE compliance records are added in either mode.
+    """
+    if response_mode == "image":
+        payload = {"image": render_base64(prediction)}
+        if compliance_engine is not None:
+            payload["compliance"] = evaluate_compliance(prediction, compliance_engine)
+        return payload
+
+    payload = {
+        "image_shape": list(prediction.orig_shape),
+        "detections": to_detections(prediction),
+    }
+    if compliance_engine is not None:
+        payload["compliance"] = evaluate_compliance(prediction, compliance_engine)
+    # How sliced or region-of-interest inference produced the detections, and the violation events of tracked streams
+    for extra in ("tiling", "roi", "events"):
+        if getattr(prediction, extra, None) is not None:
+            payload[extra] = getattr(prediction, extra)
+    if render:
+        payload["image"] = render_base64(prediction)
+    return payload
@@ -0,0 +1,324 @@
+"""
+Asynchronous, batched sink for violation events.
+
+Request threads only append their events to a bounded in-memory buffer and
+return. A background writer takes them out in batches and writes each batch
+with one call to the backend: one write() to an append-only JSONL file, or
+one transaction into a SQLite database in WAL mode. A batch is written as
+soon as batch_size events are waiting, or flush_interval seconds after the
+first of them arrived. When the backend falls behind and the buffer is full,
+new events are dropped and counted instead of blocking the request, so
+request latency never depends on the speed of the sink.
+
+    python -m isd.serving.event_sink --backend sqlite --events 200000
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from isd.logger import logging
+from isd.entity.config_entity import EventSinkConfig
+from isd.serving.metrics import METRICS
+
+
+class JsonlEventBackend:
+    """Append-only JSON lines file, one line per event"""
+
+    def __init__(self, path: str, fsync: bool = False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        self._file.write("".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SqliteEventBackend:
+    """SQLite table of events in WAL mode, every batch is one transaction"""
+
+    def __init__(self, path: str, fsync: bool = False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        # Only the writer thread uses the connection once the sink has started
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL stays consistent on a crash and only syncs at checkpoints
+        self._connection.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS violation_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "created_at REAL NOT NULL, "
+            "type TEXT, "
+            "source TEXT, "
+            "track_id INTEGER, "
+            "violation TEXT, "
+            "payload TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def write(self, events: List[Dict[str, Any]]) -> None:
+        rows = [(event.get("created_at", time.time()), event.get("type"), event.get("source"),
+                 event.get("track_id"), event.get("violation"), json.dumps(event, separators=(",", ":")))
+                for event in events]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO violation_events (created_at, type, source, track_id, violation, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+EVENT_SINK_BACKENDS = {
+    "jsonl": JsonlEventBackend,
+    "sqlite": SqliteEventBackend,
+}
+
+
+class EventSink:
+    def __init__(self, backend, event_sink_config: EventSinkConfig = EventSinkConfig()):
+        """backend has write(events) and close(), e.g. JsonlEventBackend or SqliteEventBackend"""
+        self.backend = backend
+        self.event_sink_config = event_sink_config
+
+        self._condition = threading.Condition()
+        self._pending = deque()
+        self._first_pending_at: Optional[float] = None
+        self._stopping = False
+        self._flush_requested = False
+        self._in_flight = 0
+        self._thread: Optional[threading.Thread] = None
+
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._flushes = 0
+        # (monotonic time, events) of recent flushes, for the write throughput
+        self._recent_flushes = deque(maxlen=64)
+
+    def start(self) -> "EventSink":
+        self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def emit(self, events: Iterable[Dict[str, Any]]) -> int:
+        """
+        Queue events for writing without waiting for the backend. Returns how
+        many were accepted, the rest was dropped because the buffer is full.
+        """
+        events = list(events)
+        if not events:
+            return 0
+        with self._condition:
+            room = max(0, self.event_sink_config.max_pending - len(self._pending))
+            accepted = events[:room]
+            self._pending.extend(accepted)
+            dropped = len(events) - len(accepted)
+            self._dropped += dropped
+            # The writer is woken to start the flush timer for the first event, then again for a full batch
+            if accepted and self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+                self._condition.notify_all()
+            elif len(self._pending) >= self.event_sink_config.batch_size:
+                self._condition.notify_all()
+        if accepted:
+            METRICS.event_sink_events.inc(len(accepted), result="queued")
+        if dropped:
+            METRICS.event_sink_events.inc(dropped, result="dropped")
+        return len(accepted)
+
+    def _run(self) -> None:
+        config = self.event_sink_config
+        while True:
+            with self._condition:
+                # Wake up for a full batch, for the oldest event reaching the flush interval, or for shutdown
+                while not (self._stopping or self._flush_requested) and len(self._pending) < config.batch_size:
+                    if self._first_pending_at is None:
+                        self._condition.wait()
+                        continue
+                    remaining = self._first_pending_at + config.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stopping and not self._pending:
+                    return
+                batch = [self._pending.popleft() for _ in range(min(config.batch_size, len(self._pending)))]
+                self._first_pending_at = time.monotonic() if self._pending else None
+                if not self._pending:
+                    self._flush_requested = False
+                self._in_flight = len(batch)
+            if batch:
+                self._write(batch)
+            with self._condition:
+                self._in_flight = 0
+                # Wakes flush() callers waiting for the buffer to drain
+                self._condition.notify_all()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        config = self.event_sink_config
+        for attempt in range(config.max_retries + 1):
+            started_at = time.perf_counter()
+            try:
+                self.backend.write(batch)
+            except Exception as e:
+                logging.warning(f"Event sink write of {len(batch)} events failed (attempt {attempt + 1}): {e}")
+                # Events keep queueing meanwhile, a backend that stays down ends up dropping them at emit()
+                time.sleep(min(2.0 ** attempt * 0.1, config.flush_interval))
+                continue
+            seconds = time.perf_counter() - started_at
+            METRICS.event_sink_flush_duration.observe(seconds)
+            METRICS.event_sink_batch_size.observe(len(batch))
+            METRICS.event_sink_events.inc(len(batch), result="written")
+            with self._condition:
+                self._written += len(batch)
+                self._flushes += 1
+                self._recent_flushes.append((time.monotonic(), len(batch)))
+            return
+        METRICS.event_sink_events.inc(len(batch), result="failed")
+        with self._condition:
+            self._failed += len(batch)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything queued so far was handed to the backend, for shutdown and benchmarks"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write out what is still queued, then stop the writer and close the backend"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.backend.close()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            recent = list(self._recent_flushes)
+            stats = {
+                "backend": type(self.backend).__name__,
+                "pending": len(self._pending),
+                "max_pending": self.event_sink_config.max_pending,
+                "written": self._written,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "flushes": self._flushes,
+            }
+        span = recent[-1][0] - recent[0][0] if len(recent) > 1 else 0.0
+        stats["events_per_second"] = round(sum(count for _, count in recent[1:]) / span, 1) if span > 0 else None
+        return stats
+
+
+def create_event_sink(event_sink_config: EventSinkConfig = EventSinkConfig()) -> Optional[EventSink]:
+    """Started sink for the configured backend, None when the backend is none"""
+    if event_sink_config.backend == "none":
+        return None
+    if event_sink_config.backend not in EVENT_SINK_BACKENDS:
+        raise ValueError(f"EVENT_SINK_BACKEND must be one of none, {', '.join(EVENT_SINK_BACKENDS)}, "
+                         f"got {event_sink_config.backend!r}")
+    backend = EVENT_SINK_BACKENDS[event_sink_config.backend](event_sink_config.path, event_sink_config.fsync)
+    logging.info(f"Writing violation events to {event_sink_config.path} ({event_sink_config.backend})")
+    return EventSink(backend, event_sink_config).start()
+
+
+def violation_records(compliance: Dict[str, Any], source: str, **fields) -> List[Dict[str, Any]]:
+    """One event per violating person of a frame's compliance records"""
+    created_at = round(time.time(), 3)
+    return [
+        {
+            "created_at": created_at,
+            "type": "violation",
+            "source": source,
+            **fields,
+            "track_id": person.get("track_id"),
+            "violation": ",".join(person["violations"]),
+            "box": person["box"],
+            "confidence": person["confidence"],
+        }
+        for person in compliance["persons"] if person["violations"]
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Write throughput of the event sink and the emit() cost "
+                                                 "seen by request threads")
+    parser.add_argument("--backend", choices=sorted(EVENT_SINK_BACKENDS), default="sqlite")
+    parser.add_argument("--events", type=int, default=200000, help="events to emit")
+    parser.add_argument("--per-emit", type=int, default=4, help="events per emit() call, like one frame")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="events per second to emit at, as fast as possible by default")
+    parser.add_argument("--batch-size", type=int, default=EventSinkConfig.batch_size)
+    parser.add_argument("--max-pending", type=int, default=EventSinkConfig.max_pending)
+    parser.add_argument("--fsync", action="store_true", help="sync every batch to disk")
+    parser.add_argument("--path", default=None, help="output file, a temporary one by default")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="event_sink_")
+    path = args.path or os.path.join(directory, f"events.{'db' if args.backend == 'sqlite' else 'jsonl'}")
+    config = EventSinkConfig(backend=args.backend, path=path, batch_size=args.batch_size,
+                             max_pending=args.max_pending, fsync=args.fsync)
+    sink = create_event_sink(config)
+    event = {"type": "violation", "source": "benchmark", "track_id": 7, "violation": "Hardhat",
+             "box": [412.5, 88.0, 520.25, 391.75], "confidence": 0.91}
+
+    emit_seconds = np.empty(args.events // args.per_emit)
+    started_at = time.perf_counter()
+    for index in range(len(emit_seconds)):
+        if args.rate:
+            time.sleep(max(0.0, started_at + index * args.per_emit / args.rate - time.perf_counter()))
+        events = [dict(event, created_at=time.time()) for _ in range(args.per_emit)]
+        emit_started_at = time.perf_counter()
+        sink.emit(events)
+        emit_seconds[index] = time.perf_counter() - emit_started_at
+    emitted_in = time.perf_counter() - started_at
+    sink.flush(timeout=600)
+    total = time.perf_counter() - started_at
+    stats = sink.stats()
+    sink.close()
+
+    print(json.dumps({
+        "backend": args.backend,
+        "path": path,
+        "events": len(emit_seconds) * args.per_emit,
+        "emit_us": {
+            "p50": round(float(np.percentile(emit_seconds, 50)) * 1e6, 2),
+            "p99": round(float(np.percentile(emit_seconds, 99)) * 1e6, 2),
+            "max": round(float(emit_seconds.max()) * 1e6, 2),
+        },
+        "emit_seconds": round(emitted_in, 3),
+        "written": stats["written"],
+        "dropped": stats["dropped"],
+        "flushes": stats["flushes"],
+        "written_per_second": round(stats["written"] / total, 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
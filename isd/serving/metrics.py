@@ -0,0 +1,271 @@
+"""
+Prometheus text-format metrics for the serving path.
+
+A small in-process registry instead of a client library: every update is a
+dict lookup and an addition under a lock, so the metrics can stay on in
+production. Each process (e.g. each gunicorn worker) exposes its own values
+on GET /metrics and Prometheus sums them across targets.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+
+# Seconds, from sub-millisecond decode steps to multi-second CPU batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in values]
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in values]
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum, count
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+
+        lines = self.header()
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """Callable returning extra exposition lines, evaluated on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+class ServingMetrics:
+    """The metrics of the serving path, shared by the routes, the scheduler and the model manager"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.model_version = "none"
+
+        self.requests = self.registry.register(Counter(
+            "isd_http_requests_total", "HTTP requests by route, method and status code.",
+            ("route", "method", "status")))
+        self.errors = self.registry.register(Counter(
+            "isd_http_request_errors_total", "HTTP requests answered with a 4xx or 5xx status.",
+            ("route", "status")))
+        self.in_flight = self.registry.register(Gauge(
+            "isd_http_requests_in_flight", "HTTP requests currently being served.", ("route",)))
+        self.request_duration = self.registry.register(Histogram(
+            "isd_http_request_duration_seconds", "Wall time of HTTP requests.", ("route",)))
+        self.stage_duration = self.registry.register(Histogram(
+            "isd_stage_duration_seconds",
+            "Time per image in each serving stage: decode, queue_wait, preprocess, inference, "
+            "postprocess (NMS), tile and tile_merge (sliced inference), render and encode.",
+            ("stage", "model_version")))
+        self.batch_size = self.registry.register(Histogram(
+            "isd_inference_batch_size", "Images per batched forward pass.", ("model_version",),
+            buckets=(1, 2, 4, 8, 16, 32, 64)))
+        self.roi_pixels = self.registry.register(Counter(
+            "isd_roi_model_input_pixels_total",
+            "Model input pixels spent on region-of-interest crops (input=roi) and what the full frames "
+            "would have cost (input=full_frame).", ("camera_id", "input")))
+        self.roi_dropped = self.registry.register(Counter(
+            "isd_roi_dropped_detections_total", "Detections dropped outside a camera's ROI polygons.",
+            ("camera_id",)))
+        self.shed = self.registry.register(Counter(
+            "isd_requests_shed_total", "Requests answered 503 by admission control.", ("reason",)))
+        self.expired = self.registry.register(Counter(
+            "isd_requests_expired_total",
+            "Requests dropped past their deadline, while queued (stage=queue) or waiting for the result "
+            "(stage=wait).", ("stage",)))
+        self.adaptive_image_size = self.registry.register(Gauge(
+            "isd_adaptive_image_size", "Inference image size currently chosen by the adaptive controller."))
+        self.adaptive_changes = self.registry.register(Counter(
+            "isd_adaptive_resolution_changes_total", "Adaptive resolution steps by direction and reason.",
+            ("direction", "reason")))
+        self.adaptive_latency_p95 = self.registry.register(Gauge(
+            "isd_adaptive_latency_p95_seconds", "p95 of queue plus inference time seen at the last decision."))
+        self.tracking_frames = self.registry.register(Counter(
+            "isd_tracking_frames_total",
+            "Tracked video frames, matched to fresh detections (mode=detected) or propagated by the Kalman "
+            "filter without running the model (mode=propagated).", ("mode",)))
+        self.violation_events = self.registry.register(Counter(
+            "isd_violation_events_total", "Per-track PPE violation events by type.", ("type",)))
+        self.event_sink_events = self.registry.register(Counter(
+            "isd_event_sink_events_total",
+            "Violation events queued for, written to, dropped before or failed in the event sink backend.",
+            ("result",)))
+        self.event_sink_batch_size = self.registry.register(Histogram(
+            "isd_event_sink_batch_size", "Events per event sink write.",
+            buckets=(1, 4, 16, 64, 256, 1024, 4096)))
+        self.event_sink_flush_duration = self.registry.register(Histogram(
+            "isd_event_sink_flush_duration_seconds", "Time of one batched event sink write.",
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)))
+        self.stream_frames = self.registry.register(Counter(
+            "isd_stream_frames_total",
+            "Camera stream frames sent to the model (result=inferred) or replaced by a newer frame before "
+            "that (result=dropped).", ("stream_id", "result")))
+        self.stream_lag = self.registry.register(Histogram(
+            "isd_stream_lag_seconds", "Time from reading a camera stream frame to having its detections.",
+            ("stream_id",), buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+        self.model_info = self.registry.register(Gauge(
+            "isd_model_info", "The model currently served, always 1.", ("model_version", "backend")))
+
+    def set_model(self, model_version: str, backend: str) -> None:
+        self.model_version = model_version
+        self.model_info.clear()
+        self.model_info.set(1, model_version=model_version, backend=backend)
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        self.stage_duration.observe(seconds, stage=stage, model_version=self.model_version)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started_at)
+
+    def observe_predictions(self, predictions) -> None:
+        """Per-image preprocess, inference and NMS times reported by ultralytics for one batch"""
+        self.batch_size.observe(len(predictions), model_version=self.model_version)
+        for prediction in predictions:
+            speed = getattr(prediction, "speed", None) or {}
+            for stage in ("preprocess", "inference", "postprocess"):
+                if speed.get(stage) is not None:
+                    self.observe_stage(stage, speed[stage] / 1000.0)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+METRICS = ServingMetrics()
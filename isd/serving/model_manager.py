@@ -0,0 +1,550 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from isd.logger import logging
+from isd.exception import isdException
+from isd.constant.application import INFERENCE_BACKEND_MODEL_FILES, MODEL_MANAGER_SOURCE_FILE_SUFFIX
+from isd.entity.config_entity import ModelManagerConfig, ModelPusherConfig, InferenceWorkerPoolConfig
+from isd.serving.metrics import METRICS
+
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when inference is requested before the model is loaded and warm"""
+
+
+class LoadedModel:
+    """
+    One loaded set of weights, in-process or in a worker pool. It counts the
+    requests running on it, so a model that was swapped out is only closed
+    once its in-flight requests have finished.
+    """
+
+    def __init__(self, backend: str, model_path: str, source: Optional[Dict[str, Any]],
+                 worker_pool_config: InferenceWorkerPoolConfig):
+        self.backend = backend
+        self.model_path = model_path
+        self.source = source  # ETag and version id of the S3 object, None when unknown
+        self.model = None
+        self.worker_pool = None
+        self.model_lock = threading.Lock()  # YOLO predictors are not thread-safe
+        self._in_flight = 0
+        self._drained = threading.Condition()
+
+        if worker_pool_config.num_workers > 0:
+            from isd.serving.worker_pool import InferenceWorkerPool
+
+            self.worker_pool = InferenceWorkerPool(model_path, worker_pool_config)
+            self.names = self.worker_pool.names
+        else:
+            from ultralytics import YOLO
+
+            self.model = YOLO(model_path, task="detect")
+            self.names = self.model.names
+
+    @property
+    def version(self) -> str:
+        # Changes whenever different weights are loaded, cached results are keyed on it
+        stamp = self.source["etag"] if self.source else os.stat(self.model_path).st_mtime_ns
+        return f"{self.backend}:{os.path.basename(self.model_path)}:{stamp}"
+
+    @property
+    def num_workers(self) -> int:
+        return self.worker_pool.num_workers if self.worker_pool is not None else 0
+
+    def acquire(self) -> None:
+        with self._drained:
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._drained:
+            self._in_flight -= 1
+            self._drained.notify_all()
+
+    def predict(self, images: List[np.ndarray], **params) -> List[Any]:
+        if self.worker_pool is not None:
+            return self.worker_pool.predict(images, **params)
+        with self.model_lock:
+            return self.model.predict(source=images, verbose=False, **params)
+
+    def warm_up(self, image_size: int) -> None:
+        """Dummy inference so the first real request does not pay for lazy initialisation"""
+        image = np.zeros((image_size, image_size, 3), dtype=np.uint8)
+        # Calls rotate through the idle workers, so every worker process gets warmed once
+        for _ in range(max(1, self.num_workers)):
+            self.predict([image], imgsz=image_size)
+
+    def relocate(self, model_path: str) -> None:
+        """The weights were moved after loading, restarted workers must load them from there"""
+        self.model_path = model_path
+        if self.worker_pool is not None:
+            self.worker_pool.relocate(model_path)
+
+    def close(self) -> None:
+        with self._drained:
+            while self._in_flight:
+                self._drained.wait()
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+
+
+class ModelManager:
+    """
+    Loads the model off the startup path and keeps it up to date.
+
+    start() returns immediately; a background thread fetches best.pt from S3
+    when it is not on disk, loads it (in-process or into a worker pool), runs a
+    dummy inference to warm it and only then reports ready. When no model can
+    be found it keeps retrying, so a replica becomes ready as soon as the
+    training pipeline pushes one. Training itself never runs here.
+
+    Once ready, the same thread polls the ETag of the served weights in S3.
+    New weights are downloaded to a temporary file, loaded and warmed next to
+    the serving model and swapped in atomically; requests already running
+    finish on the old model. Reloads can also be forced, or pinned to an S3
+    object version, through request_reload().
+    """
+
+    STARTING = "starting"
+    DOWNLOADING = "downloading"
+    LOADING = "loading"
+    WARMING = "warming"
+    READY = "ready"
+    WAITING_FOR_MODEL = "waiting_for_model"
+    FAILED = "failed"
+
+    IDLE = "idle"
+
+    def __init__(self, model_pusher_config: ModelPusherConfig,
+                 model_manager_config: ModelManagerConfig = ModelManagerConfig(),
+                 worker_pool_config: InferenceWorkerPoolConfig = InferenceWorkerPoolConfig()):
+        self.model_pusher_config = model_pusher_config
+        self.model_manager_config = model_manager_config
+        self.worker_pool_config = worker_pool_config
+
+        self._active: Optional[LoadedModel] = None
+        self._swap_lock = threading.Lock()
+        self._downloaded_source: Optional[Dict[str, Any]] = None
+
+        self.state = self.STARTING
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Hot reload state
+        self.reload_state = self.IDLE
+        self.reload_error: Optional[str] = None
+        self.reloads = 0
+        self.last_check: Optional[float] = None
+        self.pinned_version: Optional[str] = None
+        self._reload_requested = threading.Event()
+        self._force_reload = False
+        self._reload_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def backend(self) -> Optional[str]:
+        return self._active.backend if self._active is not None else None
+
+    @property
+    def model_path(self) -> Optional[str]:
+        return self._active.model_path if self._active is not None else None
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self._active.version if self._active is not None else None
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self._active.names if self._active is not None else {}
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def start(self) -> "ModelManager":
+        self._thread = threading.Thread(target=self._load_loop, name="model-loader", daemon=True)
+        self._thread.start()
+        return self
+
+    def _load_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                if self._load():
+                    # The loader thread then watches S3 for newer weights
+                    self._watch_loop()
+                    return
+                self.state = self.WAITING_FOR_MODEL
+                self.error = "Model not found locally or in S3, run the training pipeline to publish one"
+                logging.warning(f"{self.error}; retrying in {self.model_manager_config.retry_interval}s")
+            except Exception as e:
+                self.state = self.FAILED
+                self.error = str(isdException(e, sys))
+                logging.error(f"Model loading failed, retrying in {self.model_manager_config.retry_interval}s: {self.error}")
+            self._stopped.wait(self.model_manager_config.retry_interval)
+
+    def _download(self, key: str, model_path: str) -> Optional[Dict[str, Any]]:
+        """Download one model file from the model bucket, its S3 source or None when it is not there"""
+        # boto3 is only imported when a download is actually needed
+        from isd.configuration.s3_operations import S3Operation
+
+        self.state = self.DOWNLOADING
+        os.makedirs(self.model_manager_config.model_dir, exist_ok=True)
+        s3 = S3Operation()
+        bucket_name = self.model_pusher_config.MODEL_BUCKET_NAME
+        source = s3.get_object_version(bucket_name, key)
+        if source is None:
+            return None
+
+        started_at = time.perf_counter()
+        # Download next to the target and rename, so a half-written file is never loaded
+        partial_path = model_path + ".download"
+        s3.download_object(key=key, bucket_name=bucket_name, filename=partial_path, version_id=source["version_id"])
+        os.replace(partial_path, model_path)
+        self._write_source(model_path, source)
+        self.timings["download_seconds"] = round(time.perf_counter() - started_at, 3)
+        logging.info(f"Downloaded s3://{bucket_name}/{key} (etag {source['etag']})")
+        return source
+
+    def _download_folder(self, key: str, model_path: str) -> bool:
+        """Download a model directory, e.g. an OpenVINO model, False when it is not there"""
+        from isd.configuration.s3_operations import S3Operation
+
+        self.state = self.DOWNLOADING
+        partial_path = model_path + ".download"
+        shutil.rmtree(partial_path, ignore_errors=True)
+        bucket_name = self.model_pusher_config.MODEL_BUCKET_NAME
+        if not S3Operation().download_folder(key, bucket_name, partial_path):
+            return False
+        shutil.rmtree(model_path, ignore_errors=True)
+        os.replace(partial_path, model_path)
+        logging.info(f"Downloaded s3://{bucket_name}/{key}/")
+        return True
+
+    def _fetch_model(self) -> bool:
+        """Make sure the weights are on disk, downloading them from S3 if needed"""
+        if os.path.exists(self.model_manager_config.model_path):
+            return True
+        self._downloaded_source = self._download(self.model_pusher_config.S3_MODEL_KEY_PATH,
+                                                 self.model_manager_config.model_path)
+        return self._downloaded_source is not None
+
+    def _exported_keys(self) -> Dict[str, str]:
+        """S3 keys of the exported backends the training pipeline publishes next to best.pt"""
+        return {
+            "onnx": self.model_pusher_config.S3_ONNX_MODEL_KEY_PATH,
+            "openvino": self.model_pusher_config.S3_OPENVINO_MODEL_KEY_PATH,
+        }
+
+    def _read_export_report(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.model_manager_config.export_report_file_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _export_report(self) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Export report made from the best.pt on disk, and whether it was just
+        fetched from S3, in which case the exports on disk are older than it.
+        None when neither the local nor the published report matches best.pt.
+        """
+        model_md5 = self._file_md5(self.model_manager_config.model_path)
+        report = self._read_export_report()
+        if report is not None and report.get("model_md5") == model_md5:
+            return report, False
+        try:
+            self._download(self.model_pusher_config.S3_EXPORT_REPORT_KEY_PATH,
+                           self.model_manager_config.export_report_file_path)
+        except Exception as e:
+            logging.warning(f"Could not download the export report: {e}")
+        report = self._read_export_report()
+        if report is not None and report.get("model_md5") == model_md5:
+            return report, True
+        return None, False
+
+    def _resolve_backend(self):
+        """
+        Backend and weights to serve. "auto" picks the fastest validated backend
+        from the export report. Exported weights are only served when the
+        report says they were made from the best.pt on disk, and are fetched
+        from S3 when missing or older than it; otherwise the PyTorch weights
+        are served.
+        """
+        backend = self.model_manager_config.backend.lower()
+        if backend != "auto" and backend not in INFERENCE_BACKEND_MODEL_FILES:
+            raise ValueError(f"Unknown inference backend {backend!r}, "
+                             f"expected one of {', '.join(INFERENCE_BACKEND_MODEL_FILES)} or auto")
+        fallback = ("pytorch", self.model_manager_config.model_path)
+
+        exported_keys = self._exported_keys()
+        if backend == "auto" or backend in exported_keys:
+            report, refreshed = self._export_report()
+            if backend == "auto":
+                backend = report.get("best_backend", "pytorch") if report is not None else "pytorch"
+            if backend in exported_keys:
+                if report is None or backend not in report.get("valid_backends", []):
+                    logging.warning(f"No validated {backend} export of the current best.pt, "
+                                    f"serving the PyTorch model instead")
+                    return fallback
+                model_path = os.path.join(self.model_manager_config.model_dir, INFERENCE_BACKEND_MODEL_FILES[backend])
+                if refreshed or not os.path.exists(model_path):
+                    try:
+                        download = self._download_folder if backend == "openvino" else self._download
+                        if not download(exported_keys[backend], model_path):
+                            raise FileNotFoundError(f"s3://{self.model_pusher_config.MODEL_BUCKET_NAME}/"
+                                                    f"{exported_keys[backend]} not found")
+                    except Exception as e:
+                        logging.warning(f"Could not download the {backend} model, serving PyTorch instead: {e}")
+                        return fallback
+                return backend, model_path
+
+        model_path = os.path.join(self.model_manager_config.model_dir, INFERENCE_BACKEND_MODEL_FILES[backend])
+        if backend == "onnx_int8" and not os.path.exists(model_path):
+            # Only published to S3 when it passed the accuracy gate of the training pipeline
+            try:
+                self._download(self.model_pusher_config.S3_QUANTIZED_MODEL_KEY_PATH, model_path)
+            except Exception as e:
+                logging.warning(f"Could not download the INT8 model: {e}")
+        if not os.path.exists(model_path):
+            logging.warning(f"{backend} weights not found at {model_path}, serving the PyTorch model instead")
+            return fallback
+        return backend, model_path
+
+    @staticmethod
+    def _write_source(model_path: str, source: Dict[str, Any]) -> None:
+        """Record which S3 object the weights on disk came from, next to them"""
+        stat = os.stat(model_path)
+        record = {
+            "etag": source["etag"],
+            "version_id": source.get("version_id"),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        try:
+            with open(model_path + MODEL_MANAGER_SOURCE_FILE_SUFFIX, "w") as f:
+                json.dump(record, f)
+        except OSError as e:
+            logging.warning(f"Could not record the S3 source of {model_path}: {e}")
+
+    @staticmethod
+    def _read_source(model_path: str) -> Optional[Dict[str, Any]]:
+        """S3 object the weights on disk came from, None when unknown or the file changed since"""
+        try:
+            with open(model_path + MODEL_MANAGER_SOURCE_FILE_SUFFIX) as f:
+                record = json.load(f)
+            stat = os.stat(model_path)
+        except (OSError, ValueError):
+            return None
+        # Weights replaced by hand no longer match the recorded object
+        if record.get("size") != stat.st_size or record.get("mtime_ns") != stat.st_mtime_ns:
+            return None
+        return {"etag": record["etag"], "version_id": record.get("version_id")}
+
+    def _load(self) -> bool:
+        self._downloaded_source = None
+        if not self._fetch_model():
+            return False
+
+        self.state = self.LOADING
+        started_at = time.perf_counter()
+        backend, model_path = self._resolve_backend()
+        # Weights downloaded just now, or found on disk with the record of the S3 object they came from
+        if model_path == self.model_manager_config.model_path and self._downloaded_source is not None:
+            source = self._downloaded_source
+        else:
+            source = self._read_source(model_path)
+        loaded = LoadedModel(backend, model_path, source, self.worker_pool_config)
+        self.timings["load_seconds"] = round(time.perf_counter() - started_at, 3)
+
+        self.state = self.WARMING
+        started_at = time.perf_counter()
+        loaded.warm_up(self.model_manager_config.warmup_image_size)
+        self.timings["warmup_seconds"] = round(time.perf_counter() - started_at, 3)
+
+        self._active = loaded
+        METRICS.set_model(loaded.version, loaded.backend)
+        self.state = self.READY
+        self.error = None
+        self._ready.set()
+        logging.info(f"Model {model_path} ({backend} backend) loaded and warm: {self.timings}")
+        return True
+
+    def _watched_key(self) -> Optional[str]:
+        """S3 key of the weights being served, None for backends that are not published to S3"""
+        return {
+            "pytorch": self.model_pusher_config.S3_MODEL_KEY_PATH,
+            "onnx_int8": self.model_pusher_config.S3_QUANTIZED_MODEL_KEY_PATH,
+        }.get(self.backend)
+
+    def request_reload(self, version_id: Optional[str] = None, pin: Optional[bool] = None) -> None:
+        """
+        Ask the watcher to check S3 and reload now. With pin=True the given S3
+        object version is loaded and kept until unpinned; pin=False returns to
+        following the latest object.
+        """
+        if not self.ready:
+            raise ModelNotReadyError(f"Model is not ready yet (state: {self.state})")
+        if self._watched_key() is None:
+            raise ValueError(f"Hot reload is not available for the {self.backend} backend")
+        if pin is True:
+            if not version_id:
+                raise ValueError("A version id is required to pin the model")
+            self.pinned_version = version_id
+        elif pin is False:
+            self.pinned_version = None
+        elif version_id:
+            raise ValueError("Loading a specific version requires pin=true")
+        self._force_reload = True
+        self._reload_requested.set()
+
+    def _watch_loop(self) -> None:
+        if self._watched_key() is None:
+            logging.info(f"Hot reload is not available for the {self.backend} backend")
+            return
+        interval = self.model_manager_config.reload_interval
+        while not self._stopped.is_set():
+            # Polls on the interval, or right away when a reload is requested
+            self._reload_requested.wait(interval if interval > 0 else None)
+            if self._stopped.is_set():
+                return
+            self._reload_requested.clear()
+            force, self._force_reload = self._force_reload, False
+            try:
+                self._check_for_update(force)
+            except Exception as e:
+                self.reload_state = self.FAILED
+                self.reload_error = str(isdException(e, sys))
+                logging.error(f"Model reload failed, still serving {self.model_version}: {self.reload_error}")
+
+    @staticmethod
+    def _file_md5(path: str) -> str:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _is_current(self, remote: Dict[str, Any]) -> bool:
+        active = self._active
+        if active.source is None:
+            # Weights on disk of unknown origin: only single-part uploads have the file's MD5 as ETag,
+            # a multipart ETag ends in -<parts> and is downloaded once, which records its source
+            if "-" in remote["etag"]:
+                return False
+            if os.path.isfile(active.model_path) and self._file_md5(active.model_path) == remote["etag"]:
+                self._write_source(active.model_path, remote)
+                active.source = remote
+                METRICS.set_model(active.version, active.backend)
+                return True
+            return False
+        if remote.get("version_id") and active.source.get("version_id"):
+            return remote["version_id"] == active.source["version_id"]
+        return remote["etag"] == active.source["etag"]
+
+    def _check_for_update(self, force: bool = False) -> None:
+        from isd.configuration.s3_operations import S3Operation
+
+        with self._reload_lock:
+            s3 = S3Operation()
+            bucket_name = self.model_pusher_config.MODEL_BUCKET_NAME
+            key = self._watched_key()
+            remote = s3.get_object_version(bucket_name, key, self.pinned_version)
+            self.last_check = time.time()
+            if remote is None:
+                raise FileNotFoundError(f"s3://{bucket_name}/{key} (version {self.pinned_version or 'latest'}) not found")
+            if self._is_current(remote) and not force:
+                return
+            self._reload(s3, bucket_name, key, remote)
+
+    def _reload(self, s3, bucket_name: str, key: str, remote: Dict[str, Any]) -> None:
+        active = self._active
+        target_path = active.model_path
+        root, extension = os.path.splitext(target_path)
+        # The suffix is kept so the loader still recognises the format
+        partial_path = f"{root}.download{extension}"
+
+        self.reload_state = self.DOWNLOADING
+        started_at = time.perf_counter()
+        s3.download_object(key=key, bucket_name=bucket_name, filename=partial_path, version_id=remote["version_id"])
+        download_seconds = time.perf_counter() - started_at
+
+        try:
+            # The new model loads and warms next to the serving one, requests keep flowing meanwhile
+            self.reload_state = self.LOADING
+            started_at = time.perf_counter()
+            loaded = LoadedModel(active.backend, partial_path, remote, self.worker_pool_config)
+            self.reload_state = self.WARMING
+            loaded.warm_up(self.model_manager_config.warmup_image_size)
+            load_seconds = time.perf_counter() - started_at
+        except Exception:
+            os.remove(partial_path)
+            raise
+
+        os.replace(partial_path, target_path)
+        self._write_source(target_path, remote)
+        loaded.relocate(target_path)
+        with self._swap_lock:
+            previous, self._active = self._active, loaded
+        METRICS.set_model(loaded.version, loaded.backend)
+
+        self.reloads += 1
+        self.reload_state = self.IDLE
+        self.reload_error = None
+        self.timings["reload_download_seconds"] = round(download_seconds, 3)
+        self.timings["reload_load_seconds"] = round(load_seconds, 3)
+        logging.info(f"Swapped in model {loaded.version} (s3 version {remote['version_id']}), "
+                     f"replacing {previous.version}")
+
+        # Requests still running on the previous model finish before it is released
+        previous.close()
+
+    def predict(self, images: List[np.ndarray], **params) -> List[Any]:
+        if not self.ready:
+            raise ModelNotReadyError(f"Model is not ready yet (state: {self.state})")
+        with self._swap_lock:
+            active = self._active
+            active.acquire()
+        try:
+            return active.predict(images, **params)
+        finally:
+            active.release()
+
+    def status(self) -> Dict[str, Any]:
+        active = self._active
+        source = active.source if active is not None and active.source else {}
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "backend": self.backend,
+            "model_path": self.model_path or self.model_manager_config.model_path,
+            "model_version": self.model_version,
+            "workers": active.num_workers if active is not None else 0,
+            "error": self.error,
+            "reload": {
+                "state": self.reload_state,
+                "error": self.reload_error,
+                "reloads": self.reloads,
+                "pinned_version": self.pinned_version,
+                "s3_etag": source.get("etag"),
+                "s3_version_id": source.get("version_id"),
+                "last_check": self.last_check,
+                "interval_seconds": self.model_manager_config.reload_interval,
+            },
+            **self.timings,
+        }
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._reload_requested.set()
+        if self._active is not None:
+            self._active.close()
@@ -0,0 +1,130 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+from isd.entity.config_entity import ResultCacheConfig
+from isd.serving.scheduler import make_params_key
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of detections, keyed by a hash of the decoded image bytes,
+    the model version and the inference parameters.
+
+    Only the (N, 6) box arrays are kept, not the images, so the memory budget
+    covers many more entries than caching whole Results objects would. A hit is
+    rebuilt into a Results object around the request's own image, which is
+    byte-for-byte the cached one. Entries of an older model version are dropped
+    as soon as the served version changes. Requests that started on the
+    previous model and finish after a hot reload neither read nor write
+    entries, so they cannot roll the cache back.
+    """
+
+    # Rough per-entry cost of the key, the dict slot and the array header
+    _ENTRY_OVERHEAD = 256
+
+    def __init__(self, result_cache_config: ResultCacheConfig = ResultCacheConfig(),
+                 current_version: Optional[Callable[[], Optional[str]]] = None):
+        """current_version returns the version being served, without it any new version moves the cache forward"""
+        self.result_cache_config = result_cache_config
+        self.current_version = current_version
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._model_version: Optional[str] = None
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.result_cache_config.max_bytes > 0 and self.result_cache_config.ttl_seconds > 0
+
+    @staticmethod
+    def make_key(image: np.ndarray, model_version: str, params: Dict[str, Any]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.shape}|{image.dtype.str}|{model_version}|{make_params_key(params)}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def _check_version(self, model_version: str) -> bool:
+        """
+        Called with the lock held. False for a request of a model that is no
+        longer served; a newly served model makes every cached result stale.
+        """
+        if model_version == self._model_version:
+            return True
+        if self.current_version is not None and model_version != self.current_version():
+            return False
+        if self._entries:
+            self._invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._model_version = model_version
+        return True
+
+    def _remove(self, key: str) -> None:
+        boxes, _ = self._entries.pop(key)
+        self._bytes -= boxes.nbytes + self._ENTRY_OVERHEAD
+
+    def get(self, key: str, model_version: str) -> Optional[np.ndarray]:
+        """Cached box array of a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key) if self._check_version(model_version) else None
+            if entry is None:
+                self._misses += 1
+                return None
+            boxes, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return boxes
+
+    def put(self, key: str, model_version: str, boxes: np.ndarray) -> None:
+        size = boxes.nbytes + self._ENTRY_OVERHEAD
+        if size > self.result_cache_config.max_bytes:
+            return
+        with self._lock:
+            # Results of a model swapped out while the request ran are not kept
+            if not self._check_version(model_version):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (boxes, time.monotonic() + self.result_cache_config.ttl_seconds)
+            self._bytes += size
+            # Least recently used entries go first once the budget is exceeded
+            while self._bytes > self.result_cache_config.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "model_version": self._model_version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.result_cache_config.max_bytes,
+                "ttl_seconds": self.result_cache_config.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,290 @@
+"""
+Per-camera regions of interest.
+
+Walls, ceilings and fenced-off areas take up a large part of many camera views.
+The camera registry (a YAML file) lists, per camera id, the polygons where
+people can actually be:
+
+    cameras:
+      dock-3:
+        rois:
+          - [[120, 400], [1800, 380], [1900, 1080], [60, 1080]]
+        anchor: bottom
+
+Frames of a registered camera are cropped to the bounding box of its ROIs
+(one crop, or one crop per polygon when they lie far apart). The crops are
+shrunk by the same factor as the full frame would have been, so the model sees
+the same detail in fewer input pixels. Detections whose anchor point (box center, or
+bottom center for floor polygons) falls outside every polygon are dropped.
+
+    python -m isd.serving.roi --model model/best.pt --camera dock-3 --video data/videos/dock3.mp4
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from isd.logger import logging
+from isd.utils.main_utils import read_yaml_file
+from isd.constant.application import SLICING_MERGE_IOU
+from isd.entity.config_entity import CameraRegistryConfig
+from isd.serving.detections import results_from_boxes
+from isd.serving.metrics import METRICS
+from isd.serving.slicing import shift_boxes, merge_boxes
+
+
+ROI_ANCHORS = ("center", "bottom")
+
+
+def points_in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """
+    Even-odd ray casting of (N, 2) points against an (M, 2) polygon, as one
+    (N, M) broadcast over all points and edges instead of a Python loop.
+    """
+    x, y = points[:, 0:1], points[:, 1:2]
+    xi, yi = polygon[:, 0], polygon[:, 1]
+    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+    straddles = (yi > y) != (yj > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Horizontal edges never straddle, so their division by zero is masked out
+        crossing_x = (xj - xi) * (y - yi) / (yj - yi) + xi
+    crossings = np.count_nonzero(straddles & (x < crossing_x), axis=1)
+    return crossings % 2 == 1
+
+
+def model_input_shape(height: int, width: int, scale: float, stride: int) -> Tuple[int, int]:
+    """(h, w) an image is letterboxed to with rectangular inference when shrunk by scale"""
+    return (int(math.ceil(height * scale / stride) * stride),
+            int(math.ceil(width * scale / stride) * stride))
+
+
+class Camera:
+    def __init__(self, camera_id: str, polygons: Sequence[Sequence[Sequence[float]]],
+                 anchor: str, padding: int):
+        if anchor not in ROI_ANCHORS:
+            raise ValueError(f"anchor of camera {camera_id} must be one of {', '.join(ROI_ANCHORS)}, got {anchor!r}")
+        self.camera_id = camera_id
+        self.polygons = [np.asarray(polygon, dtype=np.float32) for polygon in polygons]
+        if not self.polygons or any(polygon.ndim != 2 or polygon.shape[0] < 3 or polygon.shape[1] != 2
+                                    for polygon in self.polygons):
+            raise ValueError(f"Camera {camera_id} needs at least one polygon of three or more [x, y] points")
+        self.anchor = anchor
+        self.padding = padding
+        self._crop_boxes: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def crop_boxes(self, width: int, height: int) -> np.ndarray:
+        """(K, 4) x0, y0, x1, y1 crops covering every polygon of a frame of the given size"""
+        key = (width, height)
+        if key not in self._crop_boxes:
+            boxes = np.array([
+                [polygon[:, 0].min(), polygon[:, 1].min(), polygon[:, 0].max(), polygon[:, 1].max()]
+                for polygon in self.polygons
+            ]) + np.array([-self.padding, -self.padding, self.padding, self.padding])
+            boxes = np.clip(np.round(boxes), 0, [width, height, width, height]).astype(np.int64)
+            # Polygons drawn for a larger resolution may fall outside a smaller frame altogether
+            boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+            areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            union = np.array([boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max()]
+                             if len(boxes) else [0, 0, 0, 0])
+            # One crop around all polygons, unless they lie so far apart that separate crops are smaller
+            if len(boxes) and (union[2] - union[0]) * (union[3] - union[1]) <= areas.sum():
+                boxes = union[None, :]
+            self._crop_boxes[key] = boxes
+        return self._crop_boxes[key]
+
+    def contains(self, boxes: np.ndarray) -> np.ndarray:
+        """Mask of the (N, 6) boxes whose anchor point lies inside any of the polygons"""
+        if self.anchor == "bottom":
+            points = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+        else:
+            points = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+        inside = np.zeros(len(boxes), dtype=bool)
+        for polygon in self.polygons:
+            inside |= points_in_polygon(points, polygon)
+        return inside
+
+
+class CameraRegistry:
+    def __init__(self, camera_registry_config: CameraRegistryConfig = CameraRegistryConfig()):
+        self.camera_registry_config = camera_registry_config
+        self.cameras = self._load()
+
+    def _load(self) -> Dict[str, Camera]:
+        file_path = self.camera_registry_config.config_file_path
+        if not os.path.exists(file_path):
+            logging.info(f"No camera registry at {file_path}, every request is served on the full frame")
+            return {}
+
+        content = read_yaml_file(file_path) or {}
+        cameras = {}
+        for camera_id, camera in (content.get("cameras") or {}).items():
+            cameras[str(camera_id)] = Camera(
+                str(camera_id),
+                camera.get("rois") or [],
+                str(camera.get("anchor", self.camera_registry_config.anchor)).lower(),
+                int(camera.get("padding", self.camera_registry_config.padding)),
+            )
+        logging.info(f"Loaded {len(cameras)} cameras with regions of interest from {file_path}")
+        return cameras
+
+    def get(self, camera_id: Any) -> Camera:
+        camera = self.cameras.get(str(camera_id))
+        if camera is None:
+            raise ValueError(f"Unknown camera_id {camera_id!r}")
+        return camera
+
+
+class RegionOfInterestInference:
+    def __init__(self, predict_many: Callable[..., List[Any]], names: Callable[[], Mapping[int, str]],
+                 camera_registry_config: CameraRegistryConfig = CameraRegistryConfig()):
+        """
+        predict_many takes a list of images plus predict() keyword arguments
+        and returns one prediction per image, e.g. InferenceScheduler.predict_many.
+        names returns the class names of the current model, for frames without any crop.
+        """
+        self.predict_many = predict_many
+        self.names = names
+        self.camera_registry_config = camera_registry_config
+
+    def predict(self, images: List[np.ndarray], camera: Camera, **params) -> List[Any]:
+        """One prediction per frame of the camera, restricted to its regions of interest"""
+        crops, layout = [], []
+        for image in images:
+            height, width = image.shape[:2]
+            boxes = camera.crop_boxes(width, height)
+            layout.append((len(crops), boxes))
+            crops.extend(image[y0:y1, x0:x1] for x0, y0, x1, y1 in boxes)
+
+        if not crops:
+            return [self._empty(image, camera) for image in images]
+
+        # Every crop shares one rectangular input size, so crops of a camera always batch together.
+        # The crops keep the scale of a full-frame pass, which would shrink the long side to imgsz.
+        image_size = int(params.pop("imgsz", self.camera_registry_config.image_size))
+        scale = image_size / max(max(image.shape[:2]) for image in images)
+        crop_height = max(crop.shape[0] for crop in crops)
+        crop_width = max(crop.shape[1] for crop in crops)
+        input_shape = model_input_shape(crop_height, crop_width, scale, self.camera_registry_config.stride)
+        predictions = self.predict_many(crops, imgsz=list(input_shape), **params)
+
+        results = []
+        for image, (start, boxes) in zip(images, layout):
+            crop_predictions = predictions[start:start + len(boxes)]
+            if not crop_predictions:
+                results.append(self._empty(image, camera))
+                continue
+            results.append(self._merge(image, camera, boxes, crop_predictions, input_shape, image_size, params))
+        return results
+
+    def _empty(self, image: np.ndarray, camera: Camera):
+        # No region of interest lies inside this frame, so the model is not run at all
+        result = results_from_boxes(image, np.zeros((0, 6), dtype=np.float32), self.names())
+        result.roi = {"camera_id": camera.camera_id, "crops": 0, "imgsz": None, "input_pixels_saved": 1.0,
+                      "dropped": 0}
+        return result
+
+    def _merge(self, image: np.ndarray, camera: Camera, crop_boxes: np.ndarray, predictions: List[Any],
+               input_shape: Tuple[int, int], image_size: int, params: Dict[str, Any]):
+        boxes = shift_boxes(predictions, crop_boxes[:, :2])
+        if len(crop_boxes) > 1:
+            # Polygons close together can share an object across two crops
+            boxes = merge_boxes(boxes, SLICING_MERGE_IOU, params.get("max_det"))
+        inside = camera.contains(boxes)
+        dropped = int(len(boxes) - inside.sum())
+
+        # Model input pixels actually spent, against a full-frame pass at the same image size
+        height, width = image.shape[:2]
+        full_shape = model_input_shape(height, width, image_size / max(height, width),
+                                       self.camera_registry_config.stride)
+        roi_pixels = len(crop_boxes) * input_shape[0] * input_shape[1]
+        full_pixels = full_shape[0] * full_shape[1]
+        METRICS.roi_pixels.inc(roi_pixels, camera_id=camera.camera_id, input="roi")
+        METRICS.roi_pixels.inc(full_pixels, camera_id=camera.camera_id, input="full_frame")
+        METRICS.roi_dropped.inc(dropped, camera_id=camera.camera_id)
+
+        result = results_from_boxes(image, np.ascontiguousarray(boxes[inside]), predictions[0].names)
+        result.roi = {
+            "camera_id": camera.camera_id,
+            "crops": len(crop_boxes),
+            "imgsz": list(input_shape),
+            "input_pixels_saved": round(1.0 - roi_pixels / full_pixels, 4),
+            "dropped": dropped,
+        }
+        return result
+
+
+def _read_frames(video_path: Optional[str], image_path: Optional[str], frames: int) -> List[np.ndarray]:
+    import cv2
+    from isd.serving.video import iter_video_frames
+
+    if image_path:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image {image_path}")
+        return [image] * frames
+    collected = []
+    for _, _, frame in iter_video_frames(video_path):
+        collected.append(frame)
+        if len(collected) == frames:
+            break
+    return collected
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare full-frame and region-of-interest inference cost")
+    parser.add_argument("--model", default="model/best.pt", help="model weights to load")
+    parser.add_argument("--cameras", default=CameraRegistryConfig.config_file_path, help="camera registry YAML")
+    parser.add_argument("--camera", required=True, help="camera id to take the polygons from")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--video", help="video of the camera")
+    source.add_argument("--image", help="single frame of the camera")
+    parser.add_argument("--frames", type=int, default=50, help="frames to time per mode")
+    parser.add_argument("--imgsz", type=int, default=CameraRegistryConfig.image_size)
+    args = parser.parse_args(argv)
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    camera_registry_config = CameraRegistryConfig(config_file_path=args.cameras, image_size=args.imgsz)
+    camera = CameraRegistry(camera_registry_config).get(args.camera)
+    roi_inference = RegionOfInterestInference(
+        lambda images, **params: model.predict(source=images, verbose=False, **params),
+        lambda: model.names, camera_registry_config,
+    )
+    frames = _read_frames(args.video, args.image, args.frames)
+    if not frames:
+        raise ValueError("No frames to time")
+
+    # Warm both input shapes up before timing
+    model.predict(source=frames[0], imgsz=args.imgsz, verbose=False)
+    roi_inference.predict(frames[:1], camera)
+
+    started_at = time.perf_counter()
+    full_detections = sum(len(model.predict(source=frame, imgsz=args.imgsz, verbose=False)[0].boxes)
+                          for frame in frames)
+    full_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    roi_results = [roi_inference.predict([frame], camera)[0] for frame in frames]
+    roi_seconds = time.perf_counter() - started_at
+
+    report = {
+        "camera_id": camera.camera_id,
+        "frames": len(frames),
+        "frame_shape": list(frames[0].shape[:2]),
+        "full_frame_ms": round(full_seconds / len(frames) * 1000.0, 3),
+        "roi_ms": round(roi_seconds / len(frames) * 1000.0, 3),
+        "speedup": round(full_seconds / roi_seconds, 3) if roi_seconds else None,
+        "roi": roi_results[0].roi,
+        "full_frame_detections": full_detections,
+        "roi_detections": sum(len(result.boxes) for result in roi_results),
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import sys
+import time
+import queue
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from isd.logger import logging
+from isd.exception import isdException
+from isd.entity.config_entity import InferenceSchedulerConfig
+from isd.serving.metrics import METRICS
+
+
+@dataclass
+class InferenceRequest:
+    image: np.ndarray
+    params: Dict[str, Any]
+    params_key: tuple
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # perf_counter() time after which the caller no longer wants the result
+    deadline: Optional[float] = None
+    # Background work, e.g. camera streams, is left out of the depth that admission control checks
+    background: bool = False
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a request is not admitted because the inference queue is full"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Set on requests whose deadline passed while they were still queued"""
+
+
+def make_params_key(params: Dict[str, Any]) -> tuple:
+    """Hashable key of the inference parameters, only requests with equal keys share a batch"""
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, (list, tuple)) else value)
+        for name, value in params.items()
+    ))
+
+
+class InferenceScheduler:
+    """
+    Collects concurrent predict requests into micro-batches in front of the model.
+
+    A background thread owns the model: it waits for the first request, keeps
+    collecting until the batch is full or max_wait_ms has passed, runs one
+    batched forward pass through predict_fn and resolves every caller's future
+    with its own result. With concurrency > 1 several threads take turns at
+    collecting batches and run them in parallel, e.g. on a pool of model
+    worker processes.
+    """
+
+    # How often idle threads wake up to check whether the scheduler was stopped
+    _POLL_INTERVAL = 0.5
+
+    def __init__(self, predict_fn: Callable[..., List[Any]],
+                 scheduler_config: InferenceSchedulerConfig = InferenceSchedulerConfig()):
+        self.predict_fn = predict_fn
+        self.scheduler_config = scheduler_config
+
+        self._queue: "queue.Queue[InferenceRequest]" = queue.Queue()
+        self._carry_over: deque = deque()
+        # Images not yet in a batch, kept apart so admission only counts foreground work
+        self._foreground_depth = 0
+        self._background_depth = 0
+        self._collect_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_waits_ms = deque(maxlen=self.scheduler_config.stats_window)
+        self._inference_ms = deque(maxlen=self.scheduler_config.stats_window)
+        self._total_requests = 0
+        self._total_batches = 0
+        self._total_errors = 0
+        self._total_shed = 0
+        self._total_expired = 0
+        self._listeners: List[Callable[[Dict[str, Any], List[float]], None]] = []
+
+    def add_listener(self, listener: Callable[[Dict[str, Any], List[float]], None]) -> None:
+        """Called after every batch with its params and the seconds each request spent queued and inferred"""
+        self._listeners.append(listener)
+
+    def queue_depth(self, background: bool = True) -> int:
+        """Images waiting for a batch, without the background ones when background is False"""
+        with self._stats_lock:
+            return self._foreground_depth + (self._background_depth if background else 0)
+
+    def admit(self) -> None:
+        """
+        Admission control in front of the queue: raise QueueFullError once
+        max_queue_depth images are waiting, so callers can shed the request
+        right away instead of letting it time out in the queue. A request that
+        is admitted may still add several images, e.g. tiles or video frames.
+        Background images do not count: camera streams never go through
+        admission and pace themselves by dropping frames instead.
+        """
+        max_queue_depth = self.scheduler_config.max_queue_depth
+        if max_queue_depth and self.queue_depth(background=False) >= max_queue_depth:
+            with self._stats_lock:
+                self._total_shed += 1
+            METRICS.shed.inc(reason="queue_full")
+            raise QueueFullError(f"Inference queue is full ({max_queue_depth} images waiting)")
+
+    def start(self) -> "InferenceScheduler":
+        if self._running:
+            return self
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._run, name=f"inference-scheduler-{index}", daemon=True)
+            for index in range(max(1, self.scheduler_config.concurrency))
+        ]
+        for thread in self._threads:
+            thread.start()
+        logging.info(
+            f"Inference scheduler started with max_batch_size={self.scheduler_config.max_batch_size}, "
+            f"max_wait_ms={self.scheduler_config.max_wait_ms} and concurrency={len(self._threads)}"
+        )
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if not self._running:
+            return
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout)
+        logging.info("Inference scheduler stopped")
+
+    def submit(self, image: np.ndarray, deadline: Optional[float] = None, background: bool = False,
+               **params) -> Future:
+        """
+        Queue one image for inference and return a future resolving to its
+        result. With a deadline (a time.perf_counter() value) the image is
+        dropped with DeadlineExceededError if it is still queued by then.
+        """
+        if not self._running:
+            raise RuntimeError("Inference scheduler is not running")
+        request = InferenceRequest(image=image, params=params, params_key=make_params_key(params), deadline=deadline,
+                                   background=background)
+        self._waiting([request], 1)
+        self._queue.put(request)
+        return request.future
+
+    def _waiting(self, requests: List[InferenceRequest], delta: int) -> None:
+        # Requests count as waiting until they join a batch, expire or are failed at shutdown
+        background = sum(request.background for request in requests)
+        with self._stats_lock:
+            self._background_depth += delta * background
+            self._foreground_depth += delta * (len(requests) - background)
+
+    def predict(self, image: np.ndarray, timeout: Optional[float] = None, **params) -> Any:
+        """Blocking helper for callers that only need their own result"""
+        return self.submit(image, **params).result(timeout)
+
+    def predict_many(self, images: List[np.ndarray], timeout: Optional[float] = None,
+                     deadline: Optional[float] = None, background: bool = False, **params) -> List[Any]:
+        """Submit several images at once, the scheduler is free to batch them together"""
+        futures = [self.submit(image, deadline=deadline, background=background, **params) for image in images]
+        if deadline is not None and timeout is None:
+            return [future.result(max(0.0, deadline - time.perf_counter())) for future in futures]
+        return [future.result(timeout) for future in futures]
+
+    def _next_request(self, timeout: Optional[float]) -> Optional[InferenceRequest]:
+        while True:
+            if self._carry_over:
+                request = self._carry_over.popleft()
+            else:
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    return None
+            if request.deadline is None or time.perf_counter() < request.deadline:
+                return request
+            # Nobody waits for this result any more, so it never reaches the model
+            self._expire(request)
+
+    def _expire(self, request: InferenceRequest) -> None:
+        self._waiting([request], -1)
+        with self._stats_lock:
+            self._total_expired += 1
+        METRICS.expired.inc(stage="queue")
+        request.future.set_exception(DeadlineExceededError("Request deadline passed while queued"))
+
+    def _collect_batch(self) -> List[InferenceRequest]:
+        # Only one thread collects at a time, the others run their batches meanwhile
+        with self._collect_lock:
+            return self._collect_batch_locked()
+
+    def _collect_batch_locked(self) -> List[InferenceRequest]:
+        first = self._next_request(timeout=self._POLL_INTERVAL)
+        if first is None:
+            return []
+
+        batch = [first]
+        skipped = []
+        deadline = time.perf_counter() + self.scheduler_config.max_wait_ms / 1000.0
+        while len(batch) < self.scheduler_config.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            request = self._next_request(timeout=remaining)
+            if request is None:
+                break
+            if request.params_key == first.params_key:
+                batch.append(request)
+            else:
+                skipped.append(request)
+
+        # Skipped requests still count as waiting, only the batch leaves the queue depth
+        self._waiting(batch, -1)
+        # Requests with other parameters open the following batches, in arrival order
+        self._carry_over.extendleft(reversed(skipped))
+        return batch
+
+    def _run(self) -> None:
+        while self._running or self._carry_over:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            self._run_batch(batch)
+
+        # Fail whatever is still queued so no caller waits forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._waiting([request], -1)
+            request.future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def _run_batch(self, batch: List[InferenceRequest]) -> None:
+        started_at = time.perf_counter()
+        try:
+            results = self.predict_fn([request.image for request in batch], **batch[0].params)
+            if len(results) != len(batch):
+                raise ValueError(f"Model returned {len(results)} results for a batch of {len(batch)}")
+        except Exception as e:
+            logging.error(f"Batched inference failed: {e}")
+            error = isdException(e, sys)
+            for request in batch:
+                request.future.set_exception(error)
+            self._record(batch, started_at, failed=True)
+            return
+
+        self._record(batch, started_at)
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+    def _record(self, batch: List[InferenceRequest], started_at: float, failed: bool = False) -> None:
+        finished_at = time.perf_counter()
+        with self._stats_lock:
+            self._total_requests += len(batch)
+            self._total_batches += 1
+            self._total_errors += int(failed)
+            self._batch_sizes[len(batch)] += 1
+            self._inference_ms.append((finished_at - started_at) * 1000.0)
+            self._queue_waits_ms.extend((started_at - request.enqueued_at) * 1000.0 for request in batch)
+        for request in batch:
+            METRICS.observe_stage("queue_wait", started_at - request.enqueued_at)
+        if self._listeners and not failed:
+            latencies = [finished_at - request.enqueued_at for request in batch]
+            for listener in self._listeners:
+                listener(batch[0].params, latencies)
+
+    @staticmethod
+    def _summary(values) -> Dict[str, float]:
+        if not values:
+            return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        array = np.fromiter(values, dtype=np.float64)
+        p50, p95, p99 = np.percentile(array, [50, 95, 99])
+        return {
+            "mean": round(float(array.mean()), 3),
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3),
+            "max": round(float(array.max()), 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size and queue-wait statistics to tune throughput against tail latency"""
+        with self._stats_lock:
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            queue_waits = list(self._queue_waits_ms)
+            inference = list(self._inference_ms)
+            total_requests = self._total_requests
+            total_batches = self._total_batches
+            total_errors = self._total_errors
+            total_shed = self._total_shed
+            total_expired = self._total_expired
+            foreground_depth = self._foreground_depth
+            background_depth = self._background_depth
+
+        return {
+            "max_batch_size": self.scheduler_config.max_batch_size,
+            "max_wait_ms": self.scheduler_config.max_wait_ms,
+            "concurrency": self.scheduler_config.concurrency,
+            "queue_depth": foreground_depth + background_depth,
+            "background_queue_depth": background_depth,
+            "max_queue_depth": self.scheduler_config.max_queue_depth,
+            "total_requests": total_requests,
+            "total_batches": total_batches,
+            "total_errors": total_errors,
+            "total_shed": total_shed,
+            "total_expired": total_expired,
+            "mean_batch_size": round(total_requests / total_batches, 3) if total_batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in batch_sizes.items()},
+            "queue_wait_ms": self._summary(queue_waits),
+            "batch_inference_ms": self._summary(inference),
+        }
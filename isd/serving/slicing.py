@@ -0,0 +1,141 @@
+"""
+Sliced (tiled) inference for high-resolution frames.
+
+A 4K frame shrunk to the model input size turns a hardhat into a few pixels.
+Sliced inference cuts the frame into overlapping tiles at the model's input
+size, runs all tiles of all frames as one batch, shifts the tile boxes back to
+frame coordinates and merges the duplicates in the overlaps with a batched,
+per-class NMS. A downscaled pass over the whole frame can be added so large
+objects that span several tiles are still found in one piece.
+"""
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional
+import numpy as np
+from isd.entity.config_entity import SlicingConfig
+from isd.serving.detections import results_from_boxes, _parse_bool
+from isd.serving.metrics import METRICS
+
+
+def tile_offsets(width: int, height: int, tile_size: int, overlap: float) -> np.ndarray:
+    """(K, 2) x, y of the top-left corners of overlapping tiles covering the frame"""
+    if not 0.0 <= overlap < 1.0:
+        raise ValueError(f"overlap must be in [0, 1), got {overlap}")
+    step = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length: int) -> np.ndarray:
+        if length <= tile_size:
+            return np.zeros(1, dtype=np.int64)
+        # The last tile is snapped to the edge instead of running past it
+        return np.unique(np.append(np.arange(0, length - tile_size, step), length - tile_size))
+
+    xs, ys = starts(width), starts(height)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+
+
+def shift_boxes(predictions: List[Any], shifts: np.ndarray) -> np.ndarray:
+    """(N, 6) boxes of several crop predictions in frame coordinates, each crop shifted by its own x, y offset"""
+    crop_boxes = [prediction.boxes.data.cpu().numpy() for prediction in predictions]
+    counts = np.array([len(boxes) for boxes in crop_boxes])
+    if not counts.sum():
+        return np.zeros((0, 6), dtype=np.float32)
+
+    boxes = np.concatenate(crop_boxes, axis=0).astype(np.float32, copy=True)
+    per_box = np.repeat(np.asarray(shifts, dtype=np.float32), counts, axis=0)
+    boxes[:, [0, 2]] += per_box[:, :1]
+    boxes[:, [1, 3]] += per_box[:, 1:]
+    return boxes
+
+
+def merge_boxes(boxes: np.ndarray, iou_threshold: float, max_det: Optional[int] = None) -> np.ndarray:
+    """Per-class NMS over (N, 6) xyxy, conf, cls boxes in one vectorized call"""
+    if len(boxes) == 0:
+        return boxes
+    import torch
+    import torchvision
+
+    tensor = torch.from_numpy(boxes)
+    keep = torchvision.ops.batched_nms(tensor[:, :4], tensor[:, 4], tensor[:, 5].long(), iou_threshold)
+    if max_det is not None:
+        keep = keep[:max_det]
+    return boxes[keep.numpy()]
+
+
+def parse_slicing_options(options: Mapping[str, Any]) -> Optional[SlicingConfig]:
+    """SlicingConfig from the slice, tile_size, overlap and full_frame request options, None when off"""
+    if not _parse_bool(options.get("slice", False)):
+        return None
+    config = SlicingConfig()
+    if options.get("tile_size") is not None:
+        config.tile_size = int(options["tile_size"])
+        if config.tile_size < 32:
+            raise ValueError(f"tile_size must be at least 32, got {config.tile_size}")
+    if options.get("overlap") is not None:
+        config.overlap = float(options["overlap"])
+        if not 0.0 <= config.overlap < 1.0:
+            raise ValueError(f"overlap must be in [0, 1), got {config.overlap}")
+    if options.get("full_frame") is not None:
+        config.full_frame = _parse_bool(options["full_frame"])
+    return config
+
+
+class SlicedInference:
+    def __init__(self, predict_many: Callable[..., List[Any]]):
+        """
+        predict_many takes a list of images plus predict() keyword arguments
+        and returns one prediction per image, e.g. InferenceScheduler.predict_many.
+        """
+        self.predict_many = predict_many
+
+    def predict(self, images: List[np.ndarray], slicing_config: SlicingConfig = SlicingConfig(),
+                **params) -> List[Any]:
+        """One merged prediction per frame, with the tile layout and per-tile timings in .tiling"""
+        crops, layout = [], []
+        for image in images:
+            height, width = image.shape[:2]
+            offsets = tile_offsets(width, height, slicing_config.tile_size, slicing_config.overlap)
+            start = len(crops)
+            # Tiles are views into the frame, nothing is copied until the model letterboxes them
+            crops.extend(image[y:y + slicing_config.tile_size, x:x + slicing_config.tile_size] for x, y in offsets)
+            if slicing_config.full_frame and len(offsets) > 1:
+                crops.append(image)
+            layout.append((start, offsets))
+
+        # Every tile of every frame goes to the model in one call, so they share batches
+        predictions = self.predict_many(crops, **params)
+
+        results = []
+        for image, (start, offsets) in zip(images, layout):
+            stop = start + len(offsets) + int(slicing_config.full_frame and len(offsets) > 1)
+            results.append(self._merge(image, offsets, predictions[start:stop], slicing_config, params))
+        return results
+
+    def _merge(self, image: np.ndarray, offsets: np.ndarray, predictions: List[Any],
+               slicing_config: SlicingConfig, params: Dict[str, Any]):
+        started_at = time.perf_counter()
+        # The full-frame pass has no offset
+        shifts = np.zeros((len(predictions), 2), dtype=np.float32)
+        shifts[:len(offsets)] = offsets
+        boxes = shift_boxes(predictions, shifts)
+
+        merged = merge_boxes(boxes, slicing_config.merge_iou, params.get("max_det"))
+        merge_seconds = time.perf_counter() - started_at
+        METRICS.observe_stage("tile_merge", merge_seconds)
+
+        names = predictions[0].names
+        result = results_from_boxes(image, np.ascontiguousarray(merged), names)
+        # Preprocess, inference and NMS time of every tile as measured inside its batch
+        tile_ms = [round(sum(value or 0.0 for value in (prediction.speed or {}).values()), 3)
+                   for prediction in predictions]
+        for milliseconds in tile_ms:
+            METRICS.observe_stage("tile", milliseconds / 1000.0)
+        result.tiling = {
+            "tiles": len(offsets),
+            "tile_size": slicing_config.tile_size,
+            "overlap": slicing_config.overlap,
+            "full_frame": len(predictions) > len(offsets),
+            "tile_ms": tile_ms,
+            "raw_detections": len(boxes),
+            "merge_ms": round(merge_seconds * 1000.0, 3),
+        }
+        return result
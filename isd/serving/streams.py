@@ -0,0 +1,431 @@
+"""
+Many live camera streams on one inference node.
+
+Every source (a camera URL, a device index or, for tests, a local video file
+played back at its own frame rate) is read by its own thread that only keeps
+the latest frame. A frame that is replaced before the model got to it counts
+as dropped, so a slow node falls behind in frame rate, never in time. One
+scheduling thread picks the streams that have a new frame and are due
+according to their target fps, in smooth weighted round-robin order, and
+sends their frames to the model as one cross-camera batch. Per stream it
+reports the achieved fps, the dropped frames and the end-to-end lag from
+reading a frame to having its detections.
+
+    python -m isd.serving.streams --source dock-3=data/videos/dock3.mp4 --source gate=0 --duration 60
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from isd.logger import logging
+from isd.utils.main_utils import read_yaml_file
+from isd.entity.config_entity import StreamManagerConfig
+from isd.serving.detections import results_from_boxes, detection_array
+from isd.serving.metrics import METRICS
+
+
+@dataclass
+class StreamSource:
+    stream_id: str
+    source: str
+    weight: float = 1.0
+    target_fps: float = StreamManagerConfig.default_target_fps
+    conf: float = StreamManagerConfig.default_conf
+    track: bool = False
+    # Video files only: start over at the end instead of stopping
+    loop: bool = False
+
+
+def load_streams(stream_manager_config: StreamManagerConfig = StreamManagerConfig()) -> List[StreamSource]:
+    """Streams listed under streams: in the stream config file, none when it does not exist"""
+    file_path = stream_manager_config.config_file_path
+    if not os.path.exists(file_path):
+        return []
+
+    content = read_yaml_file(file_path) or {}
+    streams = []
+    for stream_id, stream in (content.get("streams") or {}).items():
+        if not isinstance(stream, dict) or stream.get("source") is None:
+            raise ValueError(f"Stream {stream_id!r} in {file_path} needs a source")
+        streams.append(StreamSource(
+            str(stream_id),
+            str(stream["source"]),
+            float(stream.get("weight", 1.0)),
+            float(stream.get("target_fps", stream_manager_config.default_target_fps)),
+            float(stream.get("conf", stream_manager_config.default_conf)),
+            bool(stream.get("track", False)),
+            bool(stream.get("loop", False)),
+        ))
+    for stream in streams:
+        if stream.weight <= 0 or stream.target_fps <= 0:
+            raise ValueError(f"Stream {stream.stream_id!r} needs a positive weight and target_fps")
+    logging.info(f"Loaded {len(streams)} camera streams from {file_path}")
+    return streams
+
+
+class LatestFrameReader:
+    def __init__(self, stream: StreamSource, reconnect_interval: float, on_frame: Callable[[], None]):
+        """
+        Reads one source in a background thread and keeps only its latest
+        frame. Video files are played back at their own frame rate, like a
+        camera would deliver them.
+        """
+        self.stream = stream
+        self.reconnect_interval = reconnect_interval
+        self.on_frame = on_frame
+        self.is_file = os.path.isfile(stream.source)
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Latest frame, its sequence number, and when it was read (monotonic and wall clock)
+        self._frame: Optional[np.ndarray] = None
+        self._sequence = 0
+        self._captured_at = 0.0
+        self._captured_time = 0.0
+        self._taken_sequence = 0
+
+        self.status = "starting"
+        self.source_fps = 0.0
+        self.frames_read = 0
+        self.dropped = 0
+
+    def start(self) -> "LatestFrameReader":
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.stream.stream_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _open(self) -> cv2.VideoCapture:
+        source = self.stream.source
+        # Device indices such as 0 open a local camera, anything else is a path or URL
+        return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            capture = self._open()
+            if not capture.isOpened():
+                self.status = "unavailable"
+                logging.warning(f"Stream {self.stream.stream_id}: could not open {self.stream.source}")
+                capture.release()
+                if self._stopped.wait(self.reconnect_interval):
+                    break
+                continue
+
+            self.status = "running"
+            self.source_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+            started_at, index = time.monotonic(), 0
+            try:
+                while not self._stopped.is_set():
+                    if self.is_file and self.source_fps > 0:
+                        # Play files back in real time, a live camera paces itself
+                        delay = started_at + index / self.source_fps - time.monotonic()
+                        if delay > 0 and self._stopped.wait(delay):
+                            break
+                    success, frame = capture.read()
+                    if not success:
+                        break
+                    index += 1
+                    self._publish(frame)
+            finally:
+                capture.release()
+
+            if self._stopped.is_set():
+                break
+            if self.is_file and not self.stream.loop:
+                self.status = "ended"
+                return
+            if not self.is_file:
+                self.status = "reconnecting"
+                logging.warning(f"Stream {self.stream.stream_id}: {self.stream.source} stopped, reconnecting")
+                if self._stopped.wait(self.reconnect_interval):
+                    break
+        self.status = "stopped"
+
+    def _publish(self, frame: np.ndarray) -> None:
+        with self._lock:
+            if self._frame is not None and self._sequence > self._taken_sequence:
+                # The previous frame was never inferred
+                self.dropped += 1
+                METRICS.stream_frames.inc(stream_id=self.stream.stream_id, result="dropped")
+            self._frame = frame
+            self._sequence += 1
+            self._captured_at = time.monotonic()
+            self._captured_time = time.time()
+            self.frames_read += 1
+        self.on_frame()
+
+    def has_new_frame(self) -> bool:
+        with self._lock:
+            return self._sequence > self._taken_sequence
+
+    def take(self) -> Optional[Tuple[np.ndarray, int, float, float]]:
+        """Latest frame not taken yet with its sequence number and read times, None when there is none"""
+        with self._lock:
+            if self._sequence <= self._taken_sequence:
+                return None
+            self._taken_sequence = self._sequence
+            return self._frame, self._sequence, self._captured_at, self._captured_time
+
+
+class _StreamState:
+    def __init__(self, stream: StreamSource, reader: LatestFrameReader, tracker, stats_window: int):
+        self.stream = stream
+        self.reader = reader
+        self.tracker = tracker
+        # Smooth weighted round-robin credit and the time the next frame is due
+        self.credit = 0.0
+        self.next_due = 0.0
+        self.inferred = 0
+        self.errors = 0
+        self.lags = deque(maxlen=stats_window)
+        self.completed_at = deque(maxlen=stats_window)
+
+
+class StreamManager:
+    # Window over which the achieved fps is measured
+    _FPS_WINDOW = 10.0
+
+    def __init__(self, predict_many: Callable[..., List[Any]], streams: List[StreamSource],
+                 stream_manager_config: StreamManagerConfig = StreamManagerConfig(),
+                 ready: Optional[Callable[[], bool]] = None,
+                 params: Optional[Callable[[], Dict[str, Any]]] = None,
+                 tracker_factory: Optional[Callable[[StreamSource], Any]] = None,
+                 on_result: Optional[Callable[..., None]] = None):
+        """
+        predict_many takes a list of frames plus predict() keyword arguments
+        and returns one prediction per frame, e.g. InferenceScheduler.predict_many.
+        ready tells whether the model can be used yet, params returns extra
+        predict() arguments per batch, tracker_factory builds the StreamTracker
+        of streams with track set, and on_result(stream, sequence, lag_seconds,
+        prediction) is called with every result.
+        """
+        if len({stream.stream_id for stream in streams}) != len(streams):
+            raise ValueError("Stream ids must be unique")
+        self.predict_many = predict_many
+        self.stream_manager_config = stream_manager_config
+        self.ready = ready or (lambda: True)
+        self.params = params or dict
+        self.on_result = on_result
+
+        self._wakeup = threading.Condition()
+        self._states = []
+        for stream in streams:
+            reader = LatestFrameReader(stream, stream_manager_config.reconnect_interval, self._notify)
+            tracker = tracker_factory(stream) if stream.track and tracker_factory is not None else None
+            self._states.append(_StreamState(stream, reader, tracker, stream_manager_config.stats_window))
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = time.monotonic()
+        self._batches = 0
+        self._batched_frames = 0
+
+    def start(self) -> "StreamManager":
+        self._running = True
+        self._started_at = time.monotonic()
+        for state in self._states:
+            state.reader.start()
+        self._thread = threading.Thread(target=self._run, name="stream-manager", daemon=True)
+        self._thread.start()
+        logging.info(f"Stream manager started with {len(self._states)} streams")
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self._notify()
+        for state in self._states:
+            state.reader.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        for state in self._states:
+            if state.tracker is not None:
+                state.tracker.finish()
+
+    def _notify(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _run(self) -> None:
+        while self._running:
+            if not self.ready():
+                time.sleep(0.5)
+                continue
+            now = time.monotonic()
+            waiting = [state for state in self._states if state.reader.has_new_frame()]
+            eligible = [state for state in waiting if state.next_due <= now]
+            if not eligible:
+                # Sleep until the next stream with a frame is due, or until a reader publishes one
+                timeout = min([state.next_due - now for state in waiting] + [0.1])
+                with self._wakeup:
+                    self._wakeup.wait(max(timeout, 0.001))
+                continue
+            self._infer(self._pick(eligible, self.stream_manager_config.max_batch_size), now)
+
+    @staticmethod
+    def _pick(eligible: List[_StreamState], count: int) -> List[_StreamState]:
+        """
+        Smooth weighted round-robin: every round each candidate earns its
+        weight, the richest is picked and pays the total. Credits carry over
+        between batches, so under overload every stream gets its share of the
+        batches in proportion to its weight, interleaved rather than in bursts.
+        """
+        candidates, picked = list(eligible), []
+        while candidates and len(picked) < count:
+            total = sum(state.stream.weight for state in candidates)
+            for state in candidates:
+                state.credit += state.stream.weight
+            best = max(candidates, key=lambda state: state.credit)
+            best.credit -= total
+            candidates.remove(best)
+            picked.append(best)
+        return picked
+
+    def _infer(self, picked: List[_StreamState], now: float) -> None:
+        taken = []
+        for state in picked:
+            frame = state.reader.take()
+            if frame is not None:
+                taken.append((state, frame))
+                # The next frame is due one interval later, a stream that fell behind is due right away
+                state.next_due = max(state.next_due + 1.0 / state.stream.target_fps, now)
+        if not taken:
+            return
+
+        # One call for the frames of every picked camera, so they share a batch in the model
+        params = dict(self.params())
+        params["conf"] = min(state.stream.conf for state, _ in taken)
+        try:
+            predictions = self.predict_many([frame for _, (frame, _, _, _) in taken], **params)
+        except Exception as e:
+            logging.warning(f"Stream batch of {len(taken)} frames failed: {e}")
+            for state, _ in taken:
+                state.errors += 1
+            time.sleep(0.1)
+            return
+        self._batches += 1
+        self._batched_frames += len(taken)
+
+        for (state, (frame, sequence, captured_at, captured_time)), prediction in zip(taken, predictions):
+            if state.stream.conf > params["conf"]:
+                # The batch ran at the lowest threshold of its streams, the others get their own back
+                boxes = detection_array(prediction)
+                prediction = results_from_boxes(frame, np.ascontiguousarray(boxes[boxes[:, 4] >= state.stream.conf]),
+                                                prediction.names, prediction.speed)
+            if state.tracker is not None:
+                prediction = state.tracker.track(frame, round(captured_time, 3), prediction)
+            done_at = time.monotonic()
+            lag = done_at - captured_at
+            state.inferred += 1
+            state.lags.append(lag)
+            state.completed_at.append(done_at)
+            METRICS.stream_frames.inc(stream_id=state.stream.stream_id, result="inferred")
+            METRICS.stream_lag.observe(lag, stream_id=state.stream.stream_id)
+            if self.on_result is not None:
+                self.on_result(state.stream, sequence, lag, prediction)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        window = min(self._FPS_WINDOW, max(now - self._started_at, 1e-9))
+        streams = []
+        for state in self._states:
+            reader = state.reader
+            lags = np.array(list(state.lags)) * 1000.0 if state.lags else None
+            completed = [done_at for done_at in list(state.completed_at) if done_at >= now - window]
+            streams.append({
+                "stream_id": state.stream.stream_id,
+                "source": state.stream.source,
+                "status": reader.status,
+                "weight": state.stream.weight,
+                "target_fps": state.stream.target_fps,
+                "achieved_fps": round(len(completed) / window, 2),
+                "source_fps": round(reader.source_fps, 2),
+                "frames_read": reader.frames_read,
+                "inferred": state.inferred,
+                "dropped": reader.dropped,
+                "drop_rate": round(reader.dropped / reader.frames_read, 4) if reader.frames_read else 0.0,
+                "errors": state.errors,
+                "lag_ms": None if lags is None else {
+                    "p50": round(float(np.percentile(lags, 50)), 1),
+                    "p95": round(float(np.percentile(lags, 95)), 1),
+                    "max": round(float(lags.max()), 1),
+                },
+                "tracking": state.tracker is not None,
+            })
+        return {
+            "streams": streams,
+            "batches": self._batches,
+            "mean_batch_size": round(self._batched_frames / self._batches, 2) if self._batches else 0.0,
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run safety detection over several camera streams at once")
+    parser.add_argument("--config", default=StreamManagerConfig.config_file_path, help="stream config file")
+    parser.add_argument("--source", action="append", default=[],
+                        help="stream_id=path, URL or device index, instead of the config file (repeatable)")
+    parser.add_argument("--fps", type=float, default=StreamManagerConfig.default_target_fps,
+                        help="target fps of the --source streams")
+    parser.add_argument("--model", default="model/best.pt", help="model weights to load")
+    parser.add_argument("--batch-size", type=int, default=StreamManagerConfig.max_batch_size)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--track", action="store_true", help="track workers and emit violation events")
+    parser.add_argument("--output", default=None, help="NDJSON file with the detections of every inferred frame")
+    args = parser.parse_args(argv)
+
+    config = StreamManagerConfig(config_file_path=args.config, max_batch_size=args.batch_size)
+    if args.source:
+        streams = []
+        for item in args.source:
+            stream_id, _, source = item.partition("=")
+            if not source:
+                parser.error(f"--source must look like stream_id=source, got {item!r}")
+            streams.append(StreamSource(stream_id, source, target_fps=args.fps, track=args.track, loop=True))
+    else:
+        streams = load_streams(config)
+    if not streams:
+        parser.error(f"No streams given and none found in {args.config}")
+
+    from ultralytics import YOLO
+    from isd.serving.compliance import ComplianceEngine
+    from isd.serving.detections import to_detections
+    from isd.serving.tracking import StreamTracker
+
+    model = YOLO(args.model)
+    compliance_engine = ComplianceEngine()
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+
+    def write_result(stream, sequence, lag, prediction):
+        if output is not None:
+            line = {"stream_id": stream.stream_id, "sequence": sequence, "lag_ms": round(lag * 1000.0, 1),
+                    "detections": to_detections(prediction), "events": getattr(prediction, "events", None)}
+            output.write(json.dumps(line) + "\n")
+
+    manager = StreamManager(
+        lambda frames, **params: model.predict(source=frames, verbose=False, **params),
+        streams, config,
+        tracker_factory=lambda stream: StreamTracker(compliance_engine, source=stream.stream_id),
+        on_result=write_result,
+    ).start()
+    try:
+        time.sleep(args.duration)
+    finally:
+        manager.stop()
+        if output is not None:
+            output.close()
+    print(json.dumps(manager.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Multi-object tracking of workers and their PPE across video frames.
+
+Detections are linked from frame to frame ByteTrack-style: a constant-velocity
+Kalman filter predicts where every track moved, confident detections are
+matched to the predictions by IoU first, and the low-confidence detections
+left over (a worker half hidden behind a machine) are then used to keep the
+unmatched tracks alive. Every track keeps a stable id for as long as it is
+seen. On top of the tracks, violations become events: one event per track
+and missing PPE item when the violation starts, and one when it ends, with
+the start and end time of the whole episode, instead of an alert per frame.
+
+The model can also run only on every n-th frame. The frames in between get
+the Kalman predictions of the tracks, which costs microseconds instead of a
+forward pass.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from isd.entity.config_entity import TrackingConfig
+from isd.serving.compliance import ComplianceEngine, PPE_WORN
+from isd.serving.detections import results_from_boxes, detection_array
+from isd.serving.metrics import METRICS
+
+
+def xyxy_to_xyah(boxes: np.ndarray) -> np.ndarray:
+    """(N, 4) xyxy boxes as center x, center y, aspect ratio and height"""
+    width = boxes[:, 2] - boxes[:, 0]
+    height = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-6)
+    return np.stack([boxes[:, 0] + width / 2, boxes[:, 1] + height / 2, width / height, height], axis=1)
+
+
+def xyah_to_xyxy(states: np.ndarray) -> np.ndarray:
+    """(N, 4) center x, center y, aspect ratio, height states as xyxy boxes"""
+    width = states[:, 2] * states[:, 3]
+    half = np.stack([width, states[:, 3]], axis=1) / 2
+    return np.hstack([states[:, :2] - half, states[:, :2] + half])
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """(A, B) IoU of every pair of xyxy boxes"""
+    width = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2]) - np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    height = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3]) - np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    intersection = np.maximum(width, 0) * np.maximum(height, 0)
+    area_a = ((boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1]))[:, None]
+    area_b = ((boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1]))[None, :]
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+def match(iou: np.ndarray, min_iou: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Optimal one-to-one assignment maximising the total IoU. Returns the (M, 2)
+    matched row/column pairs and the unmatched rows and columns.
+    """
+    rows, columns = np.arange(iou.shape[0]), np.arange(iou.shape[1])
+    if not iou.size:
+        return np.zeros((0, 2), dtype=np.int64), rows, columns
+    matched_rows, matched_columns = linear_sum_assignment(iou, maximize=True)
+    keep = iou[matched_rows, matched_columns] >= min_iou
+    pairs = np.stack([matched_rows[keep], matched_columns[keep]], axis=1)
+    return pairs, np.setdiff1d(rows, pairs[:, 0]), np.setdiff1d(columns, pairs[:, 1])
+
+
+class KalmanFilter:
+    """
+    Constant-velocity Kalman filter over (cx, cy, aspect, height) box states,
+    vectorized over all tracks. Noise scales with the box height as in
+    ByteTrack, so near and far workers move by comparable relative amounts.
+    """
+    std_position = 1.0 / 20
+    std_velocity = 1.0 / 160
+
+    def __init__(self):
+        # One step per processed frame: position += velocity
+        self.motion = np.eye(8)
+        self.motion[:4, 4:] = np.eye(4)
+
+    def initiate(self, measurements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        mean = np.hstack([measurements, np.zeros_like(measurements)])
+        height = measurements[:, 3]
+        std = np.stack([2 * self.std_position * height, 2 * self.std_position * height,
+                        np.full_like(height, 1e-2), 2 * self.std_position * height,
+                        10 * self.std_velocity * height, 10 * self.std_velocity * height,
+                        np.full_like(height, 1e-5), 10 * self.std_velocity * height], axis=1)
+        return mean, self._diagonal(std ** 2)
+
+    def predict(self, mean: np.ndarray, covariance: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        height = mean[:, 3]
+        std = np.stack([self.std_position * height, self.std_position * height,
+                        np.full_like(height, 1e-2), self.std_position * height,
+                        self.std_velocity * height, self.std_velocity * height,
+                        np.full_like(height, 1e-5), self.std_velocity * height], axis=1)
+        mean = mean @ self.motion.T
+        covariance = self.motion @ covariance @ self.motion.T + self._diagonal(std ** 2)
+        return mean, covariance
+
+    def update(self, mean: np.ndarray, covariance: np.ndarray,
+               measurements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        height = mean[:, 3]
+        std = np.stack([self.std_position * height, self.std_position * height,
+                        np.full_like(height, 1e-1), self.std_position * height], axis=1)
+        projected = covariance[:, :4, :4] + self._diagonal(std ** 2)
+        # Kalman gain P H^T S^-1, solved instead of inverting S
+        gain = np.linalg.solve(projected, covariance[:, :4, :]).transpose(0, 2, 1)
+        innovation = measurements - mean[:, :4]
+        mean = mean + (gain @ innovation[:, :, None])[:, :, 0]
+        covariance = covariance - gain @ projected @ gain.transpose(0, 2, 1)
+        return mean, covariance
+
+    @staticmethod
+    def _diagonal(values: np.ndarray) -> np.ndarray:
+        matrices = np.zeros(values.shape + (values.shape[1],))
+        index = np.arange(values.shape[1])
+        matrices[:, index, index] = values
+        return matrices
+
+
+class ByteTracker:
+    def __init__(self, tracking_config: TrackingConfig = TrackingConfig()):
+        """
+        Tracks of one stream. Their state is kept as parallel arrays, so the
+        Kalman steps and the IoU matching run over all tracks at once.
+        """
+        self.tracking_config = tracking_config
+        self.kalman_filter = KalmanFilter()
+        self.frame_count = 0
+        self._next_id = 1
+        self.removed: List[int] = []
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros((0, 8))
+        self.covariance = np.zeros((0, 8, 8))
+        self.classes = np.zeros(0)
+        self.confidences = np.zeros(0)
+        self.hits = np.zeros(0, dtype=np.int64)
+        # Detection frames since the track was last matched, 0 while it is being seen
+        self.missed = np.zeros(0, dtype=np.int64)
+
+    def update(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        Match the (N, 6) xyxy, conf, cls detections of a frame to the tracks.
+        Returns the (M, 7) xyxy, id, conf, cls boxes of the confirmed tracks
+        seen in this frame. The ids of the tracks dropped by this call are left
+        in .removed.
+        """
+        config = self.tracking_config
+        self.frame_count += 1
+        self.removed = []
+        self._predict()
+        boxes = boxes[boxes[:, 4] >= config.low_threshold]
+        high = np.flatnonzero(boxes[:, 4] >= config.high_threshold)
+        low = np.flatnonzero(boxes[:, 4] < config.high_threshold)
+
+        # First association: every track, lost ones included, against the confident detections
+        track_boxes = xyah_to_xyxy(self.mean[:, :4])
+        pairs, unmatched_tracks, unmatched_high = match(self._iou(track_boxes, self.classes, boxes[high]),
+                                                        config.match_iou)
+        matched_tracks, matched_rows = [pairs[:, 0]], [high[pairs[:, 1]]]
+
+        # Second association: tracks seen in the last frame that found no confident detection, against the
+        # low-confidence ones, so occluded workers keep their id
+        recent = unmatched_tracks[self.missed[unmatched_tracks] == 0]
+        low_pairs, _, _ = match(self._iou(track_boxes[recent], self.classes[recent], boxes[low]),
+                                config.low_match_iou)
+        matched_tracks.append(recent[low_pairs[:, 0]])
+        matched_rows.append(low[low_pairs[:, 1]])
+        matched_tracks, matched_rows = np.concatenate(matched_tracks), np.concatenate(matched_rows)
+
+        if len(matched_tracks):
+            self.mean[matched_tracks], self.covariance[matched_tracks] = self.kalman_filter.update(
+                self.mean[matched_tracks], self.covariance[matched_tracks], xyxy_to_xyah(boxes[matched_rows, :4]))
+            self.confidences[matched_tracks] = boxes[matched_rows, 4]
+        seen = np.zeros(len(self.ids), dtype=bool)
+        seen[matched_tracks] = True
+        self.hits[seen] += 1
+        self.missed[seen] = 0
+        self.missed[~seen] += 1
+
+        # Tentative tracks that miss a frame are dropped at once, confirmed ones after the track buffer
+        confirmed = self.hits >= config.min_hits
+        keep = (self.missed == 0) | (confirmed & (self.missed <= config.track_buffer))
+        self.removed = self.ids[~keep].tolist()
+        row_of_track = np.full(len(self.ids), -1)
+        row_of_track[matched_tracks] = matched_rows
+        self._select(keep)
+        row_of_track = row_of_track[keep]
+
+        # Confident detections that matched nothing start new tracks
+        new_rows = high[unmatched_high]
+        new_rows = new_rows[boxes[new_rows, 4] >= config.new_track_threshold]
+        if len(new_rows):
+            self._start(boxes[new_rows])
+            row_of_track = np.concatenate([row_of_track, new_rows])
+
+        # Confirmed tracks report the detection they matched; on the first frame every new track counts
+        output = (self.missed == 0) & ((self.hits >= config.min_hits) | (self.frame_count == 1))
+        rows = row_of_track[output]
+        METRICS.tracking_frames.inc(mode="detected")
+        return np.hstack([boxes[rows, :4], self.ids[output, None], boxes[rows, 4:6]]).astype(np.float32)
+
+    def propagate(self) -> np.ndarray:
+        """(M, 7) xyxy, id, conf, cls boxes of the tracks seen at the last detection, moved by one Kalman step"""
+        self.removed = []
+        self._predict()
+        output = (self.missed == 0) & ((self.hits >= self.tracking_config.min_hits) | (self.frame_count == 1))
+        METRICS.tracking_frames.inc(mode="propagated")
+        return np.hstack([xyah_to_xyxy(self.mean[output, :4]), self.ids[output, None],
+                          self.confidences[output, None], self.classes[output, None]]).astype(np.float32)
+
+    def active_ids(self) -> List[int]:
+        return self.ids[self.hits >= self.tracking_config.min_hits].tolist()
+
+    def _predict(self) -> None:
+        if len(self.ids):
+            self.mean, self.covariance = self.kalman_filter.predict(self.mean, self.covariance)
+
+    @staticmethod
+    def _iou(track_boxes: np.ndarray, track_classes: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        iou = iou_matrix(track_boxes, boxes[:, :4])
+        # A track never switches class, a hardhat cannot continue a person track
+        iou[track_classes[:, None] != boxes[None, :, 5]] = 0.0
+        return iou
+
+    def _select(self, keep: np.ndarray) -> None:
+        for name in ("ids", "mean", "covariance", "classes", "confidences", "hits", "missed"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def _start(self, boxes: np.ndarray) -> None:
+        mean, covariance = self.kalman_filter.initiate(xyxy_to_xyah(boxes[:, :4]))
+        ids = np.arange(self._next_id, self._next_id + len(boxes))
+        self._next_id += len(boxes)
+        self.ids = np.concatenate([self.ids, ids])
+        self.mean = np.concatenate([self.mean, mean])
+        self.covariance = np.concatenate([self.covariance, covariance])
+        self.classes = np.concatenate([self.classes, boxes[:, 5]])
+        self.confidences = np.concatenate([self.confidences, boxes[:, 4]])
+        self.hits = np.concatenate([self.hits, np.ones(len(boxes), dtype=np.int64)])
+        self.missed = np.concatenate([self.missed, np.zeros(len(boxes), dtype=np.int64)])
+
+
+class ViolationEvents:
+    def __init__(self, items: List[str], tracking_config: TrackingConfig = TrackingConfig()):
+        """
+        Turns per-frame violations of tracked persons into start and end
+        events. A violation starts once it was seen on violation_min_frames
+        detection frames and ends after as many frames with the item worn, or
+        when the track is lost.
+        """
+        self.items = items
+        self.tracking_config = tracking_config
+        # (track id, item) -> open episode
+        self.episodes: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._next_event_id = 1
+
+    def update(self, track_ids: List[int], violating: np.ndarray, worn: np.ndarray,
+               boxes: List[List[float]], timestamp: float) -> List[Dict[str, Any]]:
+        """Events of one detection frame from the (P, C) violation and worn masks of its tracked persons"""
+        min_frames = self.tracking_config.violation_min_frames
+        events = []
+        # Only persons with a violation or an open episode need a look
+        open_tracks = {track_id for track_id, _ in self.episodes}
+        for track_id, person_violating, person_worn, box in zip(track_ids, violating.tolist(), worn.tolist(), boxes):
+            if track_id not in open_tracks and not any(person_violating):
+                continue
+            for item, is_violating, is_worn in zip(self.items, person_violating, person_worn):
+                key = (track_id, item)
+                episode = self.episodes.get(key)
+                if is_violating:
+                    if episode is None:
+                        episode = self.episodes[key] = {"start": timestamp, "frames": 0, "clean": 0}
+                    episode.update(end=timestamp, frames=episode["frames"] + 1, clean=0, box=box)
+                    if episode["frames"] == min_frames:
+                        episode["event_id"] = self._next_event_id
+                        self._next_event_id += 1
+                        events.append(self._event("violation_started", key, episode))
+                elif is_worn and episode is not None:
+                    episode["clean"] += 1
+                    if episode["clean"] >= min_frames:
+                        events.extend(self._close(key))
+        return events
+
+    def close_tracks(self, track_ids: List[int]) -> List[Dict[str, Any]]:
+        """End the open violations of lost tracks, at the last time they were seen"""
+        lost = set(track_ids)
+        events = []
+        for key in [key for key in self.episodes if key[0] in lost]:
+            events.extend(self._close(key))
+        return events
+
+    def close_all(self) -> List[Dict[str, Any]]:
+        return self.close_tracks([track_id for track_id, _ in self.episodes])
+
+    def _close(self, key: Tuple[int, str]) -> List[Dict[str, Any]]:
+        episode = self.episodes.pop(key)
+        # Violations seen on fewer frames than needed to start were noise, they never raised an event
+        if "event_id" not in episode:
+            return []
+        return [self._event("violation_ended", key, episode)]
+
+    def _event(self, event_type: str, key: Tuple[int, str], episode: Dict[str, Any]) -> Dict[str, Any]:
+        METRICS.violation_events.inc(type=event_type)
+        return {
+            "event_id": episode["event_id"],
+            "type": event_type,
+            "track_id": key[0],
+            "violation": key[1],
+            "start": episode["start"],
+            "end": episode["end"] if event_type == "violation_ended" else None,
+            "frames": episode["frames"],
+            "box": episode["box"],
+        }
+
+
+class StreamTracker:
+    def __init__(self, compliance_engine: ComplianceEngine,
+                 tracking_config: TrackingConfig = TrackingConfig(), event_sink=None, source: str = None):
+        """
+        Tracker and violation events of one video or camera stream, fed its
+        frames in order. With an event sink, the events are also queued there,
+        tagged with the source of the stream.
+        """
+        self.compliance_engine = compliance_engine
+        self.tracking_config = tracking_config
+        self.event_sink = event_sink
+        self.source = source
+        self.tracker = ByteTracker(tracking_config)
+        self.events = ViolationEvents(compliance_engine.items, tracking_config)
+
+    def track(self, frame: np.ndarray, timestamp: float, prediction: Optional[Any] = None, names=None):
+        """
+        Tracked prediction of one frame, with its violation events in .events.
+        Without a prediction the model was skipped for this frame and the
+        tracks are propagated instead; names then gives the class names.
+        """
+        if prediction is None:
+            result = results_from_boxes(frame, self.tracker.propagate(), names)
+            result.events = []
+            return result
+
+        tracked = self.tracker.update(detection_array(prediction))
+        result = results_from_boxes(frame, tracked, prediction.names, prediction.speed)
+        for extra in ("tiling", "roi"):
+            if getattr(prediction, extra, None) is not None:
+                setattr(result, extra, getattr(prediction, extra))
+
+        person_rows, status = self.compliance_engine.assign(tracked[:, [0, 1, 2, 3, 5, 6]], prediction.names)
+        events = self.events.update(
+            tracked[person_rows, 4].astype(np.int64).tolist(),
+            self.compliance_engine.violations(status),
+            status == PPE_WORN,
+            np.round(tracked[person_rows, :4].astype(np.float64), 2).tolist(),
+            timestamp,
+        )
+        result.events = self._emit(events + self.events.close_tracks(self.tracker.removed))
+        return result
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """End events of every violation still open when the stream stops"""
+        return self._emit(self.events.close_all())
+
+    def _emit(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.event_sink is not None and events:
+            created_at = round(time.time(), 3)
+            self.event_sink.emit([{**event, "created_at": created_at, "source": self.source} for event in events])
+        return events
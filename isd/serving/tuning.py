@@ -0,0 +1,309 @@
+"""
+CPU execution profile auto-tuner.
+
+The best torch intra-op and inter-op thread counts, batch size, image size
+and number of model worker processes differ on every CPU. The tuner loads
+model/best.pt and measures them on sample or synthetic frames. Inter-op
+threads can only be set once per process, so every thread setting is timed in
+a fresh process. It first sweeps the thread counts in a single process over
+all batch and image sizes. It then tries several worker processes side by
+side, each with its share of the cores, timed together. The winner is the
+largest image size whose p95 batch latency meets the target, and among those
+the highest throughput. It is written to model/cpu_profile.json, and
+ClientApp applies it at startup to every setting the environment leaves
+unset.
+
+    python -m isd.serving.tuning --images data/samples --imgsz 640 512 416 --latency-target-ms 400
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import multiprocessing as mp
+from typing import Any, Dict, List
+import numpy as np
+from isd.logger import logging
+from isd.entity.config_entity import (CpuProfileConfig, InferenceWorkerPoolConfig, InferenceSchedulerConfig,
+                                      AdaptiveResolutionConfig)
+from isd.constant.application import PREDICTION_IMAGE_SIZE
+
+
+# Profile setting -> environment variable that overrides it
+PROFILE_ENVIRONMENT = {
+    "workers": "INFERENCE_WORKERS",
+    "intra_op_threads": "INFERENCE_WORKER_THREADS",
+    "inter_op_threads": "INFERENCE_WORKER_INTEROP_THREADS",
+    "batch_size": "INFERENCE_SCHEDULER_MAX_BATCH_SIZE",
+    "image_size": "PREDICTION_IMAGE_SIZE",
+}
+
+
+def _powers_of_two(limit: int) -> List[int]:
+    """1, 2, 4, ... up to limit, plus limit itself"""
+    values = [1 << exponent for exponent in range(limit.bit_length()) if 1 << exponent <= limit]
+    return sorted(set(values + [limit]))
+
+
+def _measure(model_path: str, intra_op_threads: int, inter_op_threads: int, batch_sizes: List[int],
+             image_sizes: List[int], images: Dict[str, Any], runs: int, warmup_runs: int, barrier, connection) -> None:
+    """Entry point of a measuring process: time every batch and image size with one thread setting"""
+    try:
+        import torch
+
+        torch.set_num_threads(intra_op_threads)
+        torch.set_num_interop_threads(inter_op_threads)
+        from ultralytics import YOLO
+        from isd.serving.benchmark import load_images
+
+        model = YOLO(model_path, task="detect")
+        frames = load_images(images["dir"], images["count"], images["width"], images["height"])
+
+        rows = []
+        for image_size, batch_size in itertools.product(image_sizes, batch_sizes):
+            batch = [frames[index % len(frames)] for index in range(batch_size)]
+            for _ in range(warmup_runs):
+                model.predict(source=batch, imgsz=image_size, verbose=False)
+            # Processes running side by side time the same setting at the same moment
+            if barrier is not None:
+                barrier.wait()
+            latencies = []
+            started_at = time.perf_counter()
+            for _ in range(runs):
+                batch_started_at = time.perf_counter()
+                model.predict(source=batch, imgsz=image_size, verbose=False)
+                latencies.append((time.perf_counter() - batch_started_at) * 1000.0)
+            rows.append({"image_size": image_size, "batch_size": batch_size,
+                         "seconds": time.perf_counter() - started_at, "latencies_ms": latencies})
+        connection.send(("ok", rows))
+    except Exception as e:
+        connection.send(("error", str(e)))
+
+
+def measure(model_path: str, workers: int, intra_op_threads: int, inter_op_threads: int,
+            batch_sizes: List[int], image_sizes: List[int], images: Dict[str, Any],
+            runs: int, warmup_runs: int) -> List[Dict[str, Any]]:
+    """
+    Throughput and batch latency of every batch and image size, with the
+    given number of worker processes running at once.
+    """
+    context = mp.get_context("spawn")
+    barrier = context.Barrier(workers) if workers > 1 else None
+    processes, connections = [], []
+    for _ in range(workers):
+        connection, child_connection = context.Pipe()
+        process = context.Process(target=_measure, daemon=True, args=(
+            model_path, intra_op_threads, inter_op_threads, batch_sizes, image_sizes, images, runs, warmup_runs,
+            barrier, child_connection))
+        process.start()
+        child_connection.close()
+        processes.append(process)
+        connections.append(connection)
+
+    results = []
+    try:
+        for connection in connections:
+            status, payload = connection.recv()
+            if status != "ok":
+                raise RuntimeError(f"Measuring process failed: {payload}")
+            results.append(payload)
+    finally:
+        if barrier is not None:
+            # A failed process would leave the others waiting at the barrier forever
+            barrier.abort()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+    rows = []
+    for per_setting in zip(*results):
+        latencies = np.concatenate([row["latencies_ms"] for row in per_setting])
+        image_size, batch_size = per_setting[0]["image_size"], per_setting[0]["batch_size"]
+        rows.append({
+            "workers": workers,
+            "intra_op_threads": intra_op_threads,
+            "inter_op_threads": inter_op_threads,
+            "batch_size": batch_size,
+            "image_size": image_size,
+            "throughput_fps": round(sum(batch_size * runs / row["seconds"] for row in per_setting), 2),
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+            },
+        })
+    return rows
+
+
+def select_best(rows: List[Dict[str, Any]], latency_target_ms: float) -> Dict[str, Any]:
+    """
+    Largest image size whose p95 batch latency meets the target, then the
+    highest throughput. The fastest p95 when nothing meets the target.
+    """
+    feasible = [row for row in rows if row["latency_ms"]["p95"] <= latency_target_ms]
+    if not feasible:
+        return min(rows, key=lambda row: row["latency_ms"]["p95"])
+    return max(feasible, key=lambda row: (row["image_size"], row["throughput_fps"]))
+
+
+def tune(model_path: str, cpu_profile_config: CpuProfileConfig, thread_counts: List[int],
+         interop_counts: List[int], worker_counts: List[int], batch_sizes: List[int],
+         image_sizes: List[int], images: Dict[str, Any]) -> Dict[str, Any]:
+    """Sweep the settings and return the profile with every measurement"""
+    cpu_count = os.cpu_count() or 1
+    rows = []
+
+    # Thread counts in one process first, so the worker sweep below starts from the best inter-op setting
+    for intra_op_threads, inter_op_threads in itertools.product(thread_counts, interop_counts):
+        logging.info(f"Tuning {intra_op_threads} intra-op and {inter_op_threads} inter-op threads")
+        rows.extend(measure(model_path, 1, intra_op_threads, inter_op_threads, batch_sizes, image_sizes,
+                            images, cpu_profile_config.runs, cpu_profile_config.warmup_runs))
+    inter_op_threads = select_best(rows, cpu_profile_config.latency_target_ms)["inter_op_threads"]
+
+    # Several processes split the cores between them
+    for workers in worker_counts:
+        if workers < 2 or workers > cpu_count:
+            continue
+        threads = max(1, cpu_count // workers)
+        logging.info(f"Tuning {workers} worker processes with {threads} threads each")
+        rows.extend(measure(model_path, workers, threads, inter_op_threads, batch_sizes, image_sizes,
+                            images, cpu_profile_config.runs, cpu_profile_config.warmup_runs))
+
+    best = select_best(rows, cpu_profile_config.latency_target_ms)
+    import torch
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_path": model_path,
+        "model_size": os.path.getsize(model_path),
+        "cpu_count": cpu_count,
+        "platform": platform.platform(),
+        "torch": torch.__version__,
+        "latency_target_ms": cpu_profile_config.latency_target_ms,
+        "meets_latency_target": best["latency_ms"]["p95"] <= cpu_profile_config.latency_target_ms,
+        "profile": {
+            "workers": best["workers"],
+            "intra_op_threads": best["intra_op_threads"],
+            "inter_op_threads": best["inter_op_threads"],
+            "batch_size": best["batch_size"],
+            "image_size": best["image_size"],
+        },
+        "best": {"throughput_fps": best["throughput_fps"], "latency_ms": best["latency_ms"]},
+        "results": rows,
+    }
+
+
+class CpuProfile:
+    def __init__(self, settings: Dict[str, Any], file_path: str):
+        """Settings of a tuned profile, only those not set explicitly in the environment"""
+        self.settings = settings
+        self.file_path = file_path
+
+    @classmethod
+    def load(cls, cpu_profile_config: CpuProfileConfig = CpuProfileConfig()) -> "CpuProfile":
+        file_path = cpu_profile_config.file_path
+        if not os.path.exists(file_path):
+            return cls({}, file_path)
+        try:
+            with open(file_path, "r", encoding="utf-8") as profile_file:
+                profile = json.load(profile_file)["profile"]
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable CPU profile {file_path}: {e}")
+            return cls({}, file_path)
+
+        settings = {name: int(value) for name, value in profile.items()
+                    if name in PROFILE_ENVIRONMENT and PROFILE_ENVIRONMENT[name] not in os.environ}
+        overridden = sorted(set(profile) - set(settings))
+        logging.info(f"Applying CPU profile {file_path}: {settings}"
+                     + (f", {overridden} set by the environment" if overridden else ""))
+        return cls(settings, file_path)
+
+    @property
+    def workers(self) -> int:
+        return self.settings.get("workers", 1)
+
+    def apply_torch_threads(self, worker_pool_config: InferenceWorkerPoolConfig) -> None:
+        """Thread counts of the serving process itself, when the model runs in it"""
+        # Without thread counts to set, torch stays unimported until the model manager loads it in the background
+        if worker_pool_config.num_workers > 0 or not {"intra_op_threads", "inter_op_threads"} & set(self.settings):
+            return
+        import torch
+
+        if "intra_op_threads" in self.settings:
+            torch.set_num_threads(self.settings["intra_op_threads"])
+        if "inter_op_threads" in self.settings:
+            try:
+                torch.set_num_interop_threads(self.settings["inter_op_threads"])
+            except RuntimeError as e:
+                # Only possible before torch ran anything in parallel
+                logging.warning(f"Could not set the inter-op threads of the CPU profile: {e}")
+
+    def worker_pool_config(self, worker_pool_config: InferenceWorkerPoolConfig) -> InferenceWorkerPoolConfig:
+        if self.workers > 1:
+            worker_pool_config.num_workers = self.workers
+            worker_pool_config.threads_per_worker = self.settings.get(
+                "intra_op_threads", worker_pool_config.threads_per_worker)
+            worker_pool_config.interop_threads = self.settings.get(
+                "inter_op_threads", worker_pool_config.interop_threads)
+        return worker_pool_config
+
+    def scheduler_config(self, scheduler_config: InferenceSchedulerConfig) -> InferenceSchedulerConfig:
+        scheduler_config.max_batch_size = self.settings.get("batch_size", scheduler_config.max_batch_size)
+        return scheduler_config
+
+    @property
+    def image_size(self) -> int:
+        return self.settings.get("image_size", PREDICTION_IMAGE_SIZE)
+
+    def adaptive_resolution_config(self, adaptive_resolution_config: AdaptiveResolutionConfig) \
+            -> AdaptiveResolutionConfig:
+        # A ladder set in the environment wins, otherwise the tuned size is the fixed size
+        if "image_size" in self.settings and "ADAPTIVE_RESOLUTION_IMAGE_SIZES" not in os.environ:
+            adaptive_resolution_config.image_sizes = (self.image_size,)
+        return adaptive_resolution_config
+
+
+def main(argv=None) -> int:
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Find the fastest CPU settings for the model and save them")
+    parser.add_argument("--model", default="model/best.pt", help="model weights to tune for")
+    parser.add_argument("--images", default=None, help="directory of sample frames, synthetic frames by default")
+    parser.add_argument("--width", type=int, default=1280, help="synthetic frame width")
+    parser.add_argument("--height", type=int, default=720, help="synthetic frame height")
+    parser.add_argument("--threads", type=int, nargs="+", default=_powers_of_two(cpu_count),
+                        help="intra-op thread counts to try")
+    parser.add_argument("--interop-threads", type=int, nargs="+", default=[1, 2], help="inter-op thread counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=_powers_of_two(cpu_count),
+                        help="worker process counts to try, each gets an equal share of the cores")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[PREDICTION_IMAGE_SIZE],
+                        help="image sizes to try, the largest one meeting the latency target wins")
+    parser.add_argument("--latency-target-ms", type=float, default=CpuProfileConfig.latency_target_ms,
+                        help="p95 latency a batch may take")
+    parser.add_argument("--runs", type=int, default=CpuProfileConfig.runs, help="timed batches per setting")
+    parser.add_argument("--output", default=CpuProfileConfig.file_path, help="profile file ClientApp reads")
+    args = parser.parse_args(argv)
+
+    config = CpuProfileConfig(file_path=args.output, latency_target_ms=args.latency_target_ms, runs=args.runs)
+    images = {"dir": args.images, "count": max(args.batch_sizes), "width": args.width, "height": args.height}
+    report = tune(args.model, config, sorted(set(args.threads)), sorted(set(args.interop_threads)),
+                  sorted(set(args.workers)), sorted(set(args.batch_sizes)), sorted(set(args.imgsz)), images)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as profile_file:
+        json.dump(report, profile_file, indent=2)
+
+    print(f"{'workers':>8} {'intra':>6} {'inter':>6} {'batch':>6} {'imgsz':>6} {'fps':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in report["results"]:
+        print(f"{row['workers']:>8} {row['intra_op_threads']:>6} {row['inter_op_threads']:>6} "
+              f"{row['batch_size']:>6} {row['image_size']:>6} {row['throughput_fps']:>9.2f} "
+              f"{row['latency_ms']['p50']:>9.2f} {row['latency_ms']['p95']:>9.2f}")
+    print(f"Best profile {report['profile']} written to {args.output}"
+          + ("" if report["meets_latency_target"] else " (no setting met the latency target)"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Frame-by-frame inference over local video files.
+
+Frames are decoded lazily with OpenCV and only every stride-th frame is
+decoded at all, the skipped ones are just grabbed. At most one batch of frames
+is held in memory at a time, so memory use does not depend on the length of
+the video.
+
+    python -m isd.serving.video data/videos/shift.mp4 --fps 2 --output shift.ndjson
+"""
+import os
+import sys
+import json
+import argparse
+import functools
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+from isd.logger import logging
+from isd.entity.config_entity import VideoInferenceConfig, SceneChangeConfig, SlicingConfig, TrackingConfig
+from isd.serving.detections import build_prediction_payload, results_from_boxes, render_jpeg
+from isd.serving.change_detector import SceneChangeDetector
+from isd.serving.slicing import SlicedInference
+from isd.serving.tracking import StreamTracker
+
+
+MJPEG_BOUNDARY = "frame"
+
+
+def resolve_stride(source_fps: float, stride: Optional[int] = None, target_fps: Optional[float] = None) -> int:
+    """Frame stride from an explicit stride or from a target fps, never below 1"""
+    if target_fps:
+        if target_fps <= 0:
+            raise ValueError(f"fps must be positive, got {target_fps}")
+        if source_fps and source_fps > 0:
+            return max(1, int(round(source_fps / target_fps)))
+        return 1
+    if stride is not None and int(stride) < 1:
+        raise ValueError(f"stride must be at least 1, got {stride}")
+    return int(stride or 1)
+
+
+def probe_video(video_path: str) -> None:
+    """Raise ValueError unless OpenCV can open the video and read its first frame"""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened() or not capture.grab():
+            raise ValueError(f"Could not open video {video_path}")
+    finally:
+        capture.release()
+
+
+def iter_video_frames(video_path: str, stride: Optional[int] = None,
+                      target_fps: Optional[float] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """Yield (frame_index, timestamp_seconds, frame) for every kept frame of a video"""
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {video_path}")
+
+    try:
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        step = resolve_stride(source_fps, stride, target_fps)
+        frame_index = 0
+        while True:
+            # grab() advances without decoding, only kept frames pay for retrieve()
+            if not capture.grab():
+                break
+            if frame_index % step == 0:
+                success, frame = capture.retrieve()
+                if not success:
+                    break
+                timestamp = frame_index / source_fps if source_fps > 0 else 0.0
+                yield frame_index, round(timestamp, 3), frame
+            frame_index += 1
+    finally:
+        capture.release()
+
+
+class VideoInference:
+    def __init__(self, predict_fn: Callable[..., List[Any]],
+                 video_inference_config: VideoInferenceConfig = VideoInferenceConfig()):
+        """
+        predict_fn takes a list of frames plus predict() keyword arguments and
+        returns one prediction per frame, e.g. InferenceScheduler.predict_many.
+        """
+        self.predict_fn = predict_fn
+        self.video_inference_config = video_inference_config
+
+        # Frame-skipping totals over every stream that ran with a change detector
+        self._skip_lock = threading.Lock()
+        self._skip_frames = 0
+        self._skip_skipped = 0
+
+    def resolve_path(self, video_path: str) -> str:
+        """
+        Only videos inside the configured input directory may be read. The
+        file is probed here, so an unreadable one is rejected before a
+        streaming response has sent its headers.
+        """
+        input_dir = os.path.realpath(self.video_inference_config.input_dir)
+        full_path = os.path.realpath(os.path.join(input_dir, video_path))
+        if os.path.commonpath([input_dir, full_path]) != input_dir:
+            raise ValueError(f"Video path must be inside {self.video_inference_config.input_dir}")
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f"Video {video_path} not found in {self.video_inference_config.input_dir}")
+        try:
+            probe_video(full_path)
+        except ValueError:
+            # Reported with the path the client sent, not the server's directory layout
+            raise ValueError(f"Could not open video {video_path}") from None
+        return full_path
+
+    def run(self, video_path: str, stride: Optional[int] = None, target_fps: Optional[float] = None,
+            change_detector: Optional[SceneChangeDetector] = None,
+            predict_fn: Optional[Callable[..., List[Any]]] = None,
+            tracker: Optional[StreamTracker] = None, detect_interval: int = 1,
+            **params) -> Iterator[Tuple[int, float, Any, bool]]:
+        """
+        Yield (frame_index, timestamp_seconds, prediction, inferred) in frame
+        order, one batch at a time. With a change detector, frames of a static
+        scene skip the model and reuse the detections of the last inferred frame.
+        With a detect interval the model only runs on every n-th frame.
+        predict_fn replaces the default one for this stream, e.g. with sliced
+        or region-of-interest inference. With a tracker, the predictions carry
+        track ids and violation events, and skipped frames get the propagated
+        tracks instead of the last detections.
+        """
+        if detect_interval < 1:
+            raise ValueError(f"detect_every must be at least 1, got {detect_interval}")
+        state = {"last": None, "skipping": change_detector is not None or detect_interval > 1,
+                 "predict_fn": predict_fn or self.predict_fn, "tracker": tracker}
+        frames = self._iter_predictions(video_path, stride, target_fps, change_detector, detect_interval,
+                                        params, state)
+        if tracker is None:
+            yield from frames
+        else:
+            # One frame is held back, so the events of violations still open at the end land on the last line
+            previous = None
+            for item in frames:
+                if previous is not None:
+                    yield previous
+                previous = item
+            if previous is not None:
+                previous[2].events.extend(tracker.finish())
+                yield previous
+
+        if change_detector is not None:
+            logging.info(f"Frame skipping over {video_path}: {change_detector.stats()}")
+
+    def _iter_predictions(self, video_path, stride, target_fps, change_detector, detect_interval,
+                          params, state) -> Iterator[Tuple[int, float, Any, bool]]:
+        batch = []
+        for position, (frame_index, timestamp, frame) in enumerate(iter_video_frames(video_path, stride, target_fps)):
+            inferred = position % detect_interval == 0 and (change_detector is None
+                                                            or change_detector.should_infer(frame))
+            batch.append((frame_index, timestamp, frame, inferred))
+            if len(batch) == self.video_inference_config.batch_size:
+                yield from self._predict_batch(batch, params, state)
+                batch = []
+        if batch:
+            yield from self._predict_batch(batch, params, state)
+
+    def _predict_batch(self, batch, params, state) -> Iterator[Tuple[int, float, Any, bool]]:
+        frames = [frame for _, _, frame, inferred in batch if inferred]
+        predictions = iter(state["predict_fn"](frames, **params) if frames else [])
+
+        skipped = 0
+        tracker = state["tracker"]
+        for frame_index, timestamp, frame, inferred in batch:
+            if inferred:
+                prediction = state["last"] = next(predictions)
+                if tracker is not None:
+                    prediction = tracker.track(frame, timestamp, prediction)
+            elif tracker is not None:
+                # The tracks move on by one Kalman step, the model is not run
+                prediction = tracker.track(frame, timestamp, names=state["last"].names)
+                skipped += 1
+            else:
+                # Same detections as the last inferred frame, drawn over the current one
+                last = state["last"]
+                prediction = results_from_boxes(frame, last.boxes.data.cpu().numpy(), last.names)
+                skipped += 1
+            yield frame_index, timestamp, prediction, inferred
+
+        if state["skipping"]:
+            with self._skip_lock:
+                self._skip_frames += len(batch)
+                self._skip_skipped += skipped
+
+    def skip_stats(self) -> Dict[str, Any]:
+        """Share of frames answered without the model, over all streams with frame skipping"""
+        with self._skip_lock:
+            return {
+                "frames": self._skip_frames,
+                "skipped": self._skip_skipped,
+                "skip_rate": round(self._skip_skipped / self._skip_frames, 4) if self._skip_frames else 0.0,
+            }
+
+    def iter_ndjson(self, video_path: str, stride: Optional[int] = None, target_fps: Optional[float] = None,
+                    render: bool = False, change_detector: Optional[SceneChangeDetector] = None,
+                    predict_fn: Optional[Callable[..., List[Any]]] = None, compliance_engine=None,
+                    tracker: Optional[StreamTracker] = None, detect_interval: int = 1,
+                    **params) -> Iterator[str]:
+        """
+        One NDJSON line with the detections of every processed frame, plus PPE
+        compliance on request, and track ids and violation events when tracked
+        """
+        for frame_index, timestamp, prediction, inferred in self.run(video_path, stride, target_fps,
+                                                                     change_detector, predict_fn, tracker,
+                                                                     detect_interval, **params):
+            line = {"frame": frame_index, "time": timestamp}
+            if change_detector is not None or detect_interval > 1:
+                line["skipped"] = not inferred
+            line.update(build_prediction_payload(prediction, "detections", render, compliance_engine))
+            yield json.dumps(line) + "\n"
+
+    def iter_mjpeg(self, video_path: str, stride: Optional[int] = None, target_fps: Optional[float] = None,
+                   change_detector: Optional[SceneChangeDetector] = None,
+                   predict_fn: Optional[Callable[..., List[Any]]] = None,
+                   tracker: Optional[StreamTracker] = None, detect_interval: int = 1,
+                   **params) -> Iterator[bytes]:
+        """multipart/x-mixed-replace parts with the annotated frames, labelled with track ids when tracked"""
+        for _, _, prediction, _ in self.run(video_path, stride, target_fps, change_detector, predict_fn,
+                                            tracker, detect_interval, **params):
+            yield (
+                f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n\r\n".encode("utf-8")
+                + render_jpeg(prediction)
+                + b"\r\n"
+            )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run safety detection over a local video file")
+    parser.add_argument("video", help="path of the video file")
+    parser.add_argument("--model", default="model/best.pt", help="model weights to load")
+    parser.add_argument("--stride", type=int, default=None, help="process every n-th frame")
+    parser.add_argument("--fps", type=float, default=None, help="target frames per second, overrides --stride")
+    parser.add_argument("--batch-size", type=int, default=VideoInferenceConfig.batch_size)
+    parser.add_argument("--conf", type=float, default=None, help="confidence threshold")
+    parser.add_argument("--format", choices=["ndjson", "mjpeg"], default="ndjson")
+    parser.add_argument("--skip-static", action="store_true",
+                        help="reuse the last detections while the scene does not change")
+    parser.add_argument("--skip-threshold", type=float, default=SceneChangeConfig.threshold,
+                        help="mean absolute thumbnail difference (0-255) that counts as a change")
+    parser.add_argument("--refresh-interval", type=int, default=SceneChangeConfig.refresh_interval,
+                        help="run the model after this many skipped frames in a row")
+    parser.add_argument("--slice", action="store_true",
+                        help="run overlapping tiles at full resolution instead of the downscaled frame")
+    parser.add_argument("--tile-size", type=int, default=SlicingConfig.tile_size, help="tile width and height")
+    parser.add_argument("--overlap", type=float, default=SlicingConfig.overlap,
+                        help="fraction of a tile shared with its neighbour")
+    parser.add_argument("--track", action="store_true",
+                        help="track workers across frames and emit one event per violation and track")
+    parser.add_argument("--detect-every", type=int, default=TrackingConfig.detect_interval,
+                        help="run the model on every n-th frame only and propagate the tracks in between")
+    parser.add_argument("--output", default="-", help="output file, - for stdout")
+    args = parser.parse_args(argv)
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    video_inference = VideoInference(
+        lambda frames, **params: model.predict(source=frames, verbose=False, **params),
+        VideoInferenceConfig(batch_size=args.batch_size),
+    )
+    predict_fn = None
+    if args.slice:
+        slicing_config = SlicingConfig(tile_size=args.tile_size, overlap=args.overlap)
+        predict_fn = functools.partial(SlicedInference(video_inference.predict_fn).predict,
+                                       slicing_config=slicing_config)
+    tracker = None
+    if args.track:
+        from isd.serving.compliance import ComplianceEngine
+
+        tracker = StreamTracker(ComplianceEngine())
+    # Tracking keeps the low-confidence detections for its second association
+    conf = args.conf if args.conf is not None or tracker is None else TrackingConfig.low_threshold
+    params = {} if conf is None else {"conf": conf}
+    change_detector = SceneChangeDetector(SceneChangeConfig(
+        threshold=args.skip_threshold, refresh_interval=args.refresh_interval
+    )) if args.skip_static else None
+
+    if args.format == "ndjson":
+        chunks = (line.encode("utf-8") for line in
+                  video_inference.iter_ndjson(args.video, args.stride, args.fps,
+                                              change_detector=change_detector, predict_fn=predict_fn,
+                                              tracker=tracker, detect_interval=args.detect_every, **params))
+    else:
+        chunks = video_inference.iter_mjpeg(args.video, args.stride, args.fps, change_detector, predict_fn,
+                                            tracker, args.detect_every, **params)
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+            output.flush()
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    logging.info(f"Finished video inference over {args.video}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+Pool of model worker processes fed through shared memory.
+
+Every worker process loads its own copy of the model, so inference runs on as
+many cores as there are workers instead of contending for one interpreter.
+Decoded frames are copied into a shared memory segment owned by the worker's
+handle and only their offsets and shapes travel over the pipe. The workers
+send back the raw (N, 6) box arrays and stage timings, which are turned into Results objects in
+the front end so the rest of the serving path is unchanged.
+
+Run the scaling benchmark with
+
+    python -m isd.serving.worker_pool --model model/best.pt --workers 1 2 4 --frames 256
+"""
+import os
+import sys
+import time
+import queue
+import threading
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import numpy as np
+from isd.logger import logging
+from isd.exception import isdException
+from isd.entity.config_entity import InferenceWorkerPoolConfig
+from isd.serving.detections import results_from_boxes
+
+
+def _worker_main(model_path: str, connection, threads: int, interop_threads: int = 0) -> None:
+    """Entry point of a worker process: load the model once, then serve predict tasks"""
+    import torch
+    from ultralytics import YOLO
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if interop_threads > 0:
+        torch.set_num_interop_threads(interop_threads)
+    model = YOLO(model_path, task="detect")
+    connection.send(("ready", dict(model.names)))
+
+    segment = None
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            segment_name, layouts, params = message
+            try:
+                if segment is None or segment.name != segment_name:
+                    if segment is not None:
+                        segment.close()
+                    # Only attached here, the front end owns the segment and unlinks it in _ensure_capacity and close
+                    segment = shared_memory.SharedMemory(name=segment_name)
+                images = [
+                    np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+                    for offset, shape, dtype in layouts
+                ]
+                results = model.predict(source=images, verbose=False, **params)
+                del images
+                connection.send(("ok", [(result.boxes.data.cpu().numpy(), result.speed) for result in results]))
+            except Exception as e:
+                connection.send(("error", str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if segment is not None:
+            segment.close()
+
+
+class _WorkerHandle:
+    """Front-end side of one worker process: its pipe and its shared memory segment"""
+
+    def __init__(self, index: int, model_path: str, worker_pool_config: InferenceWorkerPoolConfig,
+                 threads: int, context):
+        self.index = index
+        self.model_path = model_path
+        self.worker_pool_config = worker_pool_config
+        self.threads = threads
+        self.context = context
+        self.segment = shared_memory.SharedMemory(create=True, size=worker_pool_config.shared_memory_size)
+        self.names: Dict[int, str] = {}
+        # Cleared when the process timed out or died, the pool then restarts it before reuse
+        self.healthy = True
+        self._spawn()
+
+    def _spawn(self) -> None:
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(self.model_path, child_connection, self.threads, self.worker_pool_config.interop_threads),
+            name=f"inference-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+
+    def wait_ready(self) -> None:
+        if not self.connection.poll(self.worker_pool_config.start_timeout):
+            raise TimeoutError(f"Inference worker {self.index} did not load the model in time")
+        status, self.names = self.connection.recv()
+        logging.info(f"Inference worker {self.index} ready (pid {self.process.pid})")
+
+    def _ensure_capacity(self, size: int) -> None:
+        if size <= self.segment.size:
+            return
+        # Grow to twice the request so occasional larger batches do not reallocate every time
+        old_segment = self.segment
+        self.segment = shared_memory.SharedMemory(create=True, size=2 * size)
+        old_segment.close()
+        old_segment.unlink()
+
+    def predict(self, images: List[np.ndarray], params: Dict[str, Any]) -> List[tuple]:
+        images = [np.ascontiguousarray(image) for image in images]
+        self._ensure_capacity(sum(image.nbytes for image in images))
+
+        layouts, offset = [], 0
+        for image in images:
+            self.segment.buf[offset:offset + image.nbytes] = image.reshape(-1).view(np.uint8)
+            layouts.append((offset, image.shape, image.dtype.str))
+            offset += image.nbytes
+
+        timeout = self.worker_pool_config.predict_timeout
+        try:
+            self.connection.send((self.segment.name, layouts, params))
+            # A worker stuck in native code never closes its pipe, so the wait is bounded
+            if not self.connection.poll(timeout if timeout > 0 else None):
+                logging.error(f"Inference worker {self.index} did not answer within {timeout}s, restarting it")
+                self.kill()
+                raise TimeoutError(f"Inference worker {self.index} timed out during inference")
+            status, payload = self.connection.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            logging.error(f"Inference worker {self.index} died, restarting it: {e}")
+            self.kill()
+            raise RuntimeError(f"Inference worker {self.index} died during inference") from e
+
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {self.index} failed: {payload}")
+        return payload
+
+    def kill(self) -> None:
+        self.healthy = False
+        self.process.kill()
+        self.process.join()
+
+    def restart(self) -> None:
+        self.kill()
+        self._spawn()
+        self.wait_ready()
+        self.healthy = True
+
+    def close(self) -> None:
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.kill()
+        self.segment.close()
+        self.segment.unlink()
+
+
+class InferenceWorkerPool:
+    """
+    N model worker processes behind a predict() with the same signature as the
+    in-process model call. Each call runs one batch on one idle worker, so up
+    to N batches run at once when the scheduler runs with concurrency N.
+    """
+
+    def __init__(self, model_path: str, worker_pool_config: InferenceWorkerPoolConfig = InferenceWorkerPoolConfig()):
+        try:
+            self.model_path = model_path
+            self.worker_pool_config = worker_pool_config
+            num_workers = max(1, worker_pool_config.num_workers)
+            self.threads_per_worker = worker_pool_config.threads_per_worker
+            if self.threads_per_worker <= 0:
+                # Split the cores evenly so workers do not oversubscribe the CPU
+                self.threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+            # Forking a process that already runs torch threads is unsafe, always spawn
+            context = mp.get_context("spawn")
+            self._workers = [_WorkerHandle(index, model_path, worker_pool_config, self.threads_per_worker, context)
+                             for index in range(num_workers)]
+            for worker in self._workers:
+                worker.wait_ready()
+
+            self.names = self._workers[0].names
+            self._closed = False
+            self._idle: "queue.Queue[_WorkerHandle]" = queue.Queue()
+            for worker in self._workers:
+                self._idle.put(worker)
+            logging.info(
+                f"Started {num_workers} inference workers with "
+                f"{self.threads_per_worker} threads each"
+            )
+        except Exception as e:
+            raise isdException(e, sys) from e
+
+    @property
+    def num_workers(self) -> int:
+        return len(self._workers)
+
+    def predict(self, images: List[np.ndarray], **params) -> List[Any]:
+        worker = self._idle.get()
+        try:
+            boxes = worker.predict(images, params)
+        finally:
+            if worker.healthy:
+                self._idle.put(worker)
+            else:
+                # The caller already has its error, the worker rejoins the pool once it reports ready
+                threading.Thread(target=self._restart, args=(worker,), name=f"restart-worker-{worker.index}",
+                                 daemon=True).start()
+
+        return [results_from_boxes(image, data, self.names, speed) for image, (data, speed) in zip(images, boxes)]
+
+    def _restart(self, worker: _WorkerHandle) -> None:
+        while not self._closed:
+            try:
+                worker.restart()
+            except Exception as e:
+                logging.error(f"Inference worker {worker.index} failed to restart, retrying: {e}")
+                time.sleep(self.worker_pool_config.restart_backoff)
+                continue
+            if self._closed:
+                worker.kill()
+                return
+            self._idle.put(worker)
+            logging.info(f"Inference worker {worker.index} back in the pool")
+            return
+
+    def relocate(self, model_path: str) -> None:
+        """Weights moved on disk, workers restarted from now on load them from the new path"""
+        self.model_path = model_path
+        for worker in self._workers:
+            worker.model_path = model_path
+
+    def close(self) -> None:
+        self._closed = True
+        for worker in self._workers:
+            worker.close()
+        logging.info("Inference worker pool closed")
+
+
+def benchmark(model_path: str, worker_counts: List[int], num_frames: int, batch_size: int,
+              image_size: int, threads_per_worker: int = 0) -> List[Dict[str, float]]:
+    """Throughput of the pool for each worker count on synthetic frames"""
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, size=(image_size, image_size, 3), dtype=np.uint8) for _ in range(batch_size)]
+    batches = max(1, num_frames // batch_size)
+
+    rows = []
+    for num_workers in worker_counts:
+        pool = InferenceWorkerPool(model_path, InferenceWorkerPoolConfig(
+            num_workers=num_workers, threads_per_worker=threads_per_worker
+        ))
+        try:
+            # Warm every worker before timing
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                list(executor.map(lambda _: pool.predict(frames, imgsz=image_size), range(num_workers)))
+
+            started_at = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                list(executor.map(lambda _: pool.predict(frames, imgsz=image_size), range(batches)))
+            elapsed = time.perf_counter() - started_at
+        finally:
+            pool.close()
+
+        rows.append({
+            "workers": num_workers,
+            "threads_per_worker": pool.threads_per_worker,
+            "frames": batches * batch_size,
+            "seconds": round(elapsed, 3),
+            "fps": round(batches * batch_size / elapsed, 2),
+        })
+
+    baseline = rows[0]["fps"] / rows[0]["workers"]
+    for row in rows:
+        row["speedup"] = round(row["fps"] / rows[0]["fps"], 2)
+        row["scaling_efficiency"] = round(row["fps"] / (baseline * row["workers"]), 2)
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark throughput scaling of the inference worker pool")
+    parser.add_argument("--model", default="model/best.pt")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--frames", type=int, default=256, help="frames per worker count")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="fixed threads per worker so the runs compare like for like, 0 splits the cores evenly")
+    args = parser.parse_args(argv)
+
+    rows = benchmark(args.model, args.workers, args.frames, args.batch_size, args.imgsz, args.threads_per_worker)
+    print(f"{'workers':>8} {'threads':>8} {'fps':>10} {'speedup':>8} {'efficiency':>11}")
+    for row in rows:
+        print(f"{row['workers']:>8} {row['threads_per_worker']:>8} {row['fps']:>10.2f} "
+              f"{row['speedup']:>8.2f} {row['scaling_efficiency']:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,8 @@ import os.path
 import sys
 import yaml
 import base64
+import cv2
+import numpy as np
 from ensure import ensure_annotations
 from isd.exception import isdException
 from isd.logger import logging
@@ -28,6 +30,32 @@ def decodeImage(imgstring, fileName):
 def encodeImageIntoBase64(croppedImagePath):
     with open(croppedImagePath, "rb") as f:
         return base64.b64encode(f.read())
+
+
+def decodeBytesIntoArray(imgdata: bytes) -> np.ndarray:
+    """Decode encoded image bytes (jpeg, png, ...) straight into a BGR array"""
+    image = cv2.imdecode(np.frombuffer(imgdata, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Image data could not be decoded")
+    return image
+
+
+def decodeImageIntoArray(imgstring) -> np.ndarray:
+    """Decode a base64 encoded image straight into a BGR array, without touching disk"""
+    return decodeBytesIntoArray(base64.b64decode(imgstring))
+
+
+def encodeArrayIntoBytes(image: np.ndarray, ext: str = ".jpg") -> bytes:
+    """Encode a BGR array into image file bytes in an in-memory buffer"""
+    success, buffer = cv2.imencode(ext, image)
+    if not success:
+        raise ValueError(f"Image could not be encoded as {ext}")
+    return buffer.tobytes()
+
+
+def encodeArrayIntoBase64(image: np.ndarray, ext: str = ".jpg") -> bytes:
+    """Encode a BGR array into base64 image bytes from an in-memory buffer"""
+    return base64.b64encode(encodeArrayIntoBytes(image, ext))
     
 
 @ensure_annotations